@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Concurrent trading stress benchmark.
+
+Drives N threads of random buys and sells through independent sessions on
+one journal-mode exchange, checks that the total EUR + COO value (at the
+fixed current price) is conserved up to the documented rounding (each
+trade rounds its proceeds down by less than one unit) and that every
+successful trade was logged, and reports trades per second for each thread
+count.
+
+    python benchmarks/bench_concurrency.py [--threads 1 2 4 8] [--trades 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opencooin import OpenCooinExchange
+from opencooin.money import COO_SCALE, EUR_SCALE
+
+
+def total_value(exchange: OpenCooinExchange) -> float:
+    """Value of all balances in EUR at the current price"""
+    price = exchange.current_price
+    return sum(b['eur'] / EUR_SCALE + b['coo'] / COO_SCALE * price for b in exchange.accounts.values())
+
+
+def run(threads: int, trades: int, accounts: int, data_dir: str):
+    """Run one stress round and return (trades/s, successful trades)"""
+    exchange = OpenCooinExchange(os.path.join(data_dir, f"stress_{threads}.json"),
+                                 journal=True, fsync_every=0, compact_every=50000)
+    names = [f"stress_pigeon_{i}" for i in range(accounts)]
+    for name in names:
+        exchange.create_account(name)
+    start_value = total_value(exchange)
+    start_log = len(exchange.transactions)
+    succeeded = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+
+    def trader(index: int):
+        rng = random.Random(index)
+        sessions = [exchange.login(name) for name in names]
+        barrier.wait()
+        ok = 0
+        for _ in range(trades // threads):
+            session = rng.choice(sessions)
+            if rng.random() < 0.5:
+                ok += session.buy_coo(rng.uniform(0.01, 5.0))
+            else:
+                ok += session.sell_coo(rng.uniform(0.01, 10.0))
+        succeeded[index] = ok
+
+    workers = [threading.Thread(target=trader, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    exchange.close()
+
+    end_value = total_value(exchange)
+    # A buy rounds its COO down to the nano-COO, a sell its EUR down to the
+    # micro-EUR: value can only shrink, by less than one unit per trade
+    max_rounding = sum(succeeded) * max(1 / EUR_SCALE, exchange.current_price / COO_SCALE)
+    assert -1e-9 * start_value <= start_value - end_value <= max_rounding + 1e-9 * start_value, \
+        f"value not conserved: {start_value} -> {end_value}"
+    assert len(exchange.transactions) - start_log == sum(succeeded), "lost or duplicated transactions"
+    return (trades // threads) * threads / elapsed, sum(succeeded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--trades', type=int, default=20000, help="trades per round")
+    parser.add_argument('--accounts', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        for threads in args.threads:
+            rate, succeeded = run(threads, args.trades, args.accounts, data_dir)
+            print(f"{threads:3} threads: {rate:10.0f} trades/s ({succeeded} filled), value conserved")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Trading window refresh benchmark.
+
+Logs into the GUI with an account holding 20, 1k and 100k transactions and
+measures how long the window takes to show a new trade (history refresh,
+balance labels and a Tk update) and to jump into deep history. Runs
+headless: without a DISPLAY it starts a private Xvfb server.
+
+    python benchmarks/bench_gui.py [--sizes 20 1000 100000] [--trades 200]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opencooin import OpenCooinExchange
+
+ACCOUNT = 'homer_pigeon'
+
+
+def start_display():
+    """Start Xvfb if there is no display; returns the process or None"""
+    if os.environ.get('DISPLAY'):
+        return None
+    if not shutil.which('Xvfb'):
+        sys.exit("No DISPLAY and Xvfb is not installed")
+    display = ':87'
+    server = subprocess.Popen(['Xvfb', display, '-screen', '0', '1024x768x24', '-nolisten', 'tcp'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(0.5)
+    return server
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(rows: int, trades: int, data_dir: str):
+    """Measure one history size and return (p50 ms, p99 ms, deep scroll ms)"""
+    from opencooin.gui import OpenCooinGUI
+
+    exchange = OpenCooinExchange(os.path.join(data_dir, f"gui_{rows}.json"))
+    price = exchange.current_price
+    with exchange.log_lock:
+        for i in range(rows):
+            exchange.add_transaction(ACCOUNT, 'buy' if i % 2 else 'sell', 1.0, price, price)
+
+    gui = OpenCooinGUI(exchange)
+    gui.session = exchange.login(ACCOUNT)
+    gui.create_trading_interface()
+    gui.root.update()
+
+    samples = []
+    for _ in range(trades):
+        gui.session.buy_coo(0.01)
+        start = time.perf_counter()
+        gui.update_balances()
+        gui.update_transaction_history()
+        gui.root.update()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    gui.history.yview('moveto', 0.9)
+    gui.root.update()
+    scroll = (time.perf_counter() - start) * 1000
+
+    gui.root.destroy()
+    return percentile(samples, 0.5), percentile(samples, 0.99), scroll
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 1000, 100_000])
+    parser.add_argument('--trades', type=int, default=200, help="trades measured per size")
+    args = parser.parse_args()
+
+    server = start_display()
+    try:
+        print(f"{'rows':>8} {'p50 ms':>8} {'p99 ms':>8} {'scroll ms':>10}")
+        with tempfile.TemporaryDirectory() as directory:
+            for rows in args.sizes:
+                p50, p99, scroll = run(rows, args.trades, directory)
+                print(f"{rows:>8} {p50:>8.2f} {p99:>8.2f} {scroll:>10.2f}")
+    finally:
+        if server:
+            server.terminate()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Headless import benchmark for the exchange engine.
+
+Measures wall time and peak RSS of ``import opencooin`` in fresh
+interpreters, checks that tkinter stays unloaded, and compares the medians
+against benchmarks/import_baseline.json. Exits non-zero on a regression.
+
+    python benchmarks/bench_import.py [--runs 15] [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'import_baseline.json')
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import opencooin
+elapsed = time.perf_counter() - start
+# ru_maxrss survives exec on Linux and would report the parent's peak
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except OSError:
+    pass
+print(json.dumps({
+    'import_ms': elapsed * 1000,
+    'rss_kb': rss_kb,
+    'tkinter_loaded': 'tkinter' in sys.modules,
+}))
+"""
+
+
+def measure(runs: int):
+    """Run the import probe in fresh interpreters and return the medians"""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True,
+                                capture_output=True, text=True)
+        samples.append(json.loads(result.stdout))
+    return {
+        'import_ms': statistics.median(s['import_ms'] for s in samples),
+        'rss_kb': statistics.median(s['rss_kb'] for s in samples),
+        'tkinter_loaded': any(s['tkinter_loaded'] for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="allowed relative slowdown over the baseline")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(json.dumps(result, indent=2))
+
+    if result['tkinter_loaded']:
+        print("FAIL: importing opencooin loaded tkinter")
+        return 1
+
+    if args.update_baseline or not os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump({'import_ms': result['import_ms'], 'rss_kb': result['rss_kb']}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_FILE}")
+        return 0
+
+    with open(BASELINE_FILE) as f:
+        baseline = json.load(f)
+    failed = False
+    for metric in ('import_ms', 'rss_kb'):
+        limit = baseline[metric] * (1 + args.tolerance)
+        status = 'ok' if result[metric] <= limit else 'REGRESSION'
+        failed |= status != 'ok'
+        print(f"{metric}: {result[metric]:.1f} (baseline {baseline[metric]:.1f}, limit {limit:.1f}) {status}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
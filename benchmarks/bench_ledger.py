@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Cost of the tamper-evident ledger (opencooin.ledger).
+
+    trade    buy/sell throughput on a journal exchange, single trades and
+             execute_batch, without and with ledger=True; the overhead is
+             the throughput lost
+    append   time to hash one transaction into the ledger on its own
+    verify   full verification of a synthetic history, rows per second by
+             worker count
+    proof    time to build one inclusion proof and to check it
+
+The single-trade overhead must stay under --max-overhead, or the run exits
+1. Verification speedups above the CPU count are reported only.
+
+    python benchmarks/bench_ledger.py [--trades 50000] [--rows 1000000] [--workers 1 2 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opencooin import OpenCooinExchange
+from opencooin.ledger import Ledger, check_proof
+from synthetic import account_names, order_stream, synthetic_log
+
+
+def trade_rate(directory: str, names, orders, batch: int, ledger: bool) -> float:
+    """Trades/s over the order stream, one call per trade or execute_batch with batch orders"""
+    data_file = os.path.join(directory, f"trade_{batch}_{ledger}.json")
+    exchange = OpenCooinExchange(data_file, journal=True, fsync_every=0, compact_every=10 ** 9,
+                                 default_accounts=False, ledger=ledger)
+    try:
+        for name in names:
+            exchange.create_account(name)
+        exchange.execute_batch([{'account': name, 'type': 'buy', 'amount': 50.0} for name in names])
+        trade = {'buy': exchange.buy_coo, 'sell': exchange.sell_coo}
+        start = time.perf_counter()
+        if batch > 1:
+            for i in range(0, len(orders), batch):
+                exchange.execute_batch([{'account': account, 'type': tx_type, 'amount': amount}
+                                        for account, tx_type, amount in orders[i:i + batch]])
+        else:
+            for account, tx_type, amount in orders:
+                trade[tx_type](account, amount)
+        return len(orders) / (time.perf_counter() - start)
+    finally:
+        exchange.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trades', type=int, default=50000)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=1000, help="orders per execute_batch call")
+    parser.add_argument('--rows', type=int, default=1000000, help="history size for verify and proof")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeat', type=int, default=3, help="passes per trade measurement, the best is kept")
+    parser.add_argument('--max-overhead', type=float, default=0.25)
+    args = parser.parse_args()
+
+    names = account_names(args.accounts, prefix="ledger_pigeon")
+    orders = order_stream(args.trades, names)
+    cpus = os.cpu_count() or 1
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{cpus} CPUs, {args.trades} trades over {args.accounts} accounts")
+        print(f"{'trade':>10} {'plain/s':>12} {'ledger/s':>12} {'overhead':>9}")
+        for batch in (1, args.batch):
+            # Interleaved, so drift on the machine hits both alike
+            rates = {False: [], True: []}
+            for _ in range(args.repeat):
+                for ledger in (False, True):
+                    rates[ledger].append(trade_rate(directory, names, orders, batch, ledger))
+            plain, hashed = max(rates[False]), max(rates[True])
+            overhead = 1 - hashed / plain
+            print(f"{'single' if batch == 1 else f'batch {batch}':>10} {plain:>12,.0f} {hashed:>12,.0f} "
+                  f"{overhead:>8.1%}")
+            failed |= batch == 1 and overhead > args.max_overhead
+
+        log = synthetic_log(args.rows, args.accounts)
+        ledger = Ledger(os.path.join(directory, "synthetic.ledger"))
+        users = log.users
+        start = time.perf_counter()
+        for user_id, tx_type, coo, eur, price, timestamp in log.rows():
+            ledger.append(users[user_id], tx_type, coo, eur, price, timestamp)
+        elapsed = time.perf_counter() - start
+        print(f"\nappend   {elapsed / args.rows * 1e6:.2f} µs per transaction ({args.rows:,} rows)")
+
+        print(f"\n{'workers':>8} {'verify s':>9} {'rows/s':>12} {'speedup':>8}")
+        first = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            result = ledger.verify(log, workers=workers)
+            elapsed = time.perf_counter() - start
+            if not result['ok']:
+                print(f"verification failed: {result['problems']}")
+                return 1
+            first = first or (elapsed, workers)
+            print(f"{workers:>8} {elapsed:>9.2f} {args.rows / elapsed:>12,.0f} {first[0] / elapsed * first[1]:>7.2f}x"
+                  f"{'' if workers <= cpus else ' *'}")
+        if any(workers > cpus for workers in args.workers):
+            print("* more workers than CPUs")
+
+        positions = random.Random(1).sample(range(ledger.head()['blocks'] * ledger.block_size), 1000)
+        start = time.perf_counter()
+        proofs = [ledger.proof(position) for position in positions]
+        built = time.perf_counter() - start
+        records = [log.record(position) for position in positions]
+        start = time.perf_counter()
+        checked = all(check_proof(record, proof) for record, proof in zip(records, proofs))
+        elapsed = time.perf_counter() - start
+        print(f"\nproof    build {built / len(positions) * 1e6:.0f} µs, "
+              f"check {elapsed / len(positions) * 1e6:.0f} µs, {len(proofs[0]['path'])} hashes")
+        ledger.close()
+        if not checked:
+            print("proof check failed")
+            return 1
+
+    if failed:
+        print(f"REGRESSION: ledger overhead on single trades above {args.max_overhead:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Trade throughput of the fixed-point money path, optionally against another
+revision (e.g. the last one with float balances).
+
+Runs single buy_coo/sell_coo calls and execute_batch batches on a
+journal-mode exchange in fresh interpreters, and reports the median
+trades per second of each. With --against, the same probe runs on a copy
+of that git revision and the run fails if this tree is slower by more than
+--tolerance.
+
+    python benchmarks/bench_money.py [--trades 50000] [--runs 5] [--against REV]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only uses the public float API, which both money representations share
+PROBE = """
+import json, os, random, sys, tempfile, time
+from opencooin import OpenCooinExchange
+trades, accounts, batch = map(int, sys.argv[1:4])
+rng = random.Random(1)
+orders = [('buy' if rng.random() < 0.5 else 'sell', rng.randrange(accounts),
+           round(rng.uniform(0.01, 5.0), 2)) for _ in range(trades)]
+result = {}
+with tempfile.TemporaryDirectory() as directory:
+    for mode in ('single', 'batch'):
+        exchange = OpenCooinExchange(os.path.join(directory, mode + ".json"), journal=True,
+                                     fsync_every=0, compact_every=10 ** 9)
+        names = [f"money_pigeon_{i}" for i in range(accounts)]
+        for name in names:
+            exchange.create_account(name)
+            exchange.buy_coo(name, 50.0)
+        start = time.perf_counter()
+        if mode == 'single':
+            for tx_type, account, amount in orders:
+                if tx_type == 'buy':
+                    exchange.buy_coo(names[account], amount)
+                else:
+                    exchange.sell_coo(names[account], amount)
+        else:
+            for i in range(0, trades, batch):
+                exchange.execute_batch([{'account': names[account], 'type': tx_type, 'amount': amount}
+                                        for tx_type, account, amount in orders[i:i + batch]])
+        result[mode] = trades / (time.perf_counter() - start)
+        exchange.close()
+print(json.dumps(result))
+"""
+
+
+def measure(tree: str, runs: int, trades: int, accounts: int, batch: int):
+    """Median trades/s of each mode, running the probe in tree"""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE, str(trades), str(accounts), str(batch)],
+                                cwd=tree, check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output))
+    return {mode: statistics.median(sample[mode] for sample in samples) for mode in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trades', type=int, default=50000)
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=100, help="orders per execute_batch call")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--against', metavar='REV', help="git revision to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help="allowed relative slowdown against REV")
+    args = parser.parse_args()
+
+    result = measure(ROOT, args.runs, args.trades, args.accounts, args.batch)
+    if not args.against:
+        print(json.dumps(result, indent=2))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tree:
+        archive = subprocess.run(['git', 'archive', args.against, 'opencooin'], cwd=ROOT,
+                                 check=True, capture_output=True).stdout
+        subprocess.run(['tar', '-x', '-C', tree], input=archive, check=True)
+        baseline = measure(tree, args.runs, args.trades, args.accounts, args.batch)
+
+    failed = False
+    print(f"{'mode':>8} {args.against[:12]:>12} {'this tree':>12} {'ratio':>7}")
+    for mode, rate in result.items():
+        ratio = rate / baseline[mode]
+        failed |= ratio < 1 - args.tolerance
+        print(f"{mode:>8} {baseline[mode]:>12,.0f} {rate:>12,.0f} {ratio:>7.2f}")
+    if failed:
+        print(f"REGRESSION: slower than {args.against} by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Order book throughput and latency benchmark.
+
+Fills a book with resting limit orders on both sides of the current price,
+then replays a random stream of new limit orders (some crossing the
+spread), market orders and cancels against it. Reports orders per second
+for the stream and p50/p99 latency per operation kind, and checks that
+every micro-EUR and nano-COO is still accounted for.
+
+    python benchmarks/bench_orderbook.py [--resting 1000000] [--orders 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opencooin import OpenCooinExchange
+from opencooin.money import to_micro_eur, to_nano_coo
+from opencooin.orderbook import OrderBook
+
+TICK = 0.0001
+
+
+def totals(exchange: OpenCooinExchange):
+    """Total nano-COO and micro-EUR across all accounts, held funds included"""
+    balances = exchange.stored_accounts().values()
+    return (sum(b['coo'] for b in balances), sum(b['eur'] for b in balances))
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resting', type=int, default=1_000_000, help="resting orders before the stream")
+    parser.add_argument('--orders', type=int, default=100_000, help="orders in the measured stream")
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--levels', type=int, default=2000, help="price levels per side")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        exchange = OpenCooinExchange(os.path.join(directory, "book.json"), journal=True,
+                                     fsync_every=0, compact_every=10 ** 9)
+        names = [f"trader_{i}" for i in range(args.accounts)]
+        with exchange.log_lock:
+            for name in names:
+                exchange.accounts[name] = {'coo': to_nano_coo(1e7), 'eur': to_micro_eur(1e7)}
+                exchange.account_index.add(name)
+        book = OrderBook(exchange)
+        mid = round(exchange.current_price, 4)
+        start_totals = totals(exchange)
+
+        start = time.perf_counter()
+        for i in range(args.resting):
+            offset = rng.randint(1, args.levels) * TICK
+            side = 'buy' if i % 2 else 'sell'
+            price = round(mid - offset if side == 'buy' else mid + offset, 4)
+            book.place(rng.choice(names), side, rng.randint(1, 100), price)
+        elapsed = time.perf_counter() - start
+        print(f"resting: {len(book)} orders in {elapsed:.1f}s ({args.resting / elapsed:,.0f} orders/s)")
+
+        latencies = {'limit': [], 'cross': [], 'market': [], 'cancel': []}
+        fills = 0
+        start = time.perf_counter()
+        for _ in range(args.orders):
+            roll = rng.random()
+            side = rng.choice(('buy', 'sell'))
+            if roll < 0.25 and book.orders:
+                order_id = rng.choice(list(book.orders)) if len(book) < 1000 else rng.randrange(1, next(book.ids))
+                began = time.perf_counter_ns()
+                book.cancel(order_id)
+                latencies['cancel'].append(time.perf_counter_ns() - began)
+                continue
+            if roll < 0.35:
+                kind, price = 'market', None
+            else:
+                # Mostly passive; one in five limit orders reaches across
+                if rng.random() < 0.2:
+                    offset = -rng.randint(1, 5) * TICK
+                else:
+                    offset = rng.randint(1, args.levels) * TICK
+                price = round(mid - offset if side == 'buy' else mid + offset, 4)
+                kind = 'cross' if offset < 0 else 'limit'
+            began = time.perf_counter_ns()
+            result = book.place(rng.choice(names), side, rng.randint(1, 300), price)
+            latencies[kind].append(time.perf_counter_ns() - began)
+            fills += len(result['fills'])
+        elapsed = time.perf_counter() - start
+
+        print(f"stream: {args.orders} orders, {fills} fills in {elapsed:.2f}s "
+              f"({args.orders / elapsed:,.0f} orders/s), {len(book)} resting")
+        print(f"{'kind':>8} {'count':>8} {'p50 us':>8} {'p99 us':>8}")
+        for kind, samples in latencies.items():
+            if samples:
+                print(f"{kind:>8} {len(samples):>8} {percentile(samples, 0.5) / 1000:>8.1f} "
+                      f"{percentile(samples, 0.99) / 1000:>8.1f}")
+
+        book.close()
+        assert totals(exchange) == start_totals, "balances not conserved"
+        assert not exchange.holds, "holds left after cancelling every order"
+        exchange.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
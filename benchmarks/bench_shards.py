@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Trade throughput of a ShardedExchange by shard count.
+
+Creates accounts on a fresh sharded data directory for each shard count,
+funds them with one COO purchase each, then pushes the same random buy and
+sell orders through execute_batch and reports trades per second, the
+speedup over one shard and the scaling efficiency (speedup / shards). The
+first row is a plain in-process OpenCooinExchange for reference. The
+router keeps --in-flight batches submitted so the shards don't wait on it.
+
+Shard counts up to the number of CPUs must reach --min-efficiency, or the
+run exits 1; counts beyond it are reported only, since the shards then
+share cores.
+
+    python benchmarks/bench_shards.py [--shards 1 2 4 8] [--trades 200000] [--batch 1000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opencooin import OpenCooinExchange
+from opencooin.shard import ShardedExchange
+from synthetic import account_names, order_stream
+
+
+def run(exchange, names, orders, batch: int, in_flight: int) -> float:
+    """Fund the accounts, then return trades/s over the order stream
+
+    A ShardedExchange gets up to in_flight batches submitted at a time.
+    """
+    for name in names:
+        exchange.create_account(name)
+    exchange.execute_batch([{'account': name, 'type': 'buy', 'amount': 50.0} for name in names])
+    batches = [[{'account': account, 'type': tx_type, 'amount': amount}
+                for account, tx_type, amount in orders[i:i + batch]]
+               for i in range(0, len(orders), batch)]
+    start = time.perf_counter()
+    if isinstance(exchange, ShardedExchange):
+        submitted = deque()
+        for orders_batch in batches:
+            if len(submitted) >= in_flight:
+                submitted.popleft().result()
+            submitted.append(exchange.submit_batch(orders_batch))
+        for future in submitted:
+            future.result()
+    else:
+        for orders_batch in batches:
+            exchange.execute_batch(orders_batch)
+    return len(orders) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--trades', type=int, default=200000)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=1000, help="orders per execute_batch call")
+    parser.add_argument('--in-flight', type=int, default=4, help="batches submitted to the shards at a time")
+    parser.add_argument('--fsync-every', type=int, default=0, help="journal records per fsync (0: leave to the OS)")
+    parser.add_argument('--min-efficiency', type=float, default=0.7)
+    args = parser.parse_args()
+
+    names = account_names(args.accounts, prefix="shard_pigeon")
+    orders = order_stream(args.trades, names)
+    cpus = os.cpu_count() or 1
+    failed = False
+    with tempfile.TemporaryDirectory() as data_dir:
+        exchange = OpenCooinExchange(os.path.join(data_dir, "single.json"), journal=True,
+                                     fsync_every=args.fsync_every, compact_every=10 ** 9)
+        try:
+            single = run(exchange, names, orders, args.batch, args.in_flight)
+        finally:
+            exchange.close()
+        print(f"{cpus} CPUs, {args.trades} trades over {args.accounts} accounts, batches of {args.batch}")
+        print(f"{'shards':>8} {'trades/s':>12} {'speedup':>8} {'efficiency':>11}")
+        print(f"{'-':>8} {single:>12,.0f} {'(one in-process exchange)':>20}")
+
+        first = None
+        for shards in args.shards:
+            exchange = ShardedExchange(os.path.join(data_dir, f"sharded_{shards}"), shards,
+                                       fsync_every=args.fsync_every, compact_every=10 ** 9)
+            try:
+                rate = run(exchange, names, orders, args.batch, args.in_flight)
+            finally:
+                exchange.close()
+            first = first or (rate, shards)
+            speedup = rate / first[0] * first[1]
+            efficiency = speedup / shards
+            checked = shards <= cpus
+            failed |= checked and efficiency < args.min_efficiency
+            print(f"{shards:>8} {rate:>12,.0f} {speedup:>7.2f}x {efficiency:>10.0%}{'' if checked else ' *'}")
+
+    if any(shards > cpus for shards in args.shards):
+        print(f"* more shards than CPUs, not checked")
+    if failed:
+        print(f"REGRESSION: scaling efficiency below {args.min_efficiency:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for large histories.
+
+Generates synthetic histories, stores them either as a lazily loaded
+history segment or inline in the JSON data file, and measures in a fresh
+interpreter how long OpenCooinExchange() takes to start, its peak RSS and
+the time to fetch one account's first history page.
+
+    python benchmarks/bench_startup.py [--sizes 10000 1000000 10000000] [--json-max 1000000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import write_data
+
+PROBE = """
+import json, resource, sys, time
+from opencooin import OpenCooinExchange
+start = time.perf_counter()
+exchange = OpenCooinExchange(sys.argv[1], history_segment=sys.argv[2] == 'segment')
+startup = time.perf_counter() - start
+start = time.perf_counter()
+page = exchange.get_user_transactions('pigeon_0', 20)
+query = time.perf_counter() - start
+# ru_maxrss survives exec on Linux and would report the parent's peak
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except OSError:
+    pass
+print(json.dumps({
+    'startup_s': startup,
+    'first_page_ms': query * 1000,
+    'rss_mb': rss_kb / 1024,
+    'rows': len(exchange.transactions),
+    'page': len(page),
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--json-max', type=int, default=1_000_000,
+                        help="largest history also measured in the inline JSON format")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'format':>8} {'startup s':>10} {'page ms':>8} {'rss MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.sizes:
+            formats = ['segment'] + (['json'] if rows <= args.json_max else [])
+            for fmt in formats:
+                data_file = write_data(directory, rows, args.users, fmt)
+                result = subprocess.run([sys.executable, '-c', PROBE, data_file, fmt], cwd=ROOT,
+                                        check=True, capture_output=True, text=True)
+                stats = json.loads(result.stdout)
+                assert stats['rows'] == rows and stats['page'] == min(20, rows // args.users)
+                print(f"{rows:>10} {fmt:>8} {stats['startup_s']:>10.3f} "
+                      f"{stats['first_page_ms']:>8.2f} {stats['rss_mb']:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
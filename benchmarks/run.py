@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the exchange hot paths.
+
+Runs each case on synthetic data at every history size, writes the results
+as JSON and compares them against benchmarks/suite_baseline.json. Exits
+non-zero when a metric is worse than its baseline by more than the
+tolerance.
+
+    create   accounts created per second (journal and SQLite storage)
+    trade    buy/sell throughput: single trades and execute_batch on a
+             journal, single trades on the whole-file JSON storage
+    history  latency of a first page, a deep page, a type filter and a time
+             range (in-memory log and SQLite)
+    load     cold start from an inline JSON file, a history segment and a
+             snapshot plus journal tail
+    save     save_data with inline JSON, a history segment and journal
+             compaction
+
+    python benchmarks/run.py [--sizes 10000 100000] [--cases trade history] [--output results.json]
+    python benchmarks/run.py --update-baseline
+
+The baseline is machine specific: regenerate it on the machine that runs
+the comparison.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from opencooin import OpenCooinExchange, SqliteStorage
+from opencooin.pricing import np
+from opencooin.storage import migrate_json_to_sqlite
+from synthetic import account_names, order_stream, write_data
+
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'suite_baseline.json')
+# Units where a bigger number is better; everything else is a duration
+RATE_UNITS = ('ops/s',)
+
+
+class Suite:
+    """Collects samples; each case function adds one per metric per pass
+
+    The suite runs every case repeat times over and keeps the best sample
+    of each metric: the run least disturbed by the rest of the machine.
+    Passes rather than back-to-back repeats, so that a stretch of noise
+    spoils one sample of many metrics instead of all samples of a few.
+    """
+
+    def __init__(self, directory: str, sizes: List[int], users: int):
+        self.directory = directory
+        self.sizes = sizes
+        self.users = users
+        self.samples: Dict[str, List[float]] = {}
+        self.units: Dict[str, str] = {}
+        self.data_files: Dict = {}
+
+    def measure(self, name: str, run: Callable[[], float], unit: str):
+        """Take one sample of a metric
+
+        Like timeit, run is called with the garbage collector off: how long
+        its passes take depends on everything else alive in this process.
+        """
+        gc.collect()
+        gc.disable()
+        try:
+            sample = run()
+        finally:
+            gc.enable()
+        self.samples.setdefault(name, []).append(sample)
+        self.units[name] = unit
+
+    def results(self) -> Dict[str, Dict]:
+        """Best sample and unit of every metric"""
+        return {
+            name: {'value': max(samples) if self.units[name] in RATE_UNITS else min(samples),
+                   'unit': self.units[name]}
+            for name, samples in self.samples.items()
+        }
+
+    def data_file(self, rows: int, fmt: str) -> str:
+        """A synthetic data file, generated once per size and format"""
+        key = (rows, fmt)
+        if key not in self.data_files:
+            directory = os.path.join(self.directory, f"{fmt}_{rows}")
+            os.makedirs(directory)
+            self.data_files[key] = write_data(directory, rows, self.users, fmt)
+        return self.data_files[key]
+
+    def scratch(self, name: str) -> str:
+        """A fresh path in a new directory"""
+        directory = tempfile.mkdtemp(dir=self.directory)
+        return os.path.join(directory, name)
+
+
+def exchange_with_history(suite: Suite, rows: int, fmt: str = 'segment', **options) -> OpenCooinExchange:
+    """An exchange on a private copy of a synthetic data file
+
+    Writes go to the copy; a segment copy still reads the shared segment.
+    """
+    data_file = suite.scratch("exchange.json")
+    source = suite.data_file(rows, fmt)
+    with open(source) as f:
+        data = json.load(f)
+    if fmt == 'segment':
+        data['history_segment'] = os.path.relpath(os.path.splitext(source)[0] + ".txseg",
+                                                  os.path.dirname(data_file))
+    with open(data_file, 'w') as f:
+        json.dump(data, f)
+    return OpenCooinExchange(data_file, history_segment=fmt == 'segment', **options)
+
+
+def run_trades(exchange: OpenCooinExchange, orders) -> float:
+    """Trades per second for single buy_coo/sell_coo calls"""
+    start = time.perf_counter()
+    for account, side, amount in orders:
+        if side == 'buy':
+            exchange.buy_coo(account, amount)
+        else:
+            exchange.sell_coo(account, amount)
+    return len(orders) / (time.perf_counter() - start)
+
+
+def case_create(suite: Suite, args):
+    count = args.accounts
+    names = account_names(count, "new_pigeon")
+
+    def run(storage_factory) -> float:
+        exchange = OpenCooinExchange(suite.scratch("create.json"), journal=True, fsync_every=0,
+                                     storage=storage_factory())
+        start = time.perf_counter()
+        for name in names:
+            exchange.create_account(name)
+        elapsed = time.perf_counter() - start
+        exchange.close()
+        return count / elapsed
+
+    suite.measure("create.journal", lambda: run(lambda: None), 'ops/s')
+    suite.measure("create.sqlite", lambda: run(lambda: SqliteStorage(suite.scratch("create.db"))), 'ops/s')
+
+
+def case_trade(suite: Suite, args):
+    names = account_names(suite.users)
+    orders = order_stream(args.trades, names)
+    for rows in suite.sizes:
+        def journal_singles() -> float:
+            exchange = exchange_with_history(suite, rows, journal=True, fsync_every=0, compact_every=10 ** 9)
+            rate = run_trades(exchange, orders)
+            exchange.close()
+            return rate
+
+        def journal_batches() -> float:
+            exchange = exchange_with_history(suite, rows, journal=True, fsync_every=0, compact_every=10 ** 9)
+            batches = [[{'account': account, 'type': side, 'amount': amount}
+                        for account, side, amount in orders[i:i + 100]]
+                       for i in range(0, len(orders), 100)]
+            start = time.perf_counter()
+            for batch in batches:
+                exchange.execute_batch(batch)
+            rate = len(orders) / (time.perf_counter() - start)
+            exchange.close()
+            return rate
+
+        def json_singles() -> float:
+            # Every trade rewrites the whole file, so only a few are needed
+            exchange = exchange_with_history(suite, rows)
+            rate = run_trades(exchange, orders[:args.json_trades])
+            exchange.close()
+            return rate
+
+        suite.measure(f"trade.journal.{rows}", journal_singles, 'ops/s')
+        suite.measure(f"trade.batch.{rows}", journal_batches, 'ops/s')
+        suite.measure(f"trade.json.{rows}", json_singles, 'ops/s')
+
+
+def case_history(suite: Suite, args):
+    queries = args.queries
+    for rows in suite.sizes:
+        data_file = suite.data_file(rows, 'json')
+        db_file = suite.scratch("history.db")
+        migrate_json_to_sqlite(data_file, db_file)
+        exchanges = {
+            'memory': OpenCooinExchange(data_file),
+            'sqlite': OpenCooinExchange(suite.scratch("unused.json"), storage=SqliteStorage(db_file)),
+        }
+        now = datetime.now()
+        shapes = {
+            'first_page': lambda exchange, user: exchange.get_user_transactions(user, 20),
+            'deep_page': lambda exchange, user: exchange.get_user_transactions(user, 20, before=rows // 2),
+            'filtered': lambda exchange, user: exchange.get_user_transactions(user, 20, tx_type='sell'),
+            'range': lambda exchange, user: exchange.get_user_transactions(
+                user, 20, since=now - timedelta(seconds=rows * 3 // 4), until=now - timedelta(seconds=rows // 4)),
+        }
+        for backend, exchange in exchanges.items():
+            for shape, query in shapes.items():
+                rng = random.Random(1)
+                users = [f"pigeon_{rng.randrange(suite.users)}" for _ in range(queries)]
+
+                def run() -> float:
+                    start = time.perf_counter()
+                    for user in users:
+                        query(exchange, user)
+                    return (time.perf_counter() - start) / queries * 1e6
+
+                suite.measure(f"history.{backend}.{shape}.{rows}", run, 'us')
+            exchange.close()
+
+
+def case_load(suite: Suite, args):
+    for rows in suite.sizes:
+        formats = {
+            'json': (suite.data_file(rows, 'json'), {}),
+            'segment': (suite.data_file(rows, 'segment'), {'history_segment': True}),
+        }
+        # A snapshot with a tail of journaled trades to replay
+        exchange = exchange_with_history(suite, rows, 'json', journal=True, fsync_every=0, compact_every=10 ** 9)
+        run_trades(exchange, order_stream(args.journal_tail, account_names(suite.users)))
+        exchange.close()
+        formats['journal'] = (exchange.storage.data_file, {'journal': True})
+
+        for fmt, (data_file, options) in formats.items():
+            def run() -> float:
+                start = time.perf_counter()
+                exchange = OpenCooinExchange(data_file, **options)
+                elapsed = time.perf_counter() - start
+                exchange.close()
+                return elapsed * 1000
+
+            suite.measure(f"load.{fmt}.{rows}", run, 'ms')
+
+
+def case_save(suite: Suite, args):
+    for rows in suite.sizes:
+        exchanges = {
+            'json': exchange_with_history(suite, rows, 'json'),
+            'segment': exchange_with_history(suite, rows),
+            'journal': exchange_with_history(suite, rows, journal=True),
+        }
+        for fmt, exchange in exchanges.items():
+            def run() -> float:
+                start = time.perf_counter()
+                exchange.save_data()
+                return (time.perf_counter() - start) * 1000
+
+            suite.measure(f"save.{fmt}.{rows}", run, 'ms')
+            exchange.close()
+
+
+CASES = {
+    'create': case_create,
+    'trade': case_trade,
+    'history': case_history,
+    'load': case_load,
+    'save': case_save,
+}
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> bool:
+    """Print results against the baseline; returns whether any regressed"""
+    failed = False
+    print(f"\n{'metric':<32} {'baseline':>14} {'now':>14} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<32} {'-':>14} {result['value']:>14,.2f}      new")
+            continue
+        change = result['value'] / base['value'] - 1
+        if result['unit'] in RATE_UNITS:
+            regressed = change < -tolerance
+        else:
+            regressed = change > tolerance
+        failed |= regressed
+        print(f"{name:<32} {base['value']:>14,.2f} {result['value']:>14,.2f} {change:>+7.0%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000],
+                        help="history sizes (rows) to run the size-dependent cases at")
+    parser.add_argument('--users', type=int, default=1000, help="accounts in the synthetic histories")
+    parser.add_argument('--repeat', type=int, default=5, help="passes over the cases; the best sample is kept")
+    parser.add_argument('--accounts', type=int, default=2000, help="accounts created by the create case")
+    parser.add_argument('--trades', type=int, default=5000, help="trades per run on the journal")
+    parser.add_argument('--json-trades', type=int, default=20, help="trades per run on the JSON storage")
+    parser.add_argument('--queries', type=int, default=500, help="history queries per run")
+    parser.add_argument('--journal-tail', type=int, default=2000, help="journaled trades replayed by load")
+    parser.add_argument('--output', help="write the results JSON here")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="allowed relative change for the worse before a metric fails; "
+                             "a quiet, dedicated machine can use a much tighter one")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        suite = Suite(directory, args.sizes, args.users)
+        for run in range(args.repeat):
+            print(f"pass {run + 1}/{args.repeat}", file=sys.stderr)
+            for case in args.cases:
+                CASES[case](suite, args)
+    results = suite.results()
+    for name, result in results.items():
+        print(f"{name:<32} {result['value']:>14,.2f} {result['unit']}")
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np is not None,
+            'sizes': args.sizes,
+            'repeat': args.repeat,
+            'date': datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if compare(results, baseline['results'], args.tolerance):
+        print(f"FAIL: regressions beyond {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Synthetic data for the benchmarks: histories, data files and order streams.
+
+Everything is deterministic for a given size and seed, so runs on the same
+machine compare like with like.
+"""
+
+import json
+import os
+import random
+import time
+from array import array
+from typing import Dict, List, Tuple
+
+from opencooin.exchange import DEFAULT_ACCOUNTS
+from opencooin.money import COO_SCALE, EUR_SCALE
+from opencooin.segment import write_segment
+from opencooin.txlog import TransactionLog
+
+
+def account_names(count: int, prefix: str = "pigeon") -> List[str]:
+    """count deterministic account names: pigeon_0, pigeon_1, ..."""
+    return [f"{prefix}_{i}" for i in range(count)]
+
+
+def synthetic_log(rows: int, users: int) -> TransactionLog:
+    """Build a log of rows transactions spread round-robin over users"""
+    log = TransactionLog()
+    for name in account_names(users):
+        log.user_id(name)
+    full, rest = divmod(rows, users)
+    log.user_col = array('I', range(users)) * full + array('I', range(rest))
+    log.type_col = array('B', [0, 1]) * (rows // 2) + array('B', [0] * (rows % 2))
+    log.coo_col = array('q', [2 * COO_SCALE]) * rows
+    log.eur_col = array('q', [1 * EUR_SCALE]) * rows
+    log.price_col = array('q', [EUR_SCALE // 2]) * rows
+    start = (int(time.time()) - rows) * 1_000_000
+    log.timestamp_col = array('q', range(start, start + rows * 1_000_000, 1_000_000))
+    log.user_positions = [array('Q', range(user, rows, users)) for user in range(users)]
+    return log
+
+
+def write_data(directory: str, rows: int, users: int, fmt: str) -> str:
+    """Write a data file holding a synthetic history and return its path
+
+    fmt 'json' puts the history inline, 'segment' in a history segment next
+    to the data file. Every account starts with 100 COO and 100 EUR.
+    """
+    data_file = os.path.join(directory, f"history_{rows}_{fmt}.json")
+    log = synthetic_log(rows, users)
+    accounts = {name: {'coo_balance': 100.0, 'eur_balance': 100.0}
+                for name in list(log.users) + list(DEFAULT_ACCOUNTS)}
+    data: Dict = {'accounts': accounts}
+    if fmt == 'segment':
+        segment_file = os.path.splitext(data_file)[0] + ".txseg"
+        write_segment(segment_file, log)
+        data.update(transactions=[], history_segment=os.path.basename(segment_file), history_rows=rows)
+    else:
+        data['transactions'] = list(log.records())
+    with open(data_file, 'w') as f:
+        json.dump(data, f)
+    return data_file
+
+
+def order_stream(count: int, names: List[str], seed: int = 1) -> List[Tuple[str, str, float]]:
+    """count random (account, 'buy' | 'sell', amount) orders, small enough to mostly fill"""
+    rng = random.Random(seed)
+    return [(rng.choice(names), 'buy', round(rng.uniform(0.01, 1.0), 2)) if rng.random() < 0.5
+            else (rng.choice(names), 'sell', round(rng.uniform(0.01, 1.0), 4))
+            for _ in range(count)]
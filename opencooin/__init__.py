@@ -0,0 +1,41 @@
+"""
+OpenCooin exchange engine.
+
+Importing this package never loads tkinter, multiprocessing, asyncio,
+concurrent.futures or hashlib; ``OpenCooinGUI``, ``ShardedExchange``,
+``GroupCommitter`` and ``Ledger`` are resolved lazily on first access.
+"""
+
+import importlib
+
+from .analytics import Analytics
+from .exchange import OpenCooinExchange, TradeError
+from .feed import MonthlyFeed, PriceFeed, PriceScheduler, PriceTick, SimulatedFeed
+from .journal import Journal
+from .metrics import Metrics
+from .pricing import PriceHistory, PriceModel
+from .session import Session
+from .storage import JournalStorage, JsonStorage, SqliteStorage, Storage
+from .txlog import TransactionLog, TxType
+
+__all__ = [
+    'OpenCooinExchange', 'TradeError', 'Analytics', 'GroupCommitter', 'Journal', 'Ledger', 'Metrics', 'PriceHistory',
+    'PriceModel', 'PriceFeed', 'PriceTick', 'MonthlyFeed', 'SimulatedFeed', 'PriceScheduler', 'Session',
+    'ShardedExchange', 'Storage', 'JsonStorage', 'JournalStorage', 'SqliteStorage', 'TransactionLog', 'TxType',
+    'OpenCooinGUI',
+]
+
+
+# Resolved on first access, by the module defining them
+LAZY = {
+    'OpenCooinGUI': '.gui',
+    'ShardedExchange': '.shard',
+    'GroupCommitter': '.batch',
+    'Ledger': '.ledger',
+}
+
+
+def __getattr__(name):
+    if name in LAZY:
+        return getattr(importlib.import_module(LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
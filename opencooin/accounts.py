@@ -0,0 +1,44 @@
+"""
+Sorted index of account names.
+"""
+
+import bisect
+from typing import Iterable, List, Tuple
+
+
+class AccountIndex:
+    """Account names in sorted order
+
+    Gives O(1) row-to-name lookups and O(log n) prefix searches for account
+    selectors, so they never have to copy or sort the accounts dict. Names
+    are only ever added; the exchange adds them under its log_lock.
+    """
+
+    __slots__ = ('names',)
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: List[str] = sorted(names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, row: int) -> str:
+        return self.names[row]
+
+    def add(self, name: str):
+        """Insert a new name at its sorted position"""
+        bisect.insort(self.names, name)
+
+    def position(self, name: str) -> int:
+        """Row of a name, or -1 if it isn't indexed"""
+        row = bisect.bisect_left(self.names, name)
+        if row < len(self.names) and self.names[row] == name:
+            return row
+        return -1
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Rows [start, end) of the names starting with prefix"""
+        start = bisect.bisect_left(self.names, prefix)
+        # Every name with the prefix sorts below prefix + the highest code point
+        end = bisect.bisect_left(self.names, prefix + '\U0010ffff', start)
+        return start, end
@@ -0,0 +1,381 @@
+"""
+Trading analytics and streaming export over the transaction history.
+
+Analytics keeps per-user and global volume, VWAP, realized P&L and monthly
+OHLC bars, all in fixed point (see opencooin.money). Once attached to an
+exchange it catches up on the existing history, then registers itself as a
+transaction listener. Each new transaction then updates the aggregates in
+O(1) as it is appended, and nothing is ever recomputed.
+
+Realized P&L uses average cost. A buy adds to the position at its price,
+and a sell realizes its proceeds minus the average cost of what it sold.
+COO that was never bought through a trade, such as a starting balance,
+has no cost. Selling more than the traded position is counted as
+unmatched_coo and left out of P&L.
+
+The export functions write transactions as CSV or JSON Lines in chunks,
+pulling them from an iterator, so memory stays constant however long the
+history is. iter_history yields the exchange's own history oldest first
+(from the memory-mapped segment, or from SQLite in chunks). iter_data_file
+parses the "transactions" array of a JSON data file incrementally, without
+loading the file, and yields them newest first as stored.
+"""
+
+import json
+import threading
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .money import COO_SCALE, EUR_SCALE, to_micro_eur, to_nano_coo
+from .txlog import TX_CODES, TxType, from_epoch_us, to_epoch_us
+
+EXPORT_FIELDS = ('id', 'user', 'type', 'coo_amount', 'eur_amount', 'price', 'timestamp')
+BUY = TxType.BUY
+
+
+class Volume:
+    """Traded amounts of a user or of the whole market"""
+
+    __slots__ = ('trades', 'buy_coo', 'buy_eur', 'sell_coo', 'sell_eur', 'notional')
+
+    def __init__(self):
+        self.trades = 0
+        self.buy_coo = self.buy_eur = self.sell_coo = self.sell_eur = 0
+        # Sum of price * COO, for the volume-weighted average price
+        self.notional = 0
+
+    def add(self, tx_type: int, coo: int, eur: int, price: int):
+        self.trades += 1
+        if tx_type == BUY:
+            self.buy_coo += coo
+            self.buy_eur += eur
+        else:
+            self.sell_coo += coo
+            self.sell_eur += eur
+        self.notional += price * coo
+
+    def as_dict(self) -> Dict:
+        coo = self.buy_coo + self.sell_coo
+        return {
+            'trades': self.trades,
+            'coo_volume': coo / COO_SCALE,
+            'eur_volume': (self.buy_eur + self.sell_eur) / EUR_SCALE,
+            'bought_coo': self.buy_coo / COO_SCALE,
+            'sold_coo': self.sell_coo / COO_SCALE,
+            'vwap': self.notional / coo / EUR_SCALE if coo else None
+        }
+
+
+class Position:
+    """A user's traded COO position at average cost, and the P&L realized from it"""
+
+    __slots__ = ('coo', 'cost', 'realized', 'unmatched')
+
+    def __init__(self):
+        self.coo = 0
+        self.cost = 0
+        self.realized = 0
+        self.unmatched = 0
+
+    def add(self, tx_type: int, coo: int, eur: int) -> int:
+        """Apply a trade and return the micro-EUR it realized"""
+        if tx_type == BUY:
+            self.coo += coo
+            self.cost += eur
+            return 0
+        matched = min(coo, self.coo)
+        self.unmatched += coo - matched
+        if not matched:
+            return 0
+        released = self.cost * matched // self.coo
+        realized = eur * matched // coo - released
+        self.coo -= matched
+        self.cost -= released
+        self.realized += realized
+        return realized
+
+    def as_dict(self) -> Dict:
+        return {
+            'position_coo': self.coo / COO_SCALE,
+            'average_cost': self.cost / self.coo * COO_SCALE / EUR_SCALE if self.coo else None,
+            'realized_pnl': self.realized / EUR_SCALE,
+            'unmatched_coo': self.unmatched / COO_SCALE
+        }
+
+
+class Bar:
+    """Open, high, low and close price and the volume of one month"""
+
+    __slots__ = ('open', 'high', 'low', 'close', 'opened', 'closed', 'volume')
+
+    def __init__(self, price: int, timestamp: int):
+        self.open = self.high = self.low = self.close = price
+        self.opened = self.closed = timestamp
+        self.volume = Volume()
+
+    def add(self, tx_type: int, coo: int, eur: int, price: int, timestamp: int):
+        # Compared by timestamp rather than arrival, so rows may come in any order
+        if timestamp < self.opened:
+            self.open, self.opened = price, timestamp
+        if timestamp >= self.closed:
+            self.close, self.closed = price, timestamp
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        self.volume.add(tx_type, coo, eur, price)
+
+    def as_dict(self, month: str) -> Dict:
+        return {
+            'month': month,
+            'open': self.open / EUR_SCALE,
+            'high': self.high / EUR_SCALE,
+            'low': self.low / EUR_SCALE,
+            'close': self.close / EUR_SCALE,
+            **self.volume.as_dict()
+        }
+
+
+class Analytics:
+    """Aggregates over a transaction history, kept current incrementally
+
+    update() is the exchange's transaction listener; feed it transactions
+    oldest first (realized P&L depends on the order). Months are local
+    calendar months, like the timestamps in transaction dicts.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users: Dict[str, Tuple[Volume, Position]] = {}
+        self.total = Volume()
+        self.realized = 0
+        self.months: Dict[str, Bar] = {}
+        # Bounds of the month the last update fell in, [start, end) epoch
+        # microseconds, so consecutive updates skip the datetime conversion
+        self.month = None
+        self.month_start = self.month_end = 0
+        self.exchange = None
+
+    def update(self, user: str, tx_type: int, coo: int, eur: int, price: int, timestamp: int):
+        """Add one transaction given in nano-COO, micro-EUR and epoch microseconds"""
+        with self.lock:
+            stats = self.users.get(user)
+            if stats is None:
+                stats = self.users[user] = (Volume(), Position())
+            stats[0].add(tx_type, coo, eur, price)
+            self.realized += stats[1].add(tx_type, coo, eur)
+            self.total.add(tx_type, coo, eur, price)
+
+            if not self.month_start <= timestamp < self.month_end:
+                self.set_month(timestamp)
+            bar = self.months.get(self.month)
+            if bar is None:
+                bar = self.months[self.month] = Bar(price, timestamp)
+            bar.add(tx_type, coo, eur, price, timestamp)
+
+    def set_month(self, timestamp: int):
+        """Switch the cached month to the one holding timestamp"""
+        moment = from_epoch_us(timestamp)
+        start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        self.month = start.strftime('%Y-%m')
+        self.month_start = to_epoch_us(start)
+        self.month_end = to_epoch_us(end)
+
+    def update_record(self, transaction: Dict):
+        """Add one transaction given in its dict form"""
+        self.update(
+            transaction['user'],
+            TX_CODES[transaction['type']],
+            to_nano_coo(transaction['coo_amount']),
+            to_micro_eur(transaction['eur_amount']),
+            to_micro_eur(transaction['price']),
+            to_epoch_us(transaction['timestamp'])
+        )
+
+    def attach(self, exchange) -> 'Analytics':
+        """Catch up on an exchange's history, then follow its new transactions
+
+        Runs under the exchange's log_lock, so no transaction is missed or
+        counted twice.
+        """
+        with exchange.log_lock:
+            if exchange.storage.queries_history:
+                # The in-memory log only holds trades since startup, which
+                # are in the database too
+                for transaction in exchange.storage.iter_transactions():
+                    self.update_record(transaction)
+            else:
+                log = exchange.transactions
+                users = log.users
+                for user_id, tx_type, coo, eur, price, timestamp in log.rows():
+                    self.update(users[user_id], tx_type, coo, eur, price, timestamp)
+            exchange.transaction_listeners.append(self.update)
+        self.exchange = exchange
+        return self
+
+    def detach(self):
+        """Stop following the exchange"""
+        if self.exchange is not None:
+            with self.exchange.log_lock:
+                self.exchange.transaction_listeners.remove(self.update)
+            self.exchange = None
+
+    def user(self, user: str) -> Optional[Dict]:
+        """Volume, VWAP, position and realized P&L of one user, None if they never traded"""
+        with self.lock:
+            stats = self.users.get(user)
+            if stats is None:
+                return None
+            return {'user': user, **stats[0].as_dict(), **stats[1].as_dict()}
+
+    def summary(self) -> Dict:
+        """Market-wide volume, VWAP and the realized P&L of all users together"""
+        with self.lock:
+            return {**self.total.as_dict(), 'traders': len(self.users), 'realized_pnl': self.realized / EUR_SCALE}
+
+    def monthly(self) -> List[Dict]:
+        """OHLC bars with volume, one per month, oldest first"""
+        with self.lock:
+            return [self.months[month].as_dict(month) for month in sorted(self.months)]
+
+
+def iter_history(exchange, chunk_size: int = 10000) -> Iterator[Dict]:
+    """An exchange's transactions oldest first, each with its 'id'
+
+    Dicts are built as they are consumed; with the SQLite backend rows are
+    fetched chunk_size at a time. Transactions appended meanwhile are not
+    included.
+    """
+    if exchange.storage.queries_history:
+        yield from exchange.storage.iter_transactions(chunk_size)
+        return
+    log = exchange.transactions
+    for position in range(len(log)):
+        transaction = log.record(position)
+        transaction['id'] = position
+        yield transaction
+
+
+class JsonStream:
+    """Incremental reader of JSON values from a text file, one buffer at a time"""
+
+    WHITESPACE = ' \t\n\r'
+
+    def __init__(self, f: TextIO, buffer_size: int = 1 << 20):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        """Append the next block of the file, dropping what was consumed"""
+        data = self.f.read(self.buffer_size)
+        if not data:
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character ('' at the end of the file)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of chars"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} in JSON, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value, reading more of the file as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number ending the buffer may continue in the next block
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator:
+        """Decode the elements of an array one by one"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def iter_data_file(path: str) -> Iterator[Dict]:
+    """The transactions stored inline in a JSON data file, newest first as stored
+
+    Only holds one buffer and one transaction in memory. A journal next to
+    the file and history kept in a segment aren't read; open the exchange
+    and use iter_history for those.
+    """
+    with open(path) as f:
+        stream = JsonStream(f)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key == 'transactions':
+                yield from stream.array()
+            else:
+                stream.value()
+            if stream.expect(',}') == '}':
+                return
+
+
+def chunks(transactions: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    """Lists of up to chunk_size transactions"""
+    transactions = iter(transactions)
+    while True:
+        chunk = list(islice(transactions, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_csv(transactions: Iterable[Dict], out: TextIO, chunk_size: int = 10000) -> int:
+    """Write transactions as CSV with a header row and return how many were written"""
+    # Deferred, as the package imports this module and only exports need csv
+    import csv
+    writer = csv.DictWriter(out, EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for chunk in chunks(transactions, chunk_size):
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def export_jsonl(transactions: Iterable[Dict], out: TextIO, chunk_size: int = 10000) -> int:
+    """Write transactions as JSON Lines and return how many were written"""
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    count = 0
+    for chunk in chunks(transactions, chunk_size):
+        out.write(''.join(encode(transaction) + '\n' for transaction in chunk))
+        count += len(chunk)
+    return count
+
+
+EXPORTERS = {'csv': export_csv, 'jsonl': export_jsonl}
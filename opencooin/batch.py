@@ -0,0 +1,90 @@
+"""
+Group commit: merge orders from concurrent callers into batched flushes.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict
+
+
+class GroupCommitter:
+    """Queue orders and execute them through execute_batch every few ms
+
+    Callers get a Future per order. A single worker thread waits for the
+    first order, keeps collecting for up to ``interval`` seconds (or until
+    ``max_batch`` orders are queued) and then validates, applies and
+    persists the whole group with one durable write.
+    """
+
+    def __init__(self, exchange, interval: float = 0.005, max_batch: int = 1000):
+        self.exchange = exchange
+        self.interval = interval
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.closed = False
+        # Held to check closed and enqueue, so nothing lands after the sentinel
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self.run, name="opencooin-group-commit", daemon=True)
+        self.worker.start()
+
+    def submit(self, order: Dict) -> Future:
+        """Queue an order, the future resolves to its execute_batch result"""
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("group committer is closed")
+            self.queue.put((order, future))
+        return future
+
+    async def submit_async(self, order: Dict) -> Dict:
+        """Queue an order and await its result from asyncio code"""
+        # Deferred: asyncio costs headless imports of the package ~40 ms
+        import asyncio
+        return await asyncio.wrap_future(self.submit(order))
+
+    def run(self):
+        """Worker loop collecting and flushing groups of orders"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            group = [item]
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(group) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                group.append(item)
+            self.flush(group)
+            if stop:
+                return
+
+    def flush(self, group):
+        """Execute one group and resolve its futures"""
+        try:
+            results = self.exchange.execute_batch([order for order, _ in group])
+        except Exception as e:
+            for _, future in group:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(group, results):
+            future.set_result(result)
+
+    def close(self):
+        """Flush queued orders and stop the worker"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(None)
+        self.worker.join()
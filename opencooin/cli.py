@@ -0,0 +1,420 @@
+"""
+Headless command line interface to the OpenCooin exchange.
+
+    python -m opencooin price
+    python -m opencooin buy homer_pigeon 25
+    python -m opencooin history homer_pigeon --limit 5 --json
+    python -m opencooin ticker --simulate 2000 --count 10000
+    python -m opencooin serve --port 8642
+    python -m opencooin loadgen --spawn --connections 32 --duration 10
+    python -m opencooin --metrics-port 9642 --profile-dir /tmp serve
+    python -m opencooin report homer_pigeon --monthly
+    python -m opencooin export --format csv --output history.csv
+    python -m opencooin ledger verify --trusted head.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from typing import List, Optional
+
+from .analytics import EXPORTERS, Analytics, iter_data_file, iter_history
+from .exchange import OpenCooinExchange
+from .feed import SimulatedFeed
+from .metrics import DEFAULT_METRICS_PORT, JsonDumper, Metrics, MetricsServer, Profiler
+from .money import balance_to_floats
+from .pricing import PriceModel
+from .server import DEFAULT_PORT, serve
+from .storage import SqliteStorage, migrate_json_to_sqlite
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for all subcommands"""
+    parser = argparse.ArgumentParser(prog='opencooin', description="OpenCooin exchange, headless")
+    parser.add_argument('--data-file', default="opencooin_data.json", help="exchange data file")
+    parser.add_argument('--journal', action='store_true', help="use the append-only journal storage mode")
+    parser.add_argument('--history-segment', action='store_true',
+                        help="keep transaction history in a lazily loaded binary segment")
+    parser.add_argument('--sqlite', metavar='DB', help="use an SQLite database instead of the data file")
+    parser.add_argument('--json', action='store_true', help="print machine-readable JSON")
+    parser.add_argument('--metrics-port', type=int, nargs='?', const=DEFAULT_METRICS_PORT, metavar='PORT',
+                        help=f"serve Prometheus metrics on /metrics (default port {DEFAULT_METRICS_PORT})")
+    parser.add_argument('--metrics-file', metavar='PATH', help="dump metrics as JSON to PATH periodically")
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help="seconds between JSON dumps")
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help="toggle cProfile with SIGUSR1 and tracemalloc with SIGUSR2, writing to DIR")
+    parser.add_argument('--ledger', action='store_true',
+                        help="hash every transaction into a tamper-evident ledger next to the data file")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('price', help="show the current price")
+    commands.add_parser('accounts', help="list accounts and balances")
+
+    create = commands.add_parser('create', help="create an account")
+    create.add_argument('name')
+
+    balance = commands.add_parser('balance', help="show an account balance")
+    balance.add_argument('account')
+
+    buy = commands.add_parser('buy', help="buy COO with EUR")
+    buy.add_argument('account')
+    buy.add_argument('eur_amount', type=float)
+
+    sell = commands.add_parser('sell', help="sell COO for EUR")
+    sell.add_argument('account')
+    sell.add_argument('coo_amount', type=float)
+
+    history = commands.add_parser('history', help="show an account's transactions")
+    history.add_argument('account')
+    history.add_argument('--limit', type=non_negative_int, default=20)
+    history.add_argument('--type', dest='tx_type', choices=['buy', 'sell'])
+    history.add_argument('--before', type=int, help="continue after the transaction with this id")
+
+    migrate = commands.add_parser('migrate', help="import a JSON data file into an SQLite database")
+    migrate.add_argument('source', help="JSON data file")
+    migrate.add_argument('target', help="SQLite database to create")
+
+    ticker = commands.add_parser('ticker', help="stream price ticks from the price feed")
+    ticker.add_argument('--count', type=int, default=1, help="ticks to print before exiting")
+    ticker.add_argument('--simulate', type=float, metavar='RATE',
+                        help="replace the monthly price with a random walk at RATE ticks per second")
+
+    serve = commands.add_parser('serve', help="serve the line-protocol JSON API")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT, help="0 picks a free port")
+
+    loadgen = commands.add_parser('loadgen', help="load test a running server")
+    loadgen.add_argument('--host', default='127.0.0.1')
+    loadgen.add_argument('--port', type=int, default=DEFAULT_PORT)
+    loadgen.add_argument('--spawn', action='store_true', help="start a throwaway server for the test")
+    loadgen.add_argument('--connections', type=int, default=32)
+    loadgen.add_argument('--pipeline', type=int, default=8, help="requests in flight per connection")
+    loadgen.add_argument('--duration', type=float, default=10.0, help="seconds")
+    loadgen.add_argument('--accounts', type=int, default=100)
+    loadgen.add_argument('--processes', type=int, default=1, help="client processes sharing the connections")
+
+    report = commands.add_parser('report', help="show volume, VWAP and realized P&L")
+    report.add_argument('account', nargs='?', help="one account instead of the whole market")
+    report.add_argument('--monthly', action='store_true', help="add monthly OHLC bars")
+
+    export = commands.add_parser('export', help="write the transaction history as CSV or JSON Lines")
+    export.add_argument('--format', choices=sorted(EXPORTERS), default='csv')
+    export.add_argument('--output', metavar='PATH', help="file to write (default: standard output)")
+    export.add_argument('--from-file', metavar='DATA_FILE',
+                        help="stream the transactions stored in a JSON data file without opening an exchange")
+
+    ledger = commands.add_parser('ledger',
+                                 help="show, verify, prove against, start or recover the tamper-evident ledger")
+    ledger.add_argument('action', choices=['head', 'verify', 'proof', 'init', 'recover'])
+    ledger.add_argument('position', type=int, nargs='?', help="transaction to prove, 0 is the oldest")
+    ledger.add_argument('--workers', type=int, help="verification processes (default: one per CPU)")
+    ledger.add_argument('--trusted', metavar='HEAD_FILE',
+                        help="check against the JSON of an earlier 'ledger head --json'")
+
+    commands.add_parser('gui', help="start the trading window")
+    return parser
+
+
+def non_negative_int(text: str) -> int:
+    """argparse type for counts"""
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {value}")
+    return value
+
+
+def output(args, data, text: str):
+    """Print a result either as JSON or as text"""
+    print(json.dumps(data) if args.json else text)
+
+
+def run_command(args, exchange: OpenCooinExchange) -> int:
+    """Execute one parsed command against the exchange"""
+    if args.command == 'price':
+        change = exchange.get_price_change()
+        output(args, {
+            'price': exchange.current_price,
+            'change': change,
+            'next_update': exchange.get_next_update_date()
+        }, f"€{exchange.current_price:.4f} ({'+' if change >= 0 else ''}{change:.2f}%), "
+           f"next update {exchange.get_next_update_date()}")
+        return 0
+
+    if args.command == 'accounts':
+        balances = {name: balance_to_floats(balance) for name, balance in exchange.accounts.items()}
+        output(args, balances, '\n'.join(
+            f"{name} - {balance['coo_balance']:.2f} COO | €{balance['eur_balance']:.2f}"
+            for name, balance in balances.items()
+        ))
+        return 0
+
+    if args.command == 'create':
+        if not exchange.create_account(args.name):
+            output(args, {'ok': False}, "Account already exists or invalid name!")
+            return 1
+        output(args, {'ok': True}, f"Account '{args.name}' created, starting bonus €100")
+        return 0
+
+    if args.command == 'ticker':
+        return asyncio.run(stream_ticks(args, exchange))
+
+    if args.command == 'report':
+        return report(args, exchange)
+
+    if args.command == 'export':
+        return export(args, iter_history(exchange))
+
+    if args.command == 'ledger':
+        return ledger_command(args, exchange)
+
+    session = exchange.login(args.account)
+    if not session:
+        output(args, {'ok': False, 'error': 'unknown account'}, f"Unknown account '{args.account}'")
+        return 1
+
+    if args.command == 'balance':
+        balance = session.get_balance()
+        output(args, balance, f"{balance['coo_balance']:.4f} COO | €{balance['eur_balance']:.2f}")
+        return 0
+
+    if args.command in ('buy', 'sell'):
+        # A batch of one, for the reason a trade is rejected
+        amount = args.eur_amount if args.command == 'buy' else args.coo_amount
+        result, = exchange.execute_batch([{'account': session.account_name, 'type': args.command, 'amount': amount}])
+        if not result['ok']:
+            error = result['error']
+            output(args, {'ok': False, 'error': error}, f"{error[:1].upper()}{error[1:]}!")
+            return 1
+        # Amounts are reported from the recorded transaction, as rounded to the money scale
+        tx = result['transaction']
+        output(args, {'ok': True, 'coo_amount': tx['coo_amount'], 'eur_amount': tx['eur_amount']},
+               f"{'Bought' if args.command == 'buy' else 'Sold'} {tx['coo_amount']:.4f} COO "
+               f"for €{tx['eur_amount']:.2f}")
+        return 0
+
+    if args.command == 'history':
+        transactions = session.get_transactions(args.limit, tx_type=args.tx_type, before=args.before)
+        output(args, transactions, '\n'.join(
+            f"{tx['id']:>8} {tx['type'].upper():4} | {tx['coo_amount']:8.4f} COO | "
+            f"€{tx['eur_amount']:7.2f} | €{tx['price']:.4f}/COO | {tx['timestamp']}"
+            for tx in transactions
+        ) or "No transactions yet.")
+        return 0
+
+    raise ValueError(f"unknown command {args.command}")
+
+
+def report(args, exchange: OpenCooinExchange) -> int:
+    """Print market-wide or per-account analytics"""
+    analytics = Analytics().attach(exchange)
+    if args.account:
+        stats = analytics.user(args.account)
+        if stats is None:
+            output(args, {'ok': False, 'error': 'no trades'}, f"No trades for '{args.account}'")
+            return 1
+        text = (f"{stats['trades']} trades, {stats['coo_volume']:.4f} COO / €{stats['eur_volume']:.2f}, "
+                f"VWAP €{stats['vwap']:.4f}, position {stats['position_coo']:.4f} COO, "
+                f"realized P&L €{stats['realized_pnl']:+.2f}")
+    else:
+        stats = analytics.summary()
+        vwap = f"€{stats['vwap']:.4f}" if stats['vwap'] is not None else "-"
+        text = (f"{stats['trades']} trades by {stats['traders']} accounts, {stats['coo_volume']:.4f} COO / "
+                f"€{stats['eur_volume']:.2f}, VWAP {vwap}, realized P&L €{stats['realized_pnl']:+.2f}")
+    if args.monthly:
+        bars = analytics.monthly()
+        stats = {**stats, 'monthly': bars}
+        text = '\n'.join([text] + [
+            f"{bar['month']}  O {bar['open']:.4f}  H {bar['high']:.4f}  L {bar['low']:.4f}  "
+            f"C {bar['close']:.4f}  {bar['trades']:>8} trades  {bar['coo_volume']:.4f} COO"
+            for bar in bars
+        ])
+    output(args, stats, text)
+    return 0
+
+
+def export(args, transactions) -> int:
+    """Stream transactions to the output file or standard output"""
+    exporter = EXPORTERS[args.format]
+    if not args.output:
+        exporter(transactions, sys.stdout)
+        return 0
+    with open(args.output, 'w', newline='') as f:
+        count = exporter(transactions, f)
+    print(f"Exported {count} transactions to {args.output}", file=sys.stderr)
+    return 0
+
+
+def ledger_command(args, exchange: OpenCooinExchange) -> int:
+    """Open the exchange's ledger, read-only unless initializing or recovering it, and run the action"""
+    # Deferred: hashlib is only needed with a ledger
+    from .ledger import Ledger, LedgerError, ledger_path
+    try:
+        ledger = Ledger(ledger_path(exchange.storage), read_only=args.action not in ('init', 'recover'))
+    except LedgerError as e:
+        output(args, {'ok': False, 'error': str(e)}, str(e))
+        return 1
+    try:
+        return ledger_action(args, exchange, ledger)
+    except LedgerError as e:
+        output(args, {'ok': False, 'error': str(e)}, str(e))
+        return 1
+    finally:
+        ledger.close()
+
+
+def ledger_action(args, exchange: OpenCooinExchange, ledger) -> int:
+    """Print the ledger head, verify the ledger, print an inclusion proof, or initialize or recover it"""
+    if args.action == 'init':
+        count = ledger.initialize(exchange)
+        head = ledger.head()
+        output(args, head, f"Ledger started over {count} transactions, chain {head['chain']}")
+        return 0
+
+    if args.action == 'recover':
+        dropped = ledger.recover(exchange)
+        output(args, {'ok': True, 'dropped': dropped},
+               f"Dropped {dropped} ledger entries the history lost" if dropped else "Nothing to recover")
+        return 0
+
+    if args.action == 'head':
+        head = ledger.head()
+        output(args, head, f"{head['rows']} transactions, chain {head['chain']}\n"
+                           f"{head['blocks']} blocks, root {head['root'] or '-'}")
+        return 0
+
+    if args.action == 'proof':
+        try:
+            proof = ledger.proof(args.position if args.position is not None else -1)
+        except ValueError as e:
+            output(args, {'ok': False, 'error': str(e)}, str(e))
+            return 1
+        if proof['position'] >= len(exchange.transactions):
+            error = f"transaction {proof['position']} is not in the history"
+            output(args, {'ok': False, 'error': error}, error)
+            return 1
+        transaction = exchange.transactions.record(proof['position'])
+        output(args, {**proof, 'transaction': transaction}, '\n'.join(
+            [f"transaction {proof['position']}: {json.dumps(transaction)}", f"leaf {proof['leaf']}"]
+            + [f"  {side:>5} {sibling}" for side, sibling in proof['path']]
+            + [f"root {proof['root']} ({proof['blocks']} blocks)"]))
+        return 0
+
+    trusted = None
+    if args.trusted:
+        with open(args.trusted) as f:
+            trusted = json.load(f)
+    with exchange.metrics.timer('ledger_verify'):
+        result = ledger.verify(exchange.transactions, args.workers, trusted)
+    if result['ok']:
+        text = f"OK: {result['rows']} transactions in {result['blocks']} checkpointed blocks"
+    else:
+        more = result['problem_count'] - len(result['problems'])
+        text = '\n'.join(["TAMPERED:"] + result['problems'] + ([f"... and {more} more"] if more else []))
+    output(args, result, text)
+    return 0 if result['ok'] else 1
+
+
+async def stream_ticks(args, exchange: OpenCooinExchange) -> int:
+    """Print ticks from the exchange's price scheduler as they arrive"""
+    ticks = exchange.price_scheduler.subscribe_queue(maxsize=args.count)
+    start = None
+    for _ in range(args.count):
+        tick = await ticks.get()
+        start = start or time.perf_counter()
+        output(args, {
+            'seq': tick.seq,
+            'price': tick.price,
+            'change': tick.change,
+            'next_update': tick.next_update.isoformat() if tick.next_update else None
+        }, f"{tick.seq:>8} €{tick.price:.4f} ({'+' if tick.change >= 0 else ''}{tick.change:.2f}%)")
+    exchange.price_scheduler.unsubscribe(ticks)
+    if args.count > 1 and not args.json:
+        elapsed = time.perf_counter() - start
+        print(f"{args.count} ticks in {elapsed:.2f}s ({(args.count - 1) / max(elapsed, 1e-9):.0f} ticks/s)")
+    return 0
+
+
+def start_exporters(args, metrics: Metrics) -> List:
+    """Start the metrics exporters asked for on the command line"""
+    exporters = []
+    if args.metrics_port is not None:
+        server = MetricsServer(metrics, port=args.metrics_port)
+        server.start()
+        exporters.append(server)
+    if args.metrics_file:
+        dumper = JsonDumper(metrics, args.metrics_file, args.metrics_interval)
+        dumper.start()
+        exporters.append(dumper)
+    if args.profile_dir:
+        Profiler(args.profile_dir).install_signals()
+    return exporters
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point for ``python -m opencooin``"""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.command == 'migrate':
+        count = migrate_json_to_sqlite(args.source, args.target)
+        output(args, {'ok': True, 'transactions': count},
+               f"Imported {count} transactions from {args.source} into {args.target}")
+        return 0
+
+    if args.command == 'export' and args.from_file:
+        return export(args, iter_data_file(args.from_file))
+
+    if args.command == 'loadgen':
+        # Imported here, the load generator is a client and needs no exchange
+        from . import loadgen
+        stats = loadgen.main(args.host, args.port, args.connections, args.pipeline, args.duration,
+                             args.accounts, args.processes, args.spawn)
+        output(args, stats, '\n'.join(
+            [f"{stats['requests']} requests in {stats['seconds']:.1f}s: {stats['rps']:,.0f} req/s "
+             f"({stats['ok']} ok, {stats['rejected']} rejected, {stats['errors']} errors)"]
+            + ([f"latency p50 {stats['p50_ms']:.2f} ms, p90 {stats['p90_ms']:.2f} ms, "
+                f"p99 {stats['p99_ms']:.2f} ms, p99.9 {stats['p999_ms']:.2f} ms, max {stats['max_ms']:.2f} ms"]
+               if stats['requests'] else [])))
+        return 0
+
+    storage = SqliteStorage(args.sqlite) if args.sqlite else None
+    price_feed = None
+    if args.command == 'ticker' and args.simulate:
+        price_feed = SimulatedFeed(PriceModel().current_price(), rate=args.simulate)
+    metrics = Metrics(enabled=args.metrics_port is not None or bool(args.metrics_file))
+    exporters = start_exporters(args, metrics)
+    try:
+        # The ledger command opens the ledger itself, read-only unless it initializes or recovers it
+        exchange = OpenCooinExchange(args.data_file, journal=args.journal, history_segment=args.history_segment,
+                                     storage=storage, price_feed=price_feed, metrics=metrics,
+                                     ledger=args.ledger and args.command != 'ledger')
+    except Exception as e:
+        # Deferred like the ledger itself, which is all that raises it
+        from .ledger import LedgerError
+        for exporter in exporters:
+            exporter.stop()
+        if not isinstance(e, LedgerError):
+            raise
+        output(args, {'ok': False, 'error': str(e)}, f"Ledger: {e}")
+        return 1
+    try:
+        if args.command == 'serve':
+            try:
+                asyncio.run(serve(exchange, args.host, args.port,
+                                  ready=lambda server: print(f"Listening on {server.host}:{server.port}", flush=True)))
+            except KeyboardInterrupt:
+                pass
+            return 0
+        if args.command == 'gui':
+            # Deferred so every other command works without a display
+            from .gui import OpenCooinGUI
+            OpenCooinGUI(exchange).run()
+            return 0
+        return run_command(args, exchange)
+    finally:
+        exchange.close()
+        # After close, so a last JSON dump covers the final writes
+        for exporter in exporters:
+            exporter.stop()
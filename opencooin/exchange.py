@@ -0,0 +1,475 @@
+"""
+OpenCooin exchange engine: accounts, pricing and trading.
+
+This module has no GUI dependency and is safe to import on headless hosts.
+"""
+
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .accounts import AccountIndex
+from .feed import MonthlyFeed, PriceFeed, PriceScheduler
+from .metrics import Metrics
+from .money import (COO_SCALE, EUR_SCALE, balance_from_floats, balance_to_floats, coo_for_eur, eur_for_coo,
+                    to_micro_eur, to_nano_coo)
+from .pricing import PriceHistory, PriceModel, np
+from .session import Session
+from .storage import JournalStorage, JsonStorage, Storage
+from .txlog import TX_CODES, TX_NAMES, TransactionLog, tx_code
+
+LOCK_STRIPES = 64
+DEFAULT_ACCOUNTS = {
+    'homer_pigeon': {'coo_balance': 500.0, 'eur_balance': 1000.0},
+    'racing_pete': {'coo_balance': 750.0, 'eur_balance': 500.0},
+    'city_pigeon_bob': {'coo_balance': 300.0, 'eur_balance': 2000.0},
+    'carrier_clara': {'coo_balance': 1000.0, 'eur_balance': 800.0},
+    'pigeon_mike': {'coo_balance': 250.0, 'eur_balance': 1500.0}
+}
+
+
+class TradeError(Exception):
+    """Raised when an order can't be executed"""
+
+
+class OpenCooinExchange:
+    """Thread-safe exchange engine
+
+    Balance checks and updates run under a per-account lock (striped over
+    LOCK_STRIPES locks), so trades on different accounts don't wait on each
+    other while validating. Publishing the result, i.e. storing the new
+    balances, appending to the transaction log and persisting, is serialized
+    by log_lock. Lock order is always account lock(s) first, then log_lock.
+
+    Balances are {'coo', 'eur'} dicts of nano-COO and micro-EUR and prices
+    are handled as micro-EUR per COO (see opencooin.money); the float
+    amounts taken and returned by the public methods are converted at the
+    edge.
+
+    metrics (see opencooin.metrics) times loading, saving, persisting and
+    trades and counts trade results; it is disabled unless one is passed
+    enabled or it is enabled later.
+
+    With ledger set, every transaction is also hashed into a tamper-evident
+    ledger next to the data file (see opencooin.ledger). A ledger that
+    doesn't match the history raises LedgerError.
+    """
+
+    def __init__(self, data_file: str = "opencooin_data.json", journal: bool = False,
+                 fsync_every: int = 1, compact_every: int = 10000, history_segment: bool = False,
+                 storage: Optional[Storage] = None, price_feed: Optional[PriceFeed] = None,
+                 metrics: Optional[Metrics] = None, default_accounts: bool = True, ledger: bool = False):
+        self.accounts = {}
+        # Funds reserved by resting orders; they are out of accounts but
+        # still part of the balance that is persisted
+        self.holds = {}
+        self.account_index = AccountIndex()
+        self.transactions = TransactionLog()
+        # Called as listener(user, type, nano-COO, micro-EUR, price, epoch
+        # microseconds) for every transaction appended, under log_lock
+        self.transaction_listeners = []
+        self.price_model = PriceModel()
+        self.price_history = PriceHistory(self.price_model)
+        # Trades use the feed's price; the scheduler publishing its ticks
+        # only starts once something subscribes
+        self.price_feed = price_feed or MonthlyFeed(self.price_model)
+        self.price_scheduler = PriceScheduler(self.price_feed)
+        self.account_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.log_lock = threading.RLock()
+        # Without an explicit storage, data_file and the journal options pick
+        # one of the JSON backends
+        if storage is None:
+            if journal:
+                storage = JournalStorage(data_file, fsync_every, compact_every, history_segment)
+            else:
+                storage = JsonStorage(data_file, history_segment)
+        self.storage = storage
+        self.metrics = metrics or Metrics()
+        self.register_gauges()
+        self.load_data()
+        if default_accounts:
+            self.initialize_default_accounts()
+        self.ledger = None
+        if ledger:
+            # Deferred: hashlib is only needed with a ledger
+            from .ledger import Ledger, LedgerError, ledger_path
+            ledger = Ledger(ledger_path(self.storage))
+            try:
+                self.ledger = ledger.attach(self)
+            except LedgerError:
+                ledger.close()
+                raise
+            for kind, path in (('ledger', self.ledger.path), ('ledger_blocks', self.ledger.blocks_path)):
+                self.metrics.gauge('file_bytes', lambda path=path: os.path.getsize(path), file=kind)
+        self.update_price()
+
+    def register_gauges(self):
+        """Expose history length, account count and storage file sizes"""
+        self.metrics.gauge('history_rows', lambda: len(self.transactions))
+        self.metrics.gauge('accounts', lambda: len(self.accounts))
+        for kind, path in self.storage.files().items():
+            self.metrics.gauge('file_bytes', lambda path=path: os.path.getsize(path), file=kind)
+
+    def load_data(self):
+        """Load accounts and transactions from storage"""
+        with self.log_lock, self.metrics.timer('load'):
+            self.storage.load(self)
+            self.account_index = AccountIndex(self.accounts)
+
+    def save_data(self):
+        """Save accounts and transactions to storage"""
+        with self.log_lock, self.metrics.timer('save'):
+            self.storage.save(self)
+
+    def commit(self, *records: Dict):
+        """Persist mutations through the storage backend
+
+        Must be called with log_lock held, so that the storage sees records
+        in the order in which balances were published.
+        """
+        if not records:
+            return
+        # Every trade commits, so while disabled this skips even the null timer
+        if self.metrics.enabled:
+            with self.metrics.timer('persist'):
+                self.storage.persist(self, list(records))
+        else:
+            self.storage.persist(self, list(records))
+
+    def compact(self, background: bool = True):
+        """Fold incremental writes into a fresh snapshot (journal storage)"""
+        with self.metrics.timer('compact'):
+            self.storage.compact(self, background)
+
+    def account_record(self, op: str, name: str) -> Dict:
+        """Build a journal record carrying the resulting balances of an account"""
+        balance = self.stored_balance(name)
+        return {
+            'op': op,
+            'name': name,
+            'coo_balance': balance['coo'] / COO_SCALE,
+            'eur_balance': balance['eur'] / EUR_SCALE
+        }
+
+    def stored_balance(self, name: str) -> Dict:
+        """An account's balance including funds held by open orders"""
+        account = self.accounts[name]
+        hold = self.holds.get(name)
+        if hold is None:
+            return account
+        return {'coo': account['coo'] + hold['coo'], 'eur': account['eur'] + hold['eur']}
+
+    def stored_accounts(self) -> Dict[str, Dict]:
+        """Every account's balance including held funds, as it is persisted"""
+        if not self.holds:
+            return self.accounts
+        return {name: self.stored_balance(name) for name in self.accounts}
+
+    def hold_funds(self, account_name: str, coo: int, eur: int):
+        """Move nano-COO and micro-EUR from an account's available balance into its hold
+
+        Negative amounts release them again. The persisted balance doesn't
+        change, so nothing is committed: if the process stops, held funds
+        are simply back in the account. Called with the account lock and
+        log_lock held.
+        """
+        account = self.accounts[account_name]
+        self.accounts[account_name] = {'coo': account['coo'] - coo, 'eur': account['eur'] - eur}
+        hold = self.holds.get(account_name)
+        if hold is not None:
+            coo += hold['coo']
+            eur += hold['eur']
+        if coo or eur:
+            self.holds[account_name] = {'coo': coo, 'eur': eur}
+        else:
+            self.holds.pop(account_name, None)
+
+    def close(self):
+        """Stop the price feed, flush pending writes and release the storage"""
+        self.price_scheduler.stop()
+        self.storage.close()
+        if self.ledger is not None:
+            self.ledger.close()
+
+    def initialize_default_accounts(self, default_accounts: Optional[Dict[str, Dict]] = None):
+        """Initialize default pigeon accounts (DEFAULT_ACCOUNTS) if they don't exist"""
+        if default_accounts is None:
+            default_accounts = DEFAULT_ACCOUNTS
+        with self.log_lock:
+            records = []
+            for name, balance in default_accounts.items():
+                if name not in self.accounts:
+                    self.accounts[name] = balance_from_floats(balance)
+                    self.account_index.add(name)
+                    records.append(self.account_record('account', name))
+
+            self.commit(*records)
+
+    def calculate_monthly_price(self):
+        """Calculate current OpenCooin price in EUR based on month/year"""
+        return self.price_model.current_price()
+
+    def get_price_change(self):
+        """Calculate monthly price change percentage"""
+        return self.price_feed.tick().change
+
+    def get_next_update_date(self):
+        """Get next month's first day for price update"""
+        next_update = self.price_feed.tick().next_update
+        return next_update.strftime("%B %d, %Y") if next_update else "continuous"
+
+    @property
+    def current_price(self) -> float:
+        """Latest price of the feed, by default the current month's price"""
+        return self.price_feed.price()
+
+    def update_price(self):
+        """Update current price"""
+        self.price_model.valid_until = None
+        self.price_model.refresh()
+
+    def price_at(self, when) -> float:
+        """Price at a datetime or epoch-seconds timestamp"""
+        return self.price_history.price_at(when)
+
+    def revalue_all_accounts(self, at=None) -> Dict[str, float]:
+        """Value every account in EUR at the price of a given time (default now)
+
+        With NumPy the balances are valued in one vectorized pass.
+        """
+        price = self.current_price if at is None else self.price_at(at)
+        names = list(self.accounts)
+        balances = [self.stored_balance(name) for name in names]
+        if np is None:
+            return {name: balance['eur'] / EUR_SCALE + balance['coo'] / COO_SCALE * price
+                    for name, balance in zip(names, balances)}
+        eur = np.fromiter((balance['eur'] for balance in balances), dtype=np.int64, count=len(names))
+        coo = np.fromiter((balance['coo'] for balance in balances), dtype=np.int64, count=len(names))
+        return dict(zip(names, (eur / EUR_SCALE + coo / COO_SCALE * price).tolist()))
+
+    def create_account(self, name: str) -> bool:
+        """Create a new pigeon account"""
+        if not name or not name.strip():
+            return False
+
+        account_name = name.strip().lower().replace(' ', '_')
+
+        with self.log_lock:
+            if account_name in self.accounts:
+                return False
+
+            self.accounts[account_name] = {'coo': 0, 'eur': 100 * EUR_SCALE}  # Starting bonus
+            self.account_index.add(account_name)
+
+            self.commit(self.account_record('account', account_name))
+        return True
+
+    def login(self, account_name: str) -> Optional[Session]:
+        """Login to an account, returning a session bound to it"""
+        if account_name in self.accounts:
+            return Session(self, account_name)
+        return None
+
+    def get_account_balance(self, account_name: str) -> Optional[Dict]:
+        """Get account balance as {'coo_balance', 'eur_balance'} floats"""
+        balance = self.accounts.get(account_name)
+        return None if balance is None else balance_to_floats(balance)
+
+    def account_lock(self, account_name: str) -> threading.Lock:
+        """Get the lock guarding an account's balances"""
+        return self.account_locks[hash(account_name) % LOCK_STRIPES]
+
+    def buy_coo(self, account_name: str, eur_amount: float) -> bool:
+        """Buy COO with EUR"""
+        started = time.perf_counter() if self.metrics.enabled else None
+        with self.account_lock(account_name):
+            price = to_micro_eur(self.current_price)
+            try:
+                balance, coo_amount, eur_amount = self.quote_trade(
+                    account_name, 'buy', to_micro_eur(eur_amount), price)
+            except (TradeError, ValueError, OverflowError):
+                # The conversion raises the latter two for NaN and infinite amounts
+                filled = False
+            else:
+                self.publish_trade(account_name, balance, 'buy', coo_amount, eur_amount, price)
+                filled = True
+        if started is not None:
+            self.count_trades('trade', started, int(filled), int(not filled))
+        return filled
+
+    def sell_coo(self, account_name: str, coo_amount: float) -> bool:
+        """Sell COO for EUR"""
+        started = time.perf_counter() if self.metrics.enabled else None
+        with self.account_lock(account_name):
+            price = to_micro_eur(self.current_price)
+            try:
+                balance, coo_amount, eur_amount = self.quote_trade(
+                    account_name, 'sell', to_nano_coo(coo_amount), price)
+            except (TradeError, ValueError, OverflowError):
+                # The conversion raises the latter two for NaN and infinite amounts
+                filled = False
+            else:
+                self.publish_trade(account_name, balance, 'sell', coo_amount, eur_amount, price)
+                filled = True
+        if started is not None:
+            self.count_trades('trade', started, int(filled), int(not filled))
+        return filled
+
+    def quote_trade(self, account_name: str, tx_type: str, amount: int,
+                    price: int) -> Tuple[Dict, int, int]:
+        """Work out a trade's resulting balance and nano-COO/micro-EUR amounts
+
+        amount is in micro-EUR for buys and in nano-COO for sells, price in
+        micro-EUR per COO; the other side of the trade is rounded down.
+        Raises TradeError if the trade can't execute. Called with the
+        account lock held.
+        """
+        account = self.accounts.get(account_name)
+        if account is None:
+            raise TradeError("unknown account")
+        if amount <= 0:
+            raise TradeError("amount must be positive")
+
+        if tx_type == 'buy':
+            if account['eur'] < amount:
+                raise TradeError("insufficient EUR balance")
+            coo_amount, eur_amount = coo_for_eur(amount, price), amount
+            balance = {'coo': account['coo'] + coo_amount, 'eur': account['eur'] - eur_amount}
+        elif tx_type == 'sell':
+            if account['coo'] < amount:
+                raise TradeError("insufficient COO balance")
+            coo_amount, eur_amount = amount, eur_for_coo(amount, price)
+            balance = {'coo': account['coo'] - coo_amount, 'eur': account['eur'] + eur_amount}
+        else:
+            raise TradeError(f"unknown order type {tx_type!r}")
+        if not (coo_amount and eur_amount):
+            raise TradeError("amount too small at this price")
+        return balance, coo_amount, eur_amount
+
+    def publish_trade(self, account_name: str, balance: Dict, tx_type: str,
+                      coo_amount: int, eur_amount: int, price: int) -> Dict:
+        """Apply a trade and persist it"""
+        with self.log_lock:
+            transaction = self.apply_trade(account_name, balance, tx_type, coo_amount, eur_amount, price)
+            self.commit(self.trade_record(transaction))
+        return transaction
+
+    def apply_trade(self, account_name: str, balance: Dict, tx_type: str,
+                    coo_amount: int, eur_amount: int, price: int) -> Dict:
+        """Store new balances and record the transaction
+
+        Called with the account lock held. The balance dict is swapped in
+        whole, so readers and snapshots never see half of a trade.
+        """
+        with self.log_lock:
+            self.accounts[account_name] = balance
+            return self.append_transaction(account_name, tx_type, coo_amount, eur_amount, price)
+
+    def execute_batch(self, orders: List[Dict]) -> List[Dict]:
+        """Validate, apply and persist a list of orders in one pass
+
+        Each order is a dict with 'account', 'type' ('buy' or 'sell') and
+        'amount' (EUR for buys, COO for sells). Orders run in sequence at one
+        price, so a later order sees the balances left by an earlier one.
+        Returns one result per order, {'ok': True, 'transaction': ...} or
+        {'ok': False, 'error': ...}; all fills are persisted with one write.
+        """
+        started = time.perf_counter() if self.metrics.enabled else None
+        # Orders without a name for an account are rejected on their own below
+        stripes = sorted({hash(order['account']) % LOCK_STRIPES for order in orders
+                          if isinstance(order, dict) and isinstance(order.get('account'), str)})
+        locks = [self.account_locks[stripe] for stripe in stripes]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self.log_lock:
+                price = to_micro_eur(self.current_price)
+                results = []
+                records = []
+                for order in orders:
+                    try:
+                        if not isinstance(order, dict):
+                            raise TypeError("order must be a dict")
+                        if not isinstance(order['account'], str):
+                            raise TypeError("account must be a string")
+                        amount = float(order['amount'])
+                        if not amount > 0:
+                            raise TradeError("amount must be positive")
+                        amount = to_micro_eur(amount) if order['type'] == 'buy' else to_nano_coo(amount)
+                        balance, coo_amount, eur_amount = self.quote_trade(
+                            order['account'], order['type'], amount, price)
+                    except (KeyError, TypeError, ValueError, OverflowError) as e:
+                        results.append({'ok': False, 'error': f"malformed order: {e}"})
+                        continue
+                    except TradeError as e:
+                        results.append({'ok': False, 'error': str(e)})
+                        continue
+                    transaction = self.apply_trade(order['account'], balance, order['type'],
+                                                   coo_amount, eur_amount, price)
+                    records.append(self.trade_record(transaction))
+                    results.append({'ok': True, 'transaction': transaction})
+                if records:
+                    self.commit(*records)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        if started is not None:
+            filled = len(records)
+            self.count_trades('batch', started, filled, len(orders) - filled)
+        return results
+
+    def count_trades(self, op: str, started: float, filled: int, rejected: int):
+        """Record an op's latency since started (a perf_counter time) and its trade results"""
+        metrics = self.metrics
+        metrics.observe(op, time.perf_counter() - started)
+        if filled:
+            metrics.inc('trades', filled, result='filled')
+        if rejected:
+            metrics.inc('trades', rejected, result='rejected')
+
+    def add_transaction(self, account_name: str, tx_type: str, coo_amount: float,
+                        eur_amount: float, price: Optional[float] = None) -> Dict:
+        """Add transaction to history"""
+        price = self.current_price if price is None else price
+        return self.append_transaction(account_name, tx_type.lower(), to_nano_coo(coo_amount),
+                                       to_micro_eur(eur_amount), to_micro_eur(price))
+
+    def append_transaction(self, account_name: str, tx_type: str, coo_amount: int,
+                           eur_amount: int, price: int) -> Dict:
+        """Add a transaction given in nano-COO, micro-EUR and micro-EUR per COO"""
+        tx_code = TX_CODES[tx_type]
+        with self.log_lock:
+            timestamp = time.time_ns() // 1000
+            position = self.transactions.append(account_name, tx_code, coo_amount, eur_amount, price, timestamp)
+            for listener in self.transaction_listeners:
+                listener(account_name, tx_code, coo_amount, eur_amount, price, timestamp)
+        return self.transactions.record(position)
+
+    def trade_record(self, transaction: Dict) -> Dict:
+        """Build the journal record for a trade"""
+        record = self.account_record('trade', transaction['user'])
+        record['tx'] = transaction
+        return record
+
+    def get_user_transactions(self, account_name: str, limit: int = 20,
+                              since: Optional[datetime] = None, until: Optional[datetime] = None,
+                              tx_type: Optional[str] = None, before: Optional[int] = None) -> List[Dict]:
+        """Get transaction history for an account
+
+        Pages are chained by passing the 'id' of the last transaction of one
+        page as before for the next. tx_type is 'buy' or 'sell', in any case;
+        anything else raises ValueError, whatever the storage, and so does a
+        negative limit.
+        """
+        if limit < 0:
+            raise ValueError("limit must not be negative")
+        if tx_type is not None:
+            tx_type = TX_NAMES[tx_code(tx_type)]
+        with self.metrics.timer('history'):
+            if self.storage.queries_history:
+                return self.storage.user_transactions(account_name, limit, since, until, tx_type, before)
+            transactions = self.transactions.user_records(account_name, since, until, tx_type, before)
+            return list(itertools.islice(transactions, limit))
@@ -0,0 +1,210 @@
+"""
+Price feeds and the background scheduler that publishes their ticks.
+
+A feed knows the current price and when it will next change. The
+PriceScheduler thread advances the feed, publishes every new tick to its
+subscribers and then sleeps until the next change is due: a month for the
+MonthlyFeed, a fraction of a millisecond for a SimulatedFeed driving a load
+test.
+"""
+
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .metrics import get_logger
+from .pricing import PriceModel
+
+# Longest single sleep; a wall clock that jumps (suspend, NTP) is noticed
+# within this many seconds even when the next boundary is weeks away
+MAX_SLEEP = 3600.0
+
+
+class PriceTick(NamedTuple):
+    """One published price"""
+    price: float
+    change: float
+    next_update: Optional[datetime]
+    seq: int
+
+
+class PriceFeed:
+    """Source of prices
+
+    tick() returns the latest price and must be cheap and thread-safe; it
+    is read on every trade. advance() is only called by the scheduler: it
+    moves the feed forward if a change is due and returns how many seconds
+    until the next one, or None if the price never changes on its own.
+    """
+
+    def tick(self) -> PriceTick:
+        raise NotImplementedError
+
+    def price(self) -> float:
+        return self.tick().price
+
+    def advance(self) -> Optional[float]:
+        return None
+
+
+class MonthlyFeed(PriceFeed):
+    """The monthly price formula, through a PriceModel"""
+
+    def __init__(self, model: PriceModel):
+        self.model = model
+        self.latest = None
+
+    def tick(self) -> PriceTick:
+        model = self.model
+        model.refresh()
+        latest = self.latest
+        if latest is None or latest.next_update != model.valid_until:
+            latest = self.latest = PriceTick(model.current, model.change, model.valid_until,
+                                             0 if latest is None else latest.seq + 1)
+        return latest
+
+    def price(self) -> float:
+        return self.model.current_price()
+
+    def advance(self) -> Optional[float]:
+        next_update = self.tick().next_update
+        return max(0.0, (next_update - self.model.clock()).total_seconds())
+
+
+class SimulatedFeed(PriceFeed):
+    """Random-walk prices at a fixed tick rate, for load testing
+
+    Each tick moves the price by a normally distributed log return of
+    ``volatility``; change is measured against the starting price. When the
+    scheduler falls behind, advance() returns 0 until it has caught up, so
+    the feed delivers its full rate as long as subscribers keep up.
+    """
+
+    def __init__(self, start_price: float, rate: float = 1000.0, volatility: float = 0.001,
+                 seed: Optional[int] = None):
+        self.start_price = start_price
+        self.interval = 1.0 / rate
+        self.volatility = volatility
+        # Deferred, as only simulated feeds need random
+        import random
+        self.random = random.Random(seed)
+        self.due = None
+        self.latest = PriceTick(start_price, 0.0, None, 0)
+
+    def tick(self) -> PriceTick:
+        return self.latest
+
+    def price(self) -> float:
+        return self.latest.price
+
+    def advance(self) -> Optional[float]:
+        now = time.monotonic()
+        if self.due is None:
+            # Start the clock with the scheduler, not at construction
+            self.due = now
+        if now >= self.due:
+            latest = self.latest
+            price = round(latest.price * math.exp(self.random.gauss(0.0, self.volatility)), 4)
+            change = round((price - self.start_price) / self.start_price * 100, 2)
+            self.due += self.interval
+            next_update = datetime.now() + timedelta(seconds=max(0.0, self.due - now))
+            # One attribute store, so readers never see half a tick
+            self.latest = PriceTick(price, change, next_update, latest.seq + 1)
+        return max(0.0, self.due - time.monotonic())
+
+
+def offer(queue: 'asyncio.Queue', tick: PriceTick):
+    """Put a tick on a bounded asyncio queue, dropping the oldest if full"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(tick)
+
+
+class PriceScheduler:
+    """Background thread publishing a feed's ticks to subscribers
+
+    Callbacks run on the scheduler thread and should hand the tick off
+    quickly; asyncio consumers get a queue filled from their own loop
+    through call_soon_threadsafe. The thread starts with the first
+    subscription, so short-lived headless users never pay for it.
+    """
+
+    def __init__(self, feed: PriceFeed):
+        self.feed = feed
+        self.subscribers: List[Callable[[PriceTick], None]] = []
+        self.queue_callbacks: Dict['asyncio.Queue', Callable[[PriceTick], None]] = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.published = 0
+
+    def subscribe(self, callback: Callable[[PriceTick], None]) -> Callable[[PriceTick], None]:
+        """Call callback with every new tick; returns it for unsubscribe()"""
+        with self.lock:
+            self.subscribers = self.subscribers + [callback]
+        self.start()
+        return callback
+
+    def unsubscribe(self, subscriber):
+        """Stop delivering to a callback or a queue from subscribe_queue()"""
+        with self.lock:
+            callback = self.queue_callbacks.pop(subscriber, subscriber)
+            self.subscribers = [existing for existing in self.subscribers if existing != callback]
+
+    def subscribe_queue(self, loop: Optional['asyncio.AbstractEventLoop'] = None,
+                        maxsize: int = 100) -> 'asyncio.Queue':
+        """An asyncio queue receiving ticks on loop (default: the running loop)
+
+        The queue keeps the newest maxsize ticks; a consumer that falls
+        behind loses the oldest ones rather than growing the queue.
+        """
+        # Deferred: only asyncio consumers pay for importing asyncio
+        import asyncio
+        loop = loop or asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize)
+        callback = lambda tick: loop.call_soon_threadsafe(offer, queue, tick)
+        with self.lock:
+            self.queue_callbacks[queue] = callback
+        self.subscribe(callback)
+        return queue
+
+    def start(self):
+        """Start the scheduler thread if it isn't running"""
+        with self.lock:
+            if self.thread is None:
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self.run, name="opencooin-price-feed", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread and wait for it"""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.stopping.set()
+            thread.join()
+
+    def run(self):
+        """Advance the feed, publish changes, sleep until the next one"""
+        last = None
+        while not self.stopping.is_set():
+            delay = self.feed.advance()
+            tick = self.feed.tick()
+            if tick is not last:
+                last = tick
+                self.publish(tick)
+            if delay is None:
+                self.stopping.wait()
+            elif delay > 0:
+                self.stopping.wait(min(delay, MAX_SLEEP))
+
+    def publish(self, tick: PriceTick):
+        """Deliver a tick to every subscriber"""
+        self.published += 1
+        for callback in self.subscribers:
+            try:
+                callback(tick)
+            except Exception:
+                get_logger(__name__).exception("Error in price subscriber")
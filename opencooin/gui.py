@@ -0,0 +1,474 @@
+"""
+Tkinter trading window for the OpenCooin exchange.
+
+Repaints and click-to-repaint trade latency are timed into the exchange's
+metrics as the gui_* operations.
+"""
+
+import queue
+import time
+import tkinter as tk
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk, messagebox
+from typing import Optional
+
+from .exchange import OpenCooinExchange
+from .widgets import AccountListView, HistoryView
+
+
+class OpenCooinGUI:
+    ACCOUNT_REFRESH_MS = 1000
+    PREVIEW_DELAY_MS = 150
+    RESULT_POLL_MS = 10
+    PRICE_POLL_MS = 250
+
+    def __init__(self, exchange: Optional[OpenCooinExchange] = None):
+        # Closed on exit only if made here; a caller passing one closes it
+        self.owns_exchange = exchange is None
+        self.exchange = exchange or OpenCooinExchange()
+        self.session = None
+        self.account_poll = None
+        # Trades and their persistence run on one worker thread, in click
+        # order; results come back through trade_results, polled by Tk
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='opencooin-trade')
+        self.trade_results = queue.Queue()
+        self.result_poll = None
+        self.submitted = 0
+        self.completed = 0
+        self.latencies = deque(maxlen=1000)
+        self.pending_previews = {}
+        # The price scheduler thread only stores the newest tick; the Tk
+        # thread picks it up, so a fast feed repaints at most every poll
+        self.latest_tick = None
+        self.shown_tick = None
+        self.price_poll = None
+        self.exchange.price_scheduler.subscribe(self.on_price_tick)
+        self.root = tk.Tk()
+        self.setup_window()
+        self.create_login_interface()
+
+    def setup_window(self):
+        """Setup main window"""
+        self.root.title("🐦 OpenCooin Trading Platform")
+        self.root.geometry("800x600")
+        self.root.configure(bg='#2c3e50')
+        
+        # Configure styles
+        style = ttk.Style()
+        style.theme_use('clam')
+        
+        # Custom styles
+        style.configure('Title.TLabel', font=('Arial', 18, 'bold'), background='#2c3e50', foreground='white')
+        style.configure('Subtitle.TLabel', font=('Arial', 10), background='#2c3e50', foreground='#bdc3c7')
+        style.configure('Price.TLabel', font=('Arial', 24, 'bold'), background='#e74c3c', foreground='white')
+        style.configure('Balance.TLabel', font=('Arial', 14, 'bold'), background='#3498db', foreground='white')
+        style.configure('Success.TButton', background='#27ae60')
+        style.configure('Danger.TButton', background='#e74c3c')
+
+    def create_login_interface(self):
+        """Create login/account selection interface"""
+        self.clear_window()
+        
+        # Title
+        title_frame = tk.Frame(self.root, bg='#2c3e50')
+        title_frame.pack(pady=20)
+        
+        ttk.Label(title_frame, text="🐦 OpenCooin Exchange", style='Title.TLabel').pack()
+        ttk.Label(title_frame, text="The Premier Pigeon Cryptocurrency Trading Platform", style='Subtitle.TLabel').pack()
+
+        # Account selection frame
+        account_frame = tk.Frame(self.root, bg='#34495e', padx=20, pady=20)
+        account_frame.pack(pady=20, padx=40, fill='both', expand=True)
+
+        ttk.Label(account_frame, text="Select Pigeon Account:", font=('Arial', 12, 'bold')).pack(pady=10)
+
+        # Account list with prefix search; only the visible rows are drawn
+        ttk.Label(account_frame, text="Search:").pack(anchor='w')
+        self.account_list = AccountListView(account_frame, self.exchange, height=8, font=('Arial', 10))
+        self.account_list.pack(fill='x', pady=10)
+        if self.account_poll:
+            self.root.after_cancel(self.account_poll)
+        self.account_poll = self.root.after(self.ACCOUNT_REFRESH_MS, self.poll_account_list)
+
+        # Buttons frame
+        button_frame = tk.Frame(account_frame, bg='#34495e')
+        button_frame.pack(fill='x', pady=10)
+
+        ttk.Button(button_frame, text="Login", command=self.login_selected).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Create New Account", command=self.show_create_account).pack(side='left', padx=5)
+
+    def refresh_account_list(self):
+        """Refresh the account list rows that changed"""
+        with self.exchange.metrics.timer('gui_accounts'):
+            self.account_list.refresh()
+
+    def poll_account_list(self):
+        """Keep balances on the login screen current while it is shown"""
+        self.account_poll = None
+        if self.session is None and self.account_list.frame.winfo_exists():
+            self.refresh_account_list()
+            self.account_poll = self.root.after(self.ACCOUNT_REFRESH_MS, self.poll_account_list)
+
+    def show_create_account(self):
+        """Show create account dialog"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Create New Pigeon Account")
+        dialog.geometry("300x150")
+        dialog.configure(bg='#34495e')
+        dialog.transient(self.root)
+        dialog.grab_set()
+
+        tk.Label(dialog, text="Enter pigeon name:", bg='#34495e', fg='white', font=('Arial', 10)).pack(pady=10)
+        
+        name_entry = tk.Entry(dialog, font=('Arial', 10))
+        name_entry.pack(pady=10, padx=20, fill='x')
+        name_entry.focus()
+
+        def create_account():
+            name = name_entry.get().strip()
+            if not name:
+                messagebox.showerror("Error", "Please enter a pigeon name!")
+                return
+            
+            if self.exchange.create_account(name):
+                messagebox.showinfo("Success", f"Account '{name}' created successfully!\nStarting bonus: €100")
+                self.refresh_account_list()
+                dialog.destroy()
+            else:
+                messagebox.showerror("Error", "Account already exists or invalid name!")
+
+        def on_enter(event):
+            create_account()
+
+        name_entry.bind('<Return>', on_enter)
+        
+        button_frame = tk.Frame(dialog, bg='#34495e')
+        button_frame.pack(pady=10)
+        
+        ttk.Button(button_frame, text="Create", command=create_account).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side='left', padx=5)
+
+    def login_selected(self):
+        """Login to selected account"""
+        account_name = self.account_list.selected_name()
+        if not account_name:
+            messagebox.showerror("Error", "Please select an account!")
+            return
+
+        self.session = self.exchange.login(account_name)
+        if self.session:
+            self.create_trading_interface()
+        else:
+            messagebox.showerror("Error", "Login failed!")
+
+    def create_trading_interface(self):
+        """Create main trading interface"""
+        self.clear_window()
+
+        # Header frame
+        header_frame = tk.Frame(self.root, bg='#e74c3c', padx=20, pady=10)
+        header_frame.pack(fill='x')
+
+        # Price display
+        price_frame = tk.Frame(header_frame, bg='#e74c3c')
+        price_frame.pack()
+
+        self.price_label = tk.Label(price_frame, text=f"€{self.exchange.current_price:.4f}", 
+                                   font=('Arial', 24, 'bold'), bg='#e74c3c', fg='white')
+        self.price_label.pack()
+
+        change = self.exchange.get_price_change()
+        change_color = '#27ae60' if change >= 0 else '#e74c3c'
+        change_text = f"Monthly Change: {'+' if change >= 0 else ''}{change:.2f}%"
+        
+        self.change_label = tk.Label(price_frame, text=change_text, font=('Arial', 10),
+                                     bg='#e74c3c', fg=change_color)
+        self.change_label.pack()
+
+        self.next_update_label = tk.Label(price_frame, text=f"Next Update: {self.exchange.get_next_update_date()}",
+                                          font=('Arial', 8), bg='#e74c3c', fg='white')
+        self.next_update_label.pack()
+        self.price_poll = self.root.after(self.PRICE_POLL_MS, self.poll_price)
+
+        # Main content frame
+        main_frame = tk.Frame(self.root, bg='#2c3e50')
+        main_frame.pack(fill='both', expand=True, padx=10, pady=10)
+
+        # Left panel - Account info and trading
+        left_panel = tk.Frame(main_frame, bg='#34495e', padx=15, pady=15)
+        left_panel.pack(side='left', fill='both', expand=True, padx=5)
+
+        # Account info
+        account_info_frame = tk.Frame(left_panel, bg='#3498db', padx=10, pady=10)
+        account_info_frame.pack(fill='x', pady=(0, 15))
+
+        tk.Label(account_info_frame, text=f"Account: {self.session.account_name}", 
+                font=('Arial', 12, 'bold'), bg='#3498db', fg='white').pack()
+
+        balance_frame = tk.Frame(account_info_frame, bg='#3498db')
+        balance_frame.pack(fill='x', pady=5)
+
+        account = self.session.get_balance()
+        self.coo_balance_label = tk.Label(balance_frame, text=f"{account['coo_balance']:.2f} COO", 
+                                         font=('Arial', 14, 'bold'), bg='#3498db', fg='white')
+        self.coo_balance_label.pack(side='left')
+
+        self.eur_balance_label = tk.Label(balance_frame, text=f"€{account['eur_balance']:.2f}", 
+                                         font=('Arial', 14, 'bold'), bg='#3498db', fg='white')
+        self.eur_balance_label.pack(side='right')
+
+        ttk.Button(account_info_frame, text="Logout", command=self.logout).pack(pady=5)
+
+        # Trading section
+        trading_frame = tk.LabelFrame(left_panel, text="Trade OpenCooin", font=('Arial', 12, 'bold'))
+        trading_frame.pack(fill='x', pady=10)
+
+        # Buy section
+        buy_frame = tk.LabelFrame(trading_frame, text="🐦 Buy COO", bg='#d5f4e6', font=('Arial', 10, 'bold'))
+        buy_frame.pack(fill='x', padx=5, pady=5)
+
+        tk.Label(buy_frame, text="Amount (EUR):", bg='#d5f4e6').pack(anchor='w')
+        self.buy_entry = tk.Entry(buy_frame)
+        self.buy_entry.pack(fill='x', padx=5, pady=2)
+        self.buy_entry.bind('<KeyRelease>', lambda event: self.schedule_preview(self.update_buy_preview))
+
+        tk.Label(buy_frame, text="You'll receive:", bg='#d5f4e6').pack(anchor='w')
+        self.buy_preview = tk.Entry(buy_frame, state='readonly')
+        self.buy_preview.pack(fill='x', padx=5, pady=2)
+
+        self.buy_button = tk.Button(buy_frame, text="Buy COO", bg='#27ae60', fg='white',
+                                    font=('Arial', 10, 'bold'), command=self.buy_coo)
+        self.buy_button.pack(pady=5)
+
+        # Sell section
+        sell_frame = tk.LabelFrame(trading_frame, text="💰 Sell COO", bg='#fdeaea', font=('Arial', 10, 'bold'))
+        sell_frame.pack(fill='x', padx=5, pady=5)
+
+        tk.Label(sell_frame, text="Amount (COO):", bg='#fdeaea').pack(anchor='w')
+        self.sell_entry = tk.Entry(sell_frame)
+        self.sell_entry.pack(fill='x', padx=5, pady=2)
+        self.sell_entry.bind('<KeyRelease>', lambda event: self.schedule_preview(self.update_sell_preview))
+
+        tk.Label(sell_frame, text="You'll receive:", bg='#fdeaea').pack(anchor='w')
+        self.sell_preview = tk.Entry(sell_frame, state='readonly')
+        self.sell_preview.pack(fill='x', padx=5, pady=2)
+
+        self.sell_button = tk.Button(sell_frame, text="Sell COO", bg='#e74c3c', fg='white',
+                                     font=('Arial', 10, 'bold'), command=self.sell_coo)
+        self.sell_button.pack(pady=5)
+
+        self.latency_label = tk.Label(trading_frame, text="", font=('Arial', 8))
+        self.latency_label.pack(anchor='e', padx=5)
+
+        # Right panel - Transaction history
+        right_panel = tk.Frame(main_frame, bg='#34495e', padx=15, pady=15)
+        right_panel.pack(side='right', fill='both', expand=True, padx=5)
+
+        tk.Label(right_panel, text="Transaction History", font=('Arial', 12, 'bold'), 
+                bg='#34495e', fg='white').pack()
+
+        # Transaction list, newest first; only the visible entries are rendered
+        self.history = HistoryView(right_panel, self.session, height=20, width=40, font=('Courier', 9))
+        self.history.pack(fill='both', expand=True, pady=10)
+
+        self.update_balances()
+
+    def update_buy_preview(self, event=None):
+        """Update buy preview in real-time"""
+        try:
+            eur_amount = float(self.buy_entry.get() or 0)
+            coo_amount = eur_amount / self.exchange.current_price
+            self.buy_preview.config(state='normal')
+            self.buy_preview.delete(0, tk.END)
+            self.buy_preview.insert(0, f"{coo_amount:.4f} COO")
+            self.buy_preview.config(state='readonly')
+        except ValueError:
+            self.buy_preview.config(state='normal')
+            self.buy_preview.delete(0, tk.END)
+            self.buy_preview.insert(0, "0 COO")
+            self.buy_preview.config(state='readonly')
+
+    def update_sell_preview(self, event=None):
+        """Update sell preview in real-time"""
+        try:
+            coo_amount = float(self.sell_entry.get() or 0)
+            eur_amount = coo_amount * self.exchange.current_price
+            self.sell_preview.config(state='normal')
+            self.sell_preview.delete(0, tk.END)
+            self.sell_preview.insert(0, f"€{eur_amount:.2f}")
+            self.sell_preview.config(state='readonly')
+        except ValueError:
+            self.sell_preview.config(state='normal')
+            self.sell_preview.delete(0, tk.END)
+            self.sell_preview.insert(0, "€0.00")
+            self.sell_preview.config(state='readonly')
+
+    def schedule_preview(self, preview):
+        """Debounce a preview update until typing pauses"""
+        pending = self.pending_previews.pop(preview, None)
+        if pending:
+            self.root.after_cancel(pending)
+        self.pending_previews[preview] = self.root.after(self.PREVIEW_DELAY_MS, preview)
+
+    def buy_coo(self):
+        """Execute buy order"""
+        try:
+            eur_amount = float(self.buy_entry.get())
+            if eur_amount <= 0:
+                messagebox.showerror("Error", "Please enter a valid EUR amount!")
+                return
+            self.submit_trade('buy', eur_amount)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid number!")
+
+    def sell_coo(self):
+        """Execute sell order"""
+        try:
+            coo_amount = float(self.sell_entry.get())
+            if coo_amount <= 0:
+                messagebox.showerror("Error", "Please enter a valid COO amount!")
+                return
+            self.submit_trade('sell', coo_amount)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid number!")
+
+    def submit_trade(self, tx_type: str, amount: float):
+        """Run a trade on the worker thread and pick up its result later
+
+        The trade buttons stay disabled until the result is shown, so a
+        double click can't submit the same order twice.
+        """
+        clicked = time.perf_counter()
+        session = self.session
+        order = {'account': session.account_name, 'type': tx_type, 'amount': amount}
+        future = self.executor.submit(self.exchange.execute_batch, [order])
+        future.add_done_callback(lambda done: self.trade_results.put((session, tx_type, clicked, done)))
+        self.submitted += 1
+        self.set_trading_enabled(False)
+        if not self.result_poll:
+            self.result_poll = self.root.after(self.RESULT_POLL_MS, self.poll_trade_results)
+
+    def poll_trade_results(self):
+        """Show finished trades; runs on the Tk thread"""
+        self.result_poll = None
+        while True:
+            try:
+                session, tx_type, clicked, future = self.trade_results.get_nowait()
+            except queue.Empty:
+                break
+            self.show_trade_result(session, tx_type, clicked, future)
+        if self.submitted > self.completed:
+            self.result_poll = self.root.after(self.RESULT_POLL_MS, self.poll_trade_results)
+
+    def show_trade_result(self, session, tx_type: str, clicked: float, future):
+        """Repaint after a trade and report its click-to-repaint latency"""
+        self.completed += 1
+        if session is not self.session:
+            # Logged out while the trade ran; the trading widgets are gone
+            return
+        self.set_trading_enabled(True)
+
+        try:
+            result = future.result()[0]
+        except Exception as e:
+            messagebox.showerror("Error", f"Trade failed: {e}")
+            return
+
+        if result['ok']:
+            entry, preview = ((self.buy_entry, self.update_buy_preview) if tx_type == 'buy'
+                              else (self.sell_entry, self.update_sell_preview))
+            entry.delete(0, tk.END)
+            preview()
+            self.update_balances()
+            self.update_transaction_history()
+        self.root.update_idletasks()
+        latency = (time.perf_counter() - clicked) * 1000
+        self.latencies.append(latency)
+        self.exchange.metrics.observe('gui_trade', latency / 1000)
+        self.latency_label.config(text=f"Last trade: {latency:.1f} ms")
+
+        if not result['ok']:
+            error = result['error']
+            messagebox.showerror("Error", f"{error[:1].upper()}{error[1:]}! {'💸' if tx_type == 'buy' else '🐦'}")
+            return
+        tx = result['transaction']
+        if tx_type == 'buy':
+            messagebox.showinfo("Success", f"Successfully bought {tx['coo_amount']:.4f} COO "
+                                           f"for €{tx['eur_amount']:.2f}! 🐦💰")
+        else:
+            messagebox.showinfo("Success", f"Successfully sold {tx['coo_amount']:.4f} COO "
+                                           f"for €{tx['eur_amount']:.2f}! 💰🐦")
+
+    def set_trading_enabled(self, enabled: bool):
+        state = 'normal' if enabled else 'disabled'
+        self.buy_button.config(state=state)
+        self.sell_button.config(state=state)
+
+    def latency_report(self) -> Optional[str]:
+        """Summarize click-to-repaint latency of the trades made so far"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        p50 = ordered[len(ordered) // 2]
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return (f"UI latency over {len(ordered)} trades: p50 {p50:.1f} ms, "
+                f"p99 {p99:.1f} ms, max {ordered[-1]:.1f} ms")
+
+    def on_price_tick(self, tick):
+        """Price subscriber; runs on the scheduler thread"""
+        self.latest_tick = tick
+
+    def poll_price(self):
+        """Repaint the price header when a new tick has arrived"""
+        tick = self.latest_tick
+        if tick is not None and tick is not self.shown_tick:
+            self.shown_tick = tick
+            with self.exchange.metrics.timer('gui_price'):
+                change_color = '#27ae60' if tick.change >= 0 else '#e74c3c'
+                self.price_label.config(text=f"€{tick.price:.4f}")
+                self.change_label.config(
+                    text=f"Monthly Change: {'+' if tick.change >= 0 else ''}{tick.change:.2f}%", fg=change_color)
+                self.next_update_label.config(text=f"Next Update: {self.exchange.get_next_update_date()}")
+        self.price_poll = self.root.after(self.PRICE_POLL_MS, self.poll_price)
+
+    def update_balances(self):
+        """Update balance display"""
+        with self.exchange.metrics.timer('gui_balances'):
+            account = self.session.get_balance()
+            self.coo_balance_label.config(text=f"{account['coo_balance']:.4f} COO")
+            self.eur_balance_label.config(text=f"€{account['eur_balance']:.2f}")
+
+    def update_transaction_history(self):
+        """Add new transactions to the history display"""
+        with self.exchange.metrics.timer('gui_history'):
+            self.history.refresh()
+
+    def logout(self):
+        """Logout current user"""
+        self.session = None
+        self.create_login_interface()
+
+    def clear_window(self):
+        """Clear all widgets from window"""
+        for pending in self.pending_previews.values():
+            self.root.after_cancel(pending)
+        self.pending_previews.clear()
+        if self.price_poll:
+            self.root.after_cancel(self.price_poll)
+            self.price_poll = None
+        for widget in self.root.winfo_children():
+            widget.destroy()
+
+    def run(self):
+        """Start the GUI application"""
+        try:
+            self.root.mainloop()
+        finally:
+            self.exchange.price_scheduler.unsubscribe(self.on_price_tick)
+            self.executor.shutdown(wait=True)
+            report = self.latency_report()
+            if report:
+                print(report)
+            if self.owns_exchange:
+                self.exchange.close()
@@ -0,0 +1,562 @@
+"""
+Tamper-evident ledger over the transaction history.
+
+Every transaction appended to the exchange is hashed into a leaf, and the
+leaves are chained:
+
+    leaf     = sha256(0x00 | type, nano-COO, micro-EUR, price, timestamp, user)
+    chain(n) = sha256(leaf 0 | leaf 1 | ... | leaf n-1)
+
+chain(n) commits to the first n transactions, in order. It is one running
+SHA-256 over the leaves, which chains its own 64 byte blocks, so extending
+it is an update with 32 bytes rather than a fresh digest per link; that
+halves the hashing on the trade path. Appending costs a leaf hash, that
+update and a 32 byte write, whatever the length of the history. Every
+block_size transactions the ledger also checkpoints the block: it records
+the chain at the end of the block and the Merkle root over the block's
+leaves. The block roots are themselves the leaves of a Merkle tree, kept
+incrementally. An inclusion proof for a checkpointed transaction is its
+path in its block's tree followed by the path of the block in the top
+tree, O(log n) hashes in total.
+
+Nodes hash 0x01 | left | right, and a node without a sibling is carried up
+unchanged, so no two trees of different shape share a root.
+
+The leaves go to an append-only file next to the data file (data_file +
+".ledger"), the checkpoints to data_file + ".ledger.blocks". Each leaf is
+flushed as it is appended, ahead of the storage, and the files are synced
+on close. After a crash the ledger may hold transactions the history lost.
+attach() refuses a ledger that doesn't end where the history does; it
+never hashes a transaction it didn't see appended, nor drops an entry.
+recover() is the explicit step that cuts the entries the history lost off,
+with a warning, and initialize() starts an empty ledger over an existing
+history. Deleting the newest transactions and recovering only shows
+against a head recorded elsewhere: head() is the value to publish or sign,
+and verify(trusted=...) checks against it. Who can rewrite both the data
+file and the ledger files can rewrite anything after the last head they
+didn't control.
+
+verify() recomputes every leaf and every block root from the history and
+compares them with the ledger files. The blocks are independent, so they
+are spread over a process pool. The chain is rehashed from the stored
+leaves alongside, at memory speed, and checked at every checkpoint.
+Opening a ledger rehashes the chain too, about 40 ms per million
+transactions. Opened read_only, as to verify it, it never changes the
+files, not even to cut off a torn write.
+
+The ledger needs the full history in memory, which rules out SQLite
+storage.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+from array import array
+from collections import deque
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import get_logger
+from .money import to_micro_eur, to_nano_coo
+from .segment import COLUMNS
+from .txlog import TX_CODES, to_epoch_us
+
+DIGEST_SIZE = 32
+CHECKPOINT_SIZE = 2 * DIGEST_SIZE
+DEFAULT_BLOCK_SIZE = 1024
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+# type, nano-COO, micro-EUR, price, timestamp, length of the UTF-8 user name
+ROW = struct.Struct('<BqqqqI')
+# Columns shipped to verification workers, in leaf_digest argument order
+ROW_COLUMNS = ('user_col', 'type_col', 'coo_col', 'eur_col', 'price_col', 'timestamp_col')
+TYPECODES = dict(COLUMNS)
+MAX_PROBLEMS = 20
+
+sha256 = hashlib.sha256
+
+
+class LedgerError(Exception):
+    """Raised when a storage backend can't keep a ledger"""
+
+
+def leaf_digest(user: str, tx_type: int, coo_amount: int, eur_amount: int, price: int, timestamp: int) -> bytes:
+    """Leaf hash of one transaction, in the fixed-point form the log stores"""
+    name = user.encode()
+    return sha256(LEAF_PREFIX + ROW.pack(tx_type, coo_amount, eur_amount, price, timestamp, len(name))
+                  + name).digest()
+
+
+def record_digest(transaction: Dict) -> bytes:
+    """Leaf hash of a transaction in its dict form"""
+    return leaf_digest(
+        transaction['user'],
+        TX_CODES[transaction['type']],
+        to_nano_coo(transaction['coo_amount']),
+        to_micro_eur(transaction['eur_amount']),
+        to_micro_eur(transaction['price']),
+        to_epoch_us(transaction['timestamp'])
+    )
+
+
+def node_digest(left: bytes, right: bytes) -> bytes:
+    return sha256(NODE_PREFIX + left + right).digest()
+
+
+def merkle_levels(leaves: List[bytes]) -> List[List[bytes]]:
+    """Every level of the Merkle tree over leaves, the leaves first and the root last"""
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([node_digest(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                       for i in range(0, len(level), 2)])
+    return levels
+
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    return merkle_levels(leaves)[-1][0]
+
+
+def merkle_path(levels: List[List[bytes]], index: int) -> List[Tuple[str, bytes]]:
+    """The siblings from a leaf up to the root, each with the side it is on"""
+    path = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append(('left' if sibling < index else 'right', level[sibling]))
+        index //= 2
+    return path
+
+
+def fold_path(digest: bytes, path) -> bytes:
+    """The root a path leads to from a leaf"""
+    for side, sibling in path:
+        digest = node_digest(sibling, digest) if side == 'left' else node_digest(digest, sibling)
+    return digest
+
+
+def check_proof(transaction: Dict, proof: Dict) -> bool:
+    """Whether proof shows transaction (dict form) under proof['root']
+
+    Checks the transaction's content only; proof['position'] says where it is.
+    """
+    path = [(side, bytes.fromhex(sibling)) for side, sibling in proof['path']]
+    return fold_path(record_digest(transaction), path).hex() == proof['root']
+
+
+class MerkleTree:
+    """Merkle tree that grows one leaf at a time
+
+    Keeps every level, so an append updates one node per level and a path
+    is read off without hashing.
+    """
+
+    def __init__(self):
+        self.levels = [[]]
+
+    def __len__(self) -> int:
+        return len(self.levels[0])
+
+    def append(self, digest: bytes):
+        index = len(self.levels[0])
+        self.levels[0].append(digest)
+        level = 0
+        while len(self.levels[level]) > 1:
+            nodes = self.levels[level]
+            value = node_digest(nodes[index - 1], nodes[index]) if index % 2 else nodes[index]
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            upper = self.levels[level + 1]
+            index //= 2
+            if index < len(upper):
+                upper[index] = value
+            else:
+                upper.append(value)
+            level += 1
+
+    def root(self) -> Optional[bytes]:
+        return self.levels[-1][0] if self.levels[0] else None
+
+    def path(self, index: int) -> List[Tuple[str, bytes]]:
+        return merkle_path(self.levels, index)
+
+
+def column_bytes(log, start: int, stop: int) -> Tuple[bytes, ...]:
+    """Raw bytes of rows [start, stop) of a TransactionLog's columns, in ROW_COLUMNS order"""
+    parts = []
+    if start < log.base_rows:
+        parts.append((log.base, start, min(stop, log.base_rows)))
+    if stop > log.base_rows:
+        parts.append((log, max(start, log.base_rows) - log.base_rows, stop - log.base_rows))
+    # Slices of the arrays, not memoryviews: an export would stop appends from resizing them
+    return tuple(b''.join(getattr(columns, name)[low:high].tobytes() for columns, low, high in parts)
+                 for name in ROW_COLUMNS)
+
+
+def verify_blocks(start: int, block_size: int, names: Dict[int, str], columns: Tuple[bytes, ...],
+                  leaves: bytes) -> List[Tuple[Optional[int], bytes]]:
+    """Worker: recompute consecutive blocks from the history starting at row start
+
+    Returns, per block, the first position whose stored leaf differs from
+    the history (or None) and the block's root computed from the history.
+    """
+    arrays = []
+    for name, data in zip(ROW_COLUMNS, columns):
+        column = array(TYPECODES[name])
+        column.frombytes(data)
+        arrays.append(column)
+    rows = zip(*arrays)
+    results = []
+    offset = 0
+    while offset < len(leaves):
+        block = []
+        bad = None
+        for user_id, tx_type, coo, eur, price, timestamp in islice(rows, block_size):
+            leaf = leaf_digest(names[user_id], tx_type, coo, eur, price, timestamp)
+            if bad is None and leaves[offset:offset + DIGEST_SIZE] != leaf:
+                bad = start + offset // DIGEST_SIZE
+            block.append(leaf)
+            offset += DIGEST_SIZE
+        results.append((bad, merkle_root(block)))
+    return results
+
+
+class Ledger:
+    """Hash chain and Merkle checkpoints over an exchange's transactions
+
+    attach() it to an exchange, or pass ledger=True to OpenCooinExchange.
+    Appends are safe from any thread; the exchange calls them under its
+    log_lock, in history order.
+    """
+
+    def __init__(self, path: str, block_size: int = DEFAULT_BLOCK_SIZE, read_only: bool = False):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.path = path
+        self.blocks_path = path + ".blocks"
+        self.block_size = block_size
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        self.exchange = None
+        self.leaf_file = None
+        self.blocks_file = None
+        self.load()
+
+    def load(self):
+        """Read the checkpoints, rehash the chain and keep the leaves of the open block"""
+        leaf_bytes = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        block_bytes = os.path.getsize(self.blocks_path) if os.path.exists(self.blocks_path) else 0
+        rows = leaf_bytes // DIGEST_SIZE
+        blocks = min(block_bytes // CHECKPOINT_SIZE, rows // self.block_size)
+        if not self.read_only:
+            # Torn writes, and checkpoints whose leaves never made it to disk
+            if (leaf_bytes, block_bytes) != (rows * DIGEST_SIZE, blocks * CHECKPOINT_SIZE):
+                get_logger(__name__).warning("Cutting torn writes off the ledger at %s", self.path)
+            self.truncate_files(rows, blocks)
+            self.leaf_file = open(self.path, 'ab')
+            self.blocks_file = open(self.blocks_path, 'ab')
+        self.checkpoints = []
+        self.top = MerkleTree()
+        self.chain = sha256()
+        self.rows = blocks * self.block_size
+        self.block_leaves = []
+        if not rows:
+            return
+        if blocks:
+            with open(self.blocks_path, 'rb') as f:
+                for _ in range(blocks):
+                    checkpoint = f.read(CHECKPOINT_SIZE)
+                    self.checkpoints.append((checkpoint[:DIGEST_SIZE], checkpoint[DIGEST_SIZE:]))
+                    self.top.append(checkpoint[DIGEST_SIZE:])
+        with open(self.path, 'rb') as f:
+            for _ in range(blocks):
+                self.chain.update(f.read(self.block_size * DIGEST_SIZE))
+            # Replaying the open block also writes any checkpoint a crash
+            # skipped, unless read-only
+            data = f.read(rows * DIGEST_SIZE - f.tell())
+        for offset in range(0, len(data), DIGEST_SIZE):
+            self.add_leaf(data[offset:offset + DIGEST_SIZE], write=False)
+
+    def truncate_files(self, rows: int, blocks: int):
+        for path, size in ((self.path, rows * DIGEST_SIZE), (self.blocks_path, blocks * CHECKPOINT_SIZE)):
+            with open(path, 'ab') as f:
+                f.truncate(size)
+
+    def close(self):
+        """Flush and sync the ledger files"""
+        self.detach()
+        with self.lock:
+            for f in (self.leaf_file, self.blocks_file):
+                if f is not None and not f.closed:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+
+    def check_writable(self, exchange):
+        """Raise LedgerError unless this ledger can be written for exchange"""
+        if self.read_only:
+            raise LedgerError(f"the ledger at {self.path} is open read-only")
+        if exchange.storage.queries_history:
+            raise LedgerError("the ledger needs the full history in memory, which SQLite storage doesn't keep")
+
+    def attach(self, exchange) -> 'Ledger':
+        """Follow an exchange's new transactions; the ledger must end where its history does
+
+        Runs under the exchange's log_lock, so no transaction is missed or
+        hashed twice. A ledger shorter or longer than the history raises
+        LedgerError; see recover() and initialize().
+        """
+        self.check_writable(exchange)
+        with exchange.log_lock:
+            history = len(exchange.transactions)
+            if self.rows != history:
+                raise LedgerError(f"the ledger has {self.rows} entries but the history {history} transactions; "
+                                  f"recover the ledger after a crash, or initialize a new one")
+            exchange.transaction_listeners.append(self.append)
+        self.exchange = exchange
+        return self
+
+    def recover(self, exchange) -> int:
+        """Drop the entries of transactions the history lost in a crash and return how many
+
+        Only cuts the ledger back: transactions in the history that the
+        ledger never saw appended raise LedgerError. verify() afterwards
+        checks the entries kept.
+        """
+        self.check_writable(exchange)
+        with exchange.log_lock:
+            history = len(exchange.transactions)
+            if history > self.rows:
+                raise LedgerError(f"the history has {history - self.rows} transactions the ledger never recorded")
+            dropped = self.rows - history
+            if dropped:
+                get_logger(__name__).warning("Dropping %d ledger entries beyond the %d transactions in the history",
+                                             dropped, history)
+                self.truncate(history)
+        return dropped
+
+    def initialize(self, exchange) -> int:
+        """Start an empty ledger over an exchange's existing history and return its length
+
+        The ledger vouches for those transactions from now on, not from when
+        they were made; record head() right after.
+        """
+        self.check_writable(exchange)
+        with exchange.log_lock:
+            if self.rows:
+                raise LedgerError(f"the ledger already holds {self.rows} entries")
+            log = exchange.transactions
+            get_logger(__name__).warning("Starting the ledger at %s over %d existing transactions",
+                                         self.path, len(log))
+            users = log.users
+            with self.lock:
+                for user_id, tx_type, coo, eur, price, timestamp in log.rows():
+                    self.add_leaf(leaf_digest(users[user_id], tx_type, coo, eur, price, timestamp))
+                self.leaf_file.flush()
+            return len(log)
+
+    def detach(self):
+        """Stop following the exchange"""
+        if self.exchange is not None:
+            with self.exchange.log_lock:
+                self.exchange.transaction_listeners.remove(self.append)
+            self.exchange = None
+
+    def truncate(self, rows: int):
+        """Drop the entries after the first rows, and the checkpoints of blocks they end"""
+        with self.lock:
+            self.leaf_file.close()
+            self.blocks_file.close()
+            self.truncate_files(rows, rows // self.block_size)
+        self.load()
+
+    def append(self, user: str, tx_type: int, coo_amount: int, eur_amount: int, price: int, timestamp: int):
+        """Add the next transaction of the history; a transaction listener"""
+        leaf = leaf_digest(user, tx_type, coo_amount, eur_amount, price, timestamp)
+        with self.lock:
+            self.add_leaf(leaf)
+            self.leaf_file.flush()
+
+    def add_leaf(self, leaf: bytes, write: bool = True):
+        """Extend the chain, and checkpoint the block once it is full; call with lock held"""
+        self.chain.update(leaf)
+        if write:
+            self.leaf_file.write(leaf)
+        self.block_leaves.append(leaf)
+        self.rows += 1
+        if len(self.block_leaves) == self.block_size:
+            chain = self.chain.copy().digest()
+            root = merkle_root(self.block_leaves)
+            if not self.read_only:
+                # Leaves first, so a checkpoint on disk always has its leaves
+                self.leaf_file.flush()
+                self.blocks_file.write(chain + root)
+                self.blocks_file.flush()
+            self.checkpoints.append((chain, root))
+            self.top.append(root)
+            self.block_leaves = []
+
+    def read_leaves(self, start: int, stop: int) -> List[bytes]:
+        """Stored leaves [start, stop), from the file"""
+        with open(self.path, 'rb') as f:
+            f.seek(start * DIGEST_SIZE)
+            data = f.read((stop - start) * DIGEST_SIZE)
+        return [data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)]
+
+    def head(self) -> Dict:
+        """The values to record elsewhere: chain head, row count and checkpointed root"""
+        with self.lock:
+            root = self.top.root()
+            return {
+                'rows': self.rows,
+                'chain': self.chain.copy().hexdigest(),
+                'blocks': len(self.checkpoints),
+                'root': root.hex() if root is not None else None
+            }
+
+    def chain_at(self, rows: int) -> bytes:
+        """The chain as it was after the first rows transactions, rehashed from the stored leaves"""
+        with self.lock:
+            if not 0 <= rows <= self.rows:
+                raise ValueError(f"the ledger has {self.rows} entries, not {rows}")
+        chain = sha256()
+        with open(self.path, 'rb') as f:
+            remaining = rows * DIGEST_SIZE
+            while remaining:
+                data = f.read(min(remaining, self.block_size * DIGEST_SIZE))
+                chain.update(data)
+                remaining -= len(data)
+        return chain.digest()
+
+    def proof(self, position: int) -> Dict:
+        """Inclusion proof of the transaction at position (0 is the oldest) under the current root
+
+        Only checkpointed transactions have one; the open block has no root
+        yet. Building it reads and hashes the transaction's block, checking
+        it takes O(log n) hashes.
+        """
+        with self.lock:
+            blocks = len(self.checkpoints)
+            if not 0 <= position < blocks * self.block_size:
+                raise ValueError(f"transaction {position} is not in a checkpointed block "
+                                 f"({blocks * self.block_size} checkpointed)")
+            block, index = divmod(position, self.block_size)
+            top_path = self.top.path(block)
+            root = self.top.root()
+        start = block * self.block_size
+        leaves = self.read_leaves(start, start + self.block_size)
+        path = merkle_path(merkle_levels(leaves), index) + top_path
+        return {
+            'position': position,
+            'leaf': leaves[index].hex(),
+            'path': [(side, sibling.hex()) for side, sibling in path],
+            'blocks': blocks,
+            'root': root.hex()
+        }
+
+    def verify(self, log, workers: Optional[int] = None, trusted: Optional[Dict] = None,
+               blocks_per_task: int = 16) -> Dict:
+        """Check the ledger files against the history in log, on a pool of workers processes
+
+        Reports the transactions whose leaf doesn't match, and the blocks
+        whose chain or root doesn't match the checkpoint. With trusted, a
+        head() recorded earlier, also checks that the ledger still leads to
+        it. workers defaults to the CPU count; 1 verifies in this process.
+        """
+        with self.lock:
+            rows = ledger_rows = self.rows
+            checkpoints = list(self.checkpoints)
+            head = self.chain.copy().digest()
+        problems = []
+        if len(log) != rows:
+            problems.append(f"the history has {len(log)} transactions, the ledger {rows}")
+            rows = min(rows, len(log))
+        block_size = self.block_size
+        chain = sha256()
+
+        def tasks():
+            """Per group of blocks_per_task blocks, the first block and the verify_blocks arguments
+
+            Checks the chain over the stored leaves as it reads them.
+            """
+            with open(self.path, 'rb') as f:
+                for start in range(0, rows, block_size * blocks_per_task):
+                    stop = min(start + block_size * blocks_per_task, rows)
+                    leaves = f.read((stop - start) * DIGEST_SIZE)
+                    for offset in range(0, len(leaves), block_size * DIGEST_SIZE):
+                        block = (start + offset // DIGEST_SIZE) // block_size
+                        chain.update(leaves[offset:offset + block_size * DIGEST_SIZE])
+                        if block < len(checkpoints):
+                            if chain.digest() != checkpoints[block][0]:
+                                problems.append(f"block {block}: chain differs from its checkpoint")
+                        elif rows == ledger_rows and chain.digest() != head:
+                            problems.append("open block: chain differs from the ledger head")
+                    columns = column_bytes(log, start, stop)
+                    user_ids = array(TYPECODES['user_col'])
+                    user_ids.frombytes(columns[0])
+                    names = {user_id: log.users[user_id] for user_id in set(user_ids)}
+                    yield start // block_size, (start, block_size, names, columns, leaves)
+
+        bad = []
+        for first, results in self.run_tasks(tasks(), workers):
+            for block, (position, root) in enumerate(results, first):
+                if position is not None:
+                    bad.append(position)
+                if block < len(checkpoints) and root != checkpoints[block][1]:
+                    problems.append(f"block {block}: Merkle root differs from its checkpoint")
+        problems[:0] = [f"transaction {position}: leaf differs from the history" for position in sorted(bad)]
+
+        if trusted is not None:
+            problems.extend(self.check_trusted(trusted, checkpoints))
+        return {
+            'ok': not problems,
+            'rows': rows,
+            'blocks': len(checkpoints),
+            'first_bad': min(bad) if bad else None,
+            'problems': problems[:MAX_PROBLEMS],
+            'problem_count': len(problems)
+        }
+
+    @staticmethod
+    def run_tasks(tasks, workers: Optional[int]):
+        """Yield (first block, verify_blocks results) per task, a few tasks in flight at a time"""
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            for first, task in tasks:
+                yield first, verify_blocks(*task)
+            return
+        # Deferred: importing the package must not load multiprocessing
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # Spawned, not forked: the exchange may be running threads
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            submitted = deque()
+            for first, task in tasks:
+                if len(submitted) >= 2 * workers:
+                    done_first, future = submitted.popleft()
+                    yield done_first, future.result()
+                submitted.append((first, pool.submit(verify_blocks, *task)))
+            for first, future in submitted:
+                yield first, future.result()
+
+    def check_trusted(self, trusted: Dict, checkpoints: List[Tuple[bytes, bytes]]) -> List[str]:
+        """Problems with the ledger against a head() recorded earlier"""
+        if trusted['rows'] > self.rows:
+            return [f"the trusted head covers {trusted['rows']} transactions, the ledger only {self.rows}"]
+        problems = []
+        if self.chain_at(trusted['rows']).hex() != trusted['chain']:
+            problems.append(f"the chain after {trusted['rows']} transactions differs from the trusted head")
+        if trusted.get('root') is not None:
+            roots = [root for _, root in checkpoints[:trusted['blocks']]]
+            if len(roots) < trusted['blocks'] or merkle_root(roots).hex() != trusted['root']:
+                problems.append(f"the root over {trusted['blocks']} blocks differs from the trusted head")
+        return problems
+
+
+def ledger_path(storage) -> str:
+    """Where the ledger of a storage backend lives: next to its data file"""
+    data_file = storage.files().get('data')
+    if data_file is None or storage.queries_history:
+        raise LedgerError("the ledger needs a JSON data file backend")
+    return data_file + ".ledger"
@@ -0,0 +1,158 @@
+"""
+Load generator for the line-protocol server.
+
+Opens a number of keep-alive connections, each with a fixed number of
+pipelined requests in flight, and drives a mix of trades and reads for a
+fixed time. Latency is measured per request from write to response.
+
+    python -m opencooin loadgen --spawn --connections 32 --pipeline 8 --processes 4 --duration 10
+"""
+
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+# Share of each op in the generated mix
+MIX = (('buy', 0.3), ('sell', 0.2), ('balance', 0.3), ('history', 0.15), ('price', 0.05))
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def make_request(rng: random.Random, accounts: List[str]) -> Dict:
+    """A random request from the mix"""
+    op = rng.choices([op for op, _ in MIX], [weight for _, weight in MIX])[0]
+    request = {'op': op, 'account': rng.choice(accounts)}
+    if op == 'buy':
+        request['amount'] = round(rng.uniform(0.01, 1.0), 2)
+    elif op == 'sell':
+        request['amount'] = round(rng.uniform(0.01, 1.0), 4)
+    elif op == 'history':
+        request['limit'] = 20
+    return request
+
+
+async def client(host: str, port: int, accounts: List[str], pipeline: int, deadline: float,
+                 seed: int, latencies: List[float], counts: Dict[str, int]):
+    """One connection keeping pipeline requests in flight until the deadline"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    # Send times of requests in flight, oldest first
+    sent = asyncio.Queue(pipeline)
+
+    async def send():
+        while time.perf_counter() < deadline:
+            await sent.put(time.perf_counter())
+            writer.write(json.dumps(make_request(rng, accounts)).encode() + b'\n')
+            await writer.drain()
+        await sent.put(None)
+
+    sender = asyncio.create_task(send())
+    while True:
+        started = await sent.get()
+        if started is None:
+            break
+        line = await reader.readline()
+        if not line:
+            counts['errors'] += 1
+            break
+        latencies.append(time.perf_counter() - started)
+        if json.loads(line).get('ok'):
+            counts['ok'] += 1
+        else:
+            counts['rejected'] += 1
+    await sender
+    writer.close()
+
+
+async def create_accounts(host: str, port: int, names: List[str]):
+    """Create the accounts the load runs against, pipelined on one connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+    for name in names:
+        writer.write(json.dumps({'op': 'create', 'name': name}).encode() + b'\n')
+    await writer.drain()
+    for _ in names:
+        await reader.readline()
+    writer.close()
+
+
+async def run_clients(host: str, port: int, names: List[str], connections: int, pipeline: int,
+                      duration: float, seed: int) -> Tuple[List[float], Dict[str, int]]:
+    """Run connections clients for duration seconds; returns latencies and counts"""
+    latencies: List[float] = []
+    counts = {'ok': 0, 'rejected': 0, 'errors': 0}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(host, port, names, pipeline, deadline, seed + i, latencies, counts)
+                           for i in range(connections)))
+    return latencies, counts
+
+
+def client_process(job: Tuple) -> Tuple[List[float], Dict[str, int]]:
+    """Entry point of one load generating process"""
+    return asyncio.run(run_clients(*job))
+
+
+def run_load(host: str, port: int, connections: int = 32, pipeline: int = 8, duration: float = 10.0,
+             accounts: int = 100, processes: int = 1, seed: int = 1) -> Dict:
+    """Drive the server and return throughput and latency statistics
+
+    A single Python client tops out well below what the server can take,
+    so the connections can be spread over several processes.
+    """
+    names = [f"load_pigeon_{i}" for i in range(accounts)]
+    asyncio.run(create_accounts(host, port, names))
+
+    processes = max(1, min(processes, connections))
+    jobs = [(host, port, names, len(range(i, connections, processes)), pipeline, duration, seed + 1000 * i)
+            for i in range(processes)]
+    start = time.perf_counter()
+    if processes == 1:
+        results = [client_process(jobs[0])]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(client_process, jobs))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for part, _ in results for latency in part)
+    counts = {key: sum(part[key] for _, part in results) for key in ('ok', 'rejected', 'errors')}
+    result = {'requests': len(latencies), 'seconds': elapsed, 'rps': len(latencies) / elapsed, **counts}
+    if latencies:
+        result.update({f"p{label}_ms": percentile(latencies, fraction) * 1000
+                       for label, fraction in (('50', 0.5), ('90', 0.9), ('99', 0.99), ('999', 0.999))})
+        result['max_ms'] = latencies[-1] * 1000
+    return result
+
+
+def spawn_server(data_dir: str) -> Tuple[subprocess.Popen, int]:
+    """Start `python -m opencooin serve` on a fresh journal and a free port"""
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=package_root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    server = subprocess.Popen([sys.executable, '-m', 'opencooin', '--journal',
+                               '--data-file', os.path.join(data_dir, "loadgen.json"),
+                               'serve', '--port', '0'], env=env, stdout=subprocess.PIPE, text=True)
+    # The server prints "Listening on host:port" once it accepts connections
+    port = int(server.stdout.readline().rsplit(':', 1)[1])
+    return server, port
+
+
+def main(host: str, port: int, connections: int, pipeline: int, duration: float,
+         accounts: int, processes: int, spawn: bool) -> Dict:
+    """Run a load test, optionally against a server started just for it"""
+    if not spawn:
+        return run_load(host, port, connections, pipeline, duration, accounts, processes)
+    with tempfile.TemporaryDirectory() as data_dir:
+        server, port = spawn_server(data_dir)
+        try:
+            return run_load('127.0.0.1', port, connections, pipeline, duration, accounts, processes)
+        finally:
+            server.send_signal(signal.SIGINT)
+            server.wait()
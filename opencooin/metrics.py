@@ -0,0 +1,400 @@
+"""
+Opt-in instrumentation: counters, latency histograms and gauges.
+
+Every exchange has a Metrics registry, disabled unless asked for. While it
+is disabled the instrumented code pays one attribute check per operation
+and nothing is recorded; it can be enabled and disabled at runtime. The
+registry is exported as Prometheus text over HTTP (MetricsServer) or
+dumped as JSON to a local file every few seconds (JsonDumper):
+
+    opencooin_operation_seconds{op="save"}   latency histogram per operation
+    opencooin_trades_total{result="filled"}  counters
+    opencooin_file_bytes{file="journal"}     gauges, read at export time
+
+Errors logged under the opencooin logger are counted as errors_total while
+the registry is enabled. A Profiler switches cProfile and tracemalloc on
+and off in a running process, from code or with SIGUSR1/SIGUSR2.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional, Tuple
+
+PREFIX = 'opencooin_'
+DEFAULT_METRICS_PORT = 9642
+# Upper bounds in seconds, from a fast in-memory trade to a large rewrite
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def series(name: str, labels: Labels) -> str:
+    """A metric name with its labels in Prometheus notation"""
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Histogram:
+    """Observation counts per LATENCY_BUCKETS bucket, plus their sum"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        # The last slot counts observations above every bound
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None above the last bound)"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class Timer:
+    """Context manager observing the time spent inside it"""
+
+    __slots__ = ('metrics', 'op', 'started')
+
+    def __init__(self, metrics: 'Metrics', op: str):
+        self.metrics = metrics
+        self.op = op
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.op, time.perf_counter() - self.started)
+
+
+NULL_TIMER = nullcontext()
+
+
+def get_logger(name: str):
+    """The named logger, importing logging on first use
+
+    logging and what it imports cost every import of the package ~9 ms, and
+    the package only logs on errors and from the exporters.
+    """
+    import logging
+    return logging.getLogger(name)
+
+
+def error_counter(metrics: 'Metrics'):
+    """A logging handler counting error records as errors_total{logger=...}"""
+    import logging
+
+    class ErrorCounter(logging.Handler):
+        def emit(self, record: logging.LogRecord):
+            metrics.inc('errors', logger=record.name)
+
+    return ErrorCounter(logging.ERROR)
+
+
+class Metrics:
+    """Registry of counters, per-operation latency histograms and gauges
+
+    Counters and histograms only record while enabled. Gauges are
+    callables registered once and read when the registry is exported, so
+    they cost nothing in between.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[Tuple[str, Labels], Callable[[], float]] = {}
+        self.error_counter = None
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        """Start recording, including errors logged under opencooin"""
+        if not self.enabled:
+            self.enabled = True
+            if self.error_counter is None:
+                self.error_counter = error_counter(self)
+            get_logger('opencooin').addHandler(self.error_counter)
+
+    def disable(self):
+        """Stop recording; what was recorded so far is kept"""
+        if self.enabled:
+            self.enabled = False
+            get_logger('opencooin').removeHandler(self.error_counter)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        """Add to the counter name_total"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, op: str, seconds: float):
+        """Record one operation's latency"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(op)
+            if histogram is None:
+                histogram = self.histograms[op] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, op: str):
+        """Context manager timing a block as op (a no-op while disabled)"""
+        return Timer(self, op) if self.enabled else NULL_TIMER
+
+    def gauge(self, name: str, read: Callable[[], float], **labels: str):
+        """Register a gauge, read by calling read() at export time
+
+        Gauges whose read() raises OSError (e.g. the size of a file that
+        doesn't exist yet) are left out of that export.
+        """
+        self.gauges[(name, tuple(sorted(labels.items())))] = read
+
+    def read_gauges(self) -> Dict[Tuple[str, Labels], float]:
+        values = {}
+        for key, read in list(self.gauges.items()):
+            try:
+                values[key] = read()
+            except OSError:
+                pass
+        return values
+
+    def snapshot(self) -> Dict:
+        """The current values as a JSON-serializable dict"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {op: (list(h.counts), h.sum, h.count, h.quantile(0.5), h.quantile(0.99))
+                          for op, h in self.histograms.items()}
+        return {
+            'timestamp': time.time(),
+            'enabled': self.enabled,
+            'counters': {series(name + '_total', labels): value for (name, labels), value in counters.items()},
+            'gauges': {series(name, labels): value for (name, labels), value in self.read_gauges().items()},
+            'operations': {
+                op: {
+                    'count': count,
+                    'sum_seconds': total,
+                    'p50_seconds': p50,
+                    'p99_seconds': p99,
+                    'buckets': {str(bound): bucket for bound, bucket in zip(LATENCY_BUCKETS + ('+Inf',), counts)}
+                }
+                for op, (counts, total, count, p50, p99) in histograms.items()
+            }
+        }
+
+    def render_prometheus(self) -> str:
+        """The current values in the Prometheus text exposition format"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((op, list(h.counts), h.sum, h.count) for op, h in self.histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = PREFIX + name + '_total'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{series(metric, labels)} {value}")
+        for (name, labels), value in sorted(self.read_gauges().items()):
+            metric = PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{series(metric, labels)} {value}")
+        if histograms:
+            metric = PREFIX + 'operation_seconds'
+            lines.append(f"# TYPE {metric} histogram")
+        for op, counts, total, count in histograms:
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(f'{metric}_bucket{{op="{op}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{op="{op}"}} {total}')
+            lines.append(f'{metric}_count{{op="{op}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Prometheus endpoint on a background thread
+
+    Serves /metrics in the text format and /metrics.json as a snapshot.
+    """
+
+    def __init__(self, metrics: Metrics, host: str = '127.0.0.1', port: int = DEFAULT_METRICS_PORT):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start listening; port 0 picks a free port"""
+        # Deferred, like the profilers below: the exchange imports this
+        # module and most processes never export anything
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = metrics.render_prometheus().encode()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(metrics.snapshot()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="opencooin-metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+
+
+class JsonDumper:
+    """Write the registry's snapshot to a local JSON file every interval seconds
+
+    The file is replaced atomically, and written once more on stop.
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = 10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name="opencooin-metrics-dump", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        tmp_file = self.path + ".tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(self.metrics.snapshot(), f, indent=2)
+            os.replace(tmp_file, self.path)
+        except OSError:
+            get_logger(__name__).exception("Error writing metrics")
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+            self.dump()
+
+
+class Profiler:
+    """Switch cProfile and tracemalloc on and off at runtime
+
+    Each toggle starts a profile, and the next one stops it and writes the
+    result to directory: a .prof file for pstats/snakeviz, or the top
+    allocation sites as text. cProfile only sees the thread it was started
+    on; with install_signals that is the main thread, which runs the
+    server's event loop and the GUI.
+    """
+
+    def __init__(self, directory: str = '.', frames: int = 10, top: int = 50):
+        self.directory = directory
+        self.frames = frames
+        self.top = top
+        self.cpu = None
+        self.lock = threading.Lock()
+
+    def output_path(self, kind: str, suffix: str) -> str:
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.directory, f"opencooin-{kind}-{os.getpid()}-{stamp}{suffix}")
+
+    def toggle_cpu(self) -> Optional[str]:
+        """Start profiling, or stop and return the path of the written profile"""
+        import cProfile
+        with self.lock:
+            if self.cpu is None:
+                self.cpu = cProfile.Profile()
+                self.cpu.enable()
+                return None
+            profile, self.cpu = self.cpu, None
+        profile.disable()
+        path = self.output_path('cpu', '.prof')
+        profile.dump_stats(path)
+        return path
+
+    def toggle_memory(self) -> Optional[str]:
+        """Start tracing allocations, or stop and return the path of the report"""
+        import tracemalloc
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                return None
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        stats = snapshot.statistics('lineno')
+        path = self.output_path('memory', '.txt')
+        with open(path, 'w') as f:
+            f.write(f"{sum(stat.size for stat in stats)} bytes traced in {len(stats)} sites\n")
+            for stat in stats[:self.top]:
+                f.write(f"{stat}\n")
+        return path
+
+    def install_signals(self) -> bool:
+        """Toggle cProfile on SIGUSR1 and tracemalloc on SIGUSR2
+
+        Returns False where those signals don't exist. Must be called from
+        the main thread.
+        """
+        import signal
+        if not hasattr(signal, 'SIGUSR1'):
+            return False
+
+        def toggle(toggle_profile, kind):
+            def handler(signum, frame):
+                path = toggle_profile()
+                get_logger(__name__).info("%s profile %s", kind, f"written to {path}" if path else "started")
+            return handler
+
+        signal.signal(signal.SIGUSR1, toggle(self.toggle_cpu, "CPU"))
+        signal.signal(signal.SIGUSR2, toggle(self.toggle_memory, "Memory"))
+        return True
@@ -0,0 +1,87 @@
+"""
+Fixed-point money: EUR and COO amounts as scaled integers.
+
+Balances, held funds and the transaction log keep whole micro-EUR and
+nano-COO, and prices whole micro-EUR per COO, so sums over any number of
+trades are exact. An account balance is a {'coo': nano-COO, 'eur':
+micro-EUR} dict; dicts holding only ints are never tracked by the garbage
+collector, which matters with one new balance per trade. Floats only
+appear at the edges: amounts typed by a user or sent by a client, and the
+JSON files, journal records and dicts handed out by the exchange, which
+keep their float format.
+
+Rounding is defined at the two places it can happen:
+
+    float -> units    to the nearest unit, ties to even (round())
+    trade conversion  down (floor) in the price path: COO bought for an EUR
+                      amount and EUR received for a COO amount never exceed
+                      their exact value, so the exchange can't pay out
+                      money that doesn't exist
+"""
+
+from array import array
+from typing import Dict
+
+from .pricing import np
+
+EUR_SCALE = 10 ** 6  # micro-EUR
+COO_SCALE = 10 ** 9  # nano-COO
+
+
+def to_micro_eur(amount: float) -> int:
+    """EUR (or EUR per COO) as whole micro-EUR"""
+    return round(amount * EUR_SCALE)
+
+
+def to_nano_coo(amount: float) -> int:
+    """COO as whole nano-COO"""
+    return round(amount * COO_SCALE)
+
+
+def from_micro_eur(units: int) -> float:
+    """Whole micro-EUR as EUR"""
+    return units / EUR_SCALE
+
+
+def from_nano_coo(units: int) -> float:
+    """Whole nano-COO as COO"""
+    return units / COO_SCALE
+
+
+def coo_for_eur(eur: int, price: int) -> int:
+    """nano-COO bought with eur micro-EUR at price, rounded down"""
+    return eur * COO_SCALE // price
+
+
+def eur_for_coo(coo: int, price: int) -> int:
+    """micro-EUR paid for coo nano-COO at price, rounded down"""
+    return coo * price // COO_SCALE
+
+
+def eur_for_coo_up(coo: int, price: int) -> int:
+    """micro-EUR paid for coo nano-COO at price, rounded up (for reservations)"""
+    return -(-coo * price // COO_SCALE)
+
+
+def scale_floats(values, scale: int) -> array:
+    """Convert a buffer of float64 amounts to an int64 array of units
+
+    With NumPy the conversion runs in one vectorized pass (np.rint also
+    rounds ties to even, matching round()).
+    """
+    if np is None:
+        return array('q', (round(value * scale) for value in values))
+    units = np.rint(np.frombuffer(values, dtype=np.float64) * scale).astype(np.int64)
+    result = array('q')
+    result.frombytes(units.tobytes())
+    return result
+
+
+def balance_from_floats(values: Dict) -> Dict:
+    """An account balance from its float {'coo_balance', 'eur_balance'} form"""
+    return {'coo': to_nano_coo(values['coo_balance']), 'eur': to_micro_eur(values['eur_balance'])}
+
+
+def balance_to_floats(balance: Dict) -> Dict:
+    """The float {'coo_balance', 'eur_balance'} form used in files and replies"""
+    return {'coo_balance': balance['coo'] / COO_SCALE, 'eur_balance': balance['eur'] / EUR_SCALE}
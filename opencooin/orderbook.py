@@ -0,0 +1,322 @@
+"""
+Limit order book and matching engine.
+
+Resting orders sit in price levels: a heap of prices per side (bids stored
+negated, so both heaps pop the best price first) and a FIFO deque of orders
+per level, giving price-time priority. Cancels are lazy: the order is
+zeroed and dropped from the id index, and its deque entry is discarded
+when matching reaches it.
+
+Fills settle into the exchange's account balances and are recorded through
+add_transaction like any other trade, at the resting order's price. Limit
+orders reserve what they may spend when they are placed (EUR for bids, COO
+for asks) with OpenCooinExchange.hold_funds; the book itself lives in
+memory only, and held funds are persisted as part of the account balance,
+so a restart simply returns them.
+
+Inside the book amounts are nano-COO and prices micro-EUR per COO (see
+opencooin.money), so levels and reservations add up exactly; place() takes
+and returns floats. A fill pays the resting price rounded down to the
+micro-EUR, and a bid reserves its limit value rounded up, so the
+reservation always covers what its fills cost.
+"""
+
+import heapq
+import itertools
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from .exchange import TradeError
+from .money import (COO_SCALE, EUR_SCALE, eur_for_coo, eur_for_coo_up, from_micro_eur, from_nano_coo,
+                    to_micro_eur, to_nano_coo)
+
+
+class Order:
+    """An order in the book; amount is the nano-COO still open
+
+    A market order has no price. Once an order leaves the book its amount
+    is zero; filled keeps what was traded. reserved is the micro-EUR a bid
+    still holds.
+    """
+
+    __slots__ = ('id', 'account', 'side', 'price', 'amount', 'filled', 'reserved')
+
+    def __init__(self, order_id: int, account: str, side: str, price: Optional[int], amount: int):
+        self.id = order_id
+        self.account = account
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.filled = 0
+        self.reserved = 0
+
+    def as_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'account': self.account,
+            'side': self.side,
+            'price': None if self.price is None else from_micro_eur(self.price),
+            'amount': from_nano_coo(self.amount),
+            'filled': from_nano_coo(self.filled)
+        }
+
+
+class Level:
+    """Orders resting at one price, oldest first"""
+
+    __slots__ = ('orders', 'volume')
+
+    def __init__(self):
+        self.orders = deque()
+        self.volume = 0
+
+
+class OrderBook:
+    """Price-time priority order book settling into an OpenCooinExchange
+
+    All book operations are serialized by the book's lock. Matching an
+    order that crosses the spread can touch any account, so it runs with
+    every account lock stripe and the exchange's log_lock held, and all of
+    its fills are persisted with one commit; orders that only rest need
+    just their own account's lock.
+    """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.orders: Dict[int, Order] = {}
+        self.bids: List[int] = []
+        self.asks: List[int] = []
+        self.bid_levels: Dict[int, Level] = {}
+        self.ask_levels: Dict[int, Level] = {}
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def best_bid(self) -> Optional[float]:
+        with self.lock:
+            level = self.top(self.bids, self.bid_levels, -1)
+            return None if level is None else from_micro_eur(-self.bids[0])
+
+    def best_ask(self) -> Optional[float]:
+        with self.lock:
+            level = self.top(self.asks, self.ask_levels, 1)
+            return None if level is None else from_micro_eur(self.asks[0])
+
+    def top(self, heap: List[int], levels: Dict[int, Level], sign: int) -> Optional[Level]:
+        """The best live level of one side, dropping emptied levels on the way"""
+        while heap:
+            level = levels.get(sign * heap[0])
+            if level is not None and level.volume > 0:
+                return level
+            levels.pop(sign * heapq.heappop(heap), None)
+        return None
+
+    def depth(self, levels: int = 10) -> Dict[str, List]:
+        """Aggregated [price, amount] of the best levels on each side"""
+        with self.lock:
+            bids = sorted((price, level.volume) for price, level in self.bid_levels.items() if level.volume)
+            asks = sorted((price, level.volume) for price, level in self.ask_levels.items() if level.volume)
+        return {
+            'bids': [[price / EUR_SCALE, volume / COO_SCALE] for price, volume in bids[::-1][:levels]],
+            'asks': [[price / EUR_SCALE, volume / COO_SCALE] for price, volume in asks[:levels]]
+        }
+
+    def place(self, account: str, side: str, amount: float, price: Optional[float] = None) -> Dict:
+        """Submit a limit order (with price) or a market order (without)
+
+        Whatever crosses the book fills immediately at the resting orders'
+        prices. The rest of a limit order stays in the book; the rest of a
+        market order is cancelled. Raises TradeError for an unknown account,
+        a bad side, amount or price, or funds that can't cover a limit
+        order's reservation. amount is rounded to the nano-COO and price to
+        the micro-EUR.
+        """
+        if side not in ('buy', 'sell'):
+            raise TradeError(f"unknown order type {side!r}")
+        amount = to_nano_coo(amount)
+        if not amount > 0:
+            raise TradeError("amount must be positive")
+        if price is not None:
+            price = to_micro_eur(price)
+            if not price > 0:
+                raise TradeError("price must be positive")
+
+        exchange = self.exchange
+        with self.lock:
+            order = Order(next(self.ids), account, side, price, amount)
+            if side == 'buy':
+                opposite = self.top(self.asks, self.ask_levels, 1)
+                crosses = opposite is not None and (price is None or self.asks[0] <= price)
+            else:
+                opposite = self.top(self.bids, self.bid_levels, -1)
+                crosses = opposite is not None and (price is None or -self.bids[0] >= price)
+
+            locks = exchange.account_locks if crosses else [exchange.account_lock(account)]
+            for lock in locks:
+                lock.acquire()
+            try:
+                with exchange.log_lock:
+                    balance = exchange.accounts.get(account)
+                    if balance is None:
+                        raise TradeError("unknown account")
+                    if price is not None:
+                        self.reserve(order, balance)
+
+                    fills = []
+                    records = []
+                    if crosses:
+                        self.match(order, fills, records)
+                    if order.amount and price is not None:
+                        self.rest(order)
+                        status = 'resting'
+                    else:
+                        status = 'cancelled' if order.amount else 'filled'
+                        self.release(order)
+                    exchange.commit(*records)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+
+        result = order.as_dict()
+        result.update(status=status, fills=fills)
+        return result
+
+    def cancel(self, order_id: int) -> bool:
+        """Cancel a resting order and release its reservation"""
+        exchange = self.exchange
+        with self.lock:
+            order = self.orders.pop(order_id, None)
+            if order is None:
+                return False
+            levels = self.bid_levels if order.side == 'buy' else self.ask_levels
+            level = levels.get(order.price)
+            if level is not None:
+                level.volume -= order.amount
+            with exchange.account_lock(order.account), exchange.log_lock:
+                self.release(order)
+        return True
+
+    def cancel_all(self) -> int:
+        """Cancel every resting order, returning how many there were"""
+        with self.lock:
+            orders = list(self.orders.values())
+        return sum(self.cancel(order.id) for order in orders)
+
+    def close(self):
+        """Release all reservations; the book isn't persisted"""
+        self.cancel_all()
+
+    def reserve(self, order: Order, balance: Dict):
+        """Hold the funds a limit order may spend"""
+        if order.side == 'buy':
+            cost = eur_for_coo_up(order.amount, order.price)
+            if balance['eur'] < cost:
+                raise TradeError("insufficient EUR balance")
+            self.exchange.hold_funds(order.account, 0, cost)
+            order.reserved = cost
+        else:
+            if balance['coo'] < order.amount:
+                raise TradeError("insufficient COO balance")
+            self.exchange.hold_funds(order.account, order.amount, 0)
+
+    def release(self, order: Order):
+        """Return the reservation of an order's open amount and zero it"""
+        if order.price is not None and order.amount > 0:
+            if order.side == 'buy':
+                self.exchange.hold_funds(order.account, 0, -order.reserved)
+                order.reserved = 0
+            else:
+                self.exchange.hold_funds(order.account, -order.amount, 0)
+        order.amount = 0
+
+    def rest(self, order: Order):
+        """Queue an order at the back of its price level"""
+        if order.side == 'buy':
+            heap, levels, key = self.bids, self.bid_levels, -order.price
+        else:
+            heap, levels, key = self.asks, self.ask_levels, order.price
+        level = levels.get(order.price)
+        if level is None:
+            level = levels[order.price] = Level()
+            heapq.heappush(heap, key)
+        level.orders.append(order)
+        level.volume += order.amount
+        self.orders[order.id] = order
+
+    def match(self, taker: Order, fills: List[Dict], records: List[Dict]):
+        """Fill a taker against the opposite side while prices cross"""
+        if taker.side == 'buy':
+            heap, levels, sign = self.asks, self.ask_levels, 1
+        else:
+            heap, levels, sign = self.bids, self.bid_levels, -1
+
+        while taker.amount:
+            level = self.top(heap, levels, sign)
+            if level is None:
+                return
+            price = sign * heap[0]
+            if taker.price is not None and sign * (price - taker.price) > 0:
+                return
+
+            queue = level.orders
+            while queue and taker.amount:
+                maker = queue[0]
+                if not maker.amount:
+                    # Cancelled or filled earlier
+                    queue.popleft()
+                    continue
+                amount = self.fill_amount(taker, maker, price)
+                if not amount:
+                    # A market order ran out of funds
+                    return
+                self.settle(taker, maker, amount, price, records)
+                level.volume -= amount
+                fills.append({'order_id': maker.id, 'price': from_micro_eur(price),
+                              'coo_amount': from_nano_coo(amount)})
+                if not maker.amount:
+                    queue.popleft()
+                    del self.orders[maker.id]
+
+    def fill_amount(self, taker: Order, maker: Order, price: int) -> int:
+        """How much of maker the taker can fill; market orders are limited by funds"""
+        amount = min(taker.amount, maker.amount)
+        if taker.price is None:
+            balance = self.exchange.accounts[taker.account]
+            if taker.side == 'buy':
+                amount = min(amount, balance['eur'] * COO_SCALE // price)
+            else:
+                amount = min(amount, balance['coo'])
+        return amount
+
+    def settle(self, taker: Order, maker: Order, amount: int, price: int, records: List[Dict]):
+        """Move funds for one fill and record both sides of it"""
+        exchange = self.exchange
+        buyer, seller = (taker, maker) if taker.side == 'buy' else (maker, taker)
+        eur_amount = eur_for_coo(amount, price)
+
+        for order in (buyer, seller):
+            order.amount -= amount
+            order.filled += amount
+        # Free this fill's share of each reservation, then trade from the
+        # available balance like an instant order would. A bid keeps exactly
+        # the rounded-up value of what is still open
+        if buyer.price is not None:
+            reserved = eur_for_coo_up(buyer.amount, buyer.price)
+            exchange.hold_funds(buyer.account, 0, reserved - buyer.reserved)
+            buyer.reserved = reserved
+        if seller.price is not None:
+            exchange.hold_funds(seller.account, -amount, 0)
+
+        balance = exchange.accounts[buyer.account]
+        bought = exchange.apply_trade(buyer.account,
+                                      {'coo': balance['coo'] + amount, 'eur': balance['eur'] - eur_amount},
+                                      'buy', amount, eur_amount, price)
+        balance = exchange.accounts[seller.account]
+        sold = exchange.apply_trade(seller.account,
+                                    {'coo': balance['coo'] - amount, 'eur': balance['eur'] + eur_amount},
+                                    'sell', amount, eur_amount, price)
+        records.append(exchange.trade_record(bought))
+        records.append(exchange.trade_record(sold))
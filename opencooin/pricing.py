@@ -0,0 +1,193 @@
+"""
+OpenCooin price model.
+
+The price is a deterministic function of the calendar month, so it is
+computed once per (year, month) and cached. NumPy is optional and only used
+to evaluate long series of months in one vectorized pass.
+"""
+
+import bisect
+import math
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+BASE_PRICE = 0.25
+
+
+def price_formula(year, month, sin=math.sin, cos=math.cos):
+    """Unrounded OpenCooin price in EUR for calendar months
+
+    Scalars with the default math functions, or whole arrays of years and
+    months when given np.sin and np.cos.
+    """
+    # Base price starts at €0.25, varies by month with realistic volatility
+    month_multiplier = 1 + (month * 0.1) + (sin(month) * 0.2)
+    year_multiplier = 1 + ((year - 2024) * 0.5)
+
+    # Add some realistic market volatility
+    volatility = 1 + ((sin(month * 2.5) + cos(year)) * 0.3)
+
+    return BASE_PRICE * month_multiplier * year_multiplier * volatility
+
+
+def month_price(year: int, month: int) -> float:
+    """Unrounded OpenCooin price in EUR for a calendar month"""
+    return price_formula(year, month)
+
+
+def month_key(when) -> Tuple[int, int]:
+    """(year, month) for a datetime/date or an existing (year, month) tuple"""
+    if isinstance(when, tuple):
+        return when
+    return when.year, when.month
+
+
+def previous_month(year: int, month: int) -> Tuple[int, int]:
+    """(year, month) of the month before"""
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def next_month(year: int, month: int) -> Tuple[int, int]:
+    """(year, month) of the month after"""
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class PriceModel:
+    """Monthly price curve with a per-month cache
+
+    The current month's price and change are kept until the next month
+    boundary (the date get_next_update_date reports), so reading them costs
+    one clock comparison instead of re-evaluating the formula.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.now):
+        self.clock = clock
+        self.cache: Dict[Tuple[int, int], float] = {}
+        self.current_key = None
+        self.valid_until = None
+        self.current = 0.0
+        self.change = 0.0
+
+    def raw_price(self, year: int, month: int) -> float:
+        """Cached unrounded price for a month"""
+        key = (year, month)
+        price = self.cache.get(key)
+        if price is None:
+            price = self.cache[key] = month_price(year, month)
+        return price
+
+    def price(self, year: int, month: int) -> float:
+        """Quoted price for a month, rounded to 4 decimals"""
+        return round(self.raw_price(year, month), 4)
+
+    def refresh(self):
+        """Recompute the current month's values if the boundary has passed"""
+        now = self.clock()
+        if self.valid_until is not None and now < self.valid_until:
+            return
+        key = (now.year, now.month)
+        self.current = self.price(*key)
+        last_price = self.raw_price(*previous_month(*key))
+        self.change = round(((self.current - last_price) / last_price) * 100, 2)
+        self.valid_until = datetime(*next_month(*key), 1)
+        self.current_key = key
+
+    def current_price(self) -> float:
+        """Price for the current month"""
+        self.refresh()
+        return self.current
+
+    def price_change(self) -> float:
+        """Change against the previous month's price, in percent"""
+        self.refresh()
+        return self.change
+
+    def next_update(self) -> datetime:
+        """First day of the next month, when the price changes"""
+        self.refresh()
+        return self.valid_until
+
+    def months(self, start, end) -> List[Tuple[int, int]]:
+        """All (year, month) keys from start to end inclusive"""
+        key, end_key = month_key(start), month_key(end)
+        keys = []
+        while key <= end_key:
+            keys.append(key)
+            key = next_month(*key)
+        return keys
+
+    def price_series(self, start, end):
+        """Quoted prices for every month from start to end inclusive
+
+        start and end are datetimes/dates or (year, month) tuples. A list
+        either way; with NumPy installed the formula is evaluated for the
+        whole range in one vectorized pass, otherwise month by month through
+        the cache. Both round like price(), as np.round can differ from
+        round() on the last digit.
+        """
+        keys = self.months(start, end)
+        if np is None:
+            return [self.price(year, month) for year, month in keys]
+
+        years = np.fromiter((year for year, _ in keys), dtype=np.float64, count=len(keys))
+        months = np.fromiter((month for _, month in keys), dtype=np.float64, count=len(keys))
+        return [round(price, 4) for price in price_formula(years, months, np.sin, np.cos).tolist()]
+
+
+class PriceHistory:
+    """Price lookup at arbitrary timestamps
+
+    Month start times (epoch seconds, local time like the transaction
+    timestamps) and their quoted prices are precomputed into a sorted table,
+    so price_at is a bisection. The table grows on demand when a timestamp
+    falls outside it.
+
+    The table is one (starts, prices) tuple, replaced whole: price_at runs
+    unlocked on trading threads and must never pair new starts with old
+    prices.
+    """
+
+    def __init__(self, model: PriceModel, first=(2024, 1), months_ahead: int = 24):
+        self.model = model
+        self.first = first
+        self.table: Tuple[List[float], List[float]] = ([], [])
+        now = model.clock()
+        self.extend_to(month_key(now), months_ahead)
+
+    def extend_to(self, last, months_ahead: int = 0):
+        """Rebuild the table to cover everything up to last plus months_ahead"""
+        key = last
+        for _ in range(months_ahead):
+            key = next_month(*key)
+        keys = self.model.months(self.first, key)
+        starts = [datetime(year, month, 1).timestamp() for year, month in keys]
+        prices = [self.model.price(year, month) for year, month in keys]
+        self.table = (starts, prices)
+
+    def price_at(self, when) -> float:
+        """Quoted price at a datetime or epoch-seconds timestamp"""
+        timestamp = when.timestamp() if isinstance(when, datetime) else when
+        starts, prices = self.table
+        if timestamp < starts[0]:
+            return self.model.price(*month_key(datetime.fromtimestamp(timestamp)))
+        if timestamp >= starts[-1]:
+            # In or after the table's last month; make sure its end is covered
+            self.extend_to(month_key(datetime.fromtimestamp(timestamp)), 12)
+            starts, prices = self.table
+        return prices[bisect.bisect_right(starts, timestamp) - 1]
+
+    def prices_at(self, timestamps):
+        """Quoted prices for many epoch-seconds timestamps at once"""
+        if np is None or not len(timestamps):
+            return [self.price_at(timestamp) for timestamp in timestamps]
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        starts, prices = self.table
+        if timestamps.min() < starts[0] or timestamps.max() >= starts[-1]:
+            return np.array([self.price_at(timestamp) for timestamp in timestamps])
+        index = np.searchsorted(np.asarray(starts), timestamps, side='right') - 1
+        return np.asarray(prices)[index]
@@ -0,0 +1,139 @@
+"""
+Compact binary history segments, memory-mapped on load.
+
+A segment stores a TransactionLog's columns back to back so that opening
+one costs O(number of users), not O(history): the columns and the per-user
+index are memoryviews over an mmap and only the pages a reader touches are
+read from disk.
+
+Layout (native byte order, every section 8-byte aligned):
+
+    header      magic, version, byte order, rows, users, users blob size
+    users       JSON list of interned user names
+    columns     timestamp q, coo q, eur q, price q, user I, type B  [rows each]
+    offsets     Q[users + 1], start of each user's run in order
+    order       Q[rows], row positions grouped by user, ascending
+
+Version 2 stores amounts and prices in fixed point (nano-COO, micro-EUR).
+Version 1 segments, with float columns, are still read: their money
+columns are converted on load and the next snapshot writes version 2.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import List
+
+from .money import COO_SCALE, EUR_SCALE, scale_floats
+
+MAGIC = b'OCTX'
+VERSION = 2
+HEADER = struct.Struct('<4sBBHQQQ')
+BYTE_ORDER = 0 if sys.byteorder == 'little' else 1
+COLUMNS = (
+    ('timestamp_col', 'q'),
+    ('coo_col', 'q'),
+    ('eur_col', 'q'),
+    ('price_col', 'q'),
+    ('user_col', 'I'),
+    ('type_col', 'B'),
+)
+# Version 1 money columns: stored as float64, scaled to units on load
+V1_FLOAT_COLUMNS = {'coo_col': COO_SCALE, 'eur_col': EUR_SCALE, 'price_col': EUR_SCALE}
+
+
+def padding(offset: int) -> int:
+    """Bytes needed to align an offset to 8"""
+    return -offset % 8
+
+
+class Segment:
+    """Read-only, memory-mapped history segment
+
+    ``rows`` can limit the segment to a prefix of what is on disk: snapshots
+    record how many rows belong to them, so a segment written just before a
+    crash can't add rows the accompanying accounts don't reflect.
+    """
+
+    def __init__(self, path: str, rows: int = None):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        magic, version, byte_order, _, stored_rows, user_count, users_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError(f"{path} is not a version 1 or {VERSION} history segment")
+        if byte_order != BYTE_ORDER:
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+
+        offset = HEADER.size
+        self.users: List[str] = json.loads(bytes(view[offset:offset + users_size]))
+        offset += users_size
+
+        for name, typecode in COLUMNS:
+            offset += padding(offset)
+            size = struct.calcsize(typecode) * stored_rows
+            if version == 1 and name in V1_FLOAT_COLUMNS:
+                # Same width as the q column, so the layout doesn't move
+                column = scale_floats(view[offset:offset + size].cast('d'), V1_FLOAT_COLUMNS[name])
+            else:
+                column = view[offset:offset + size].cast(typecode)
+            setattr(self, name, column)
+            offset += size
+
+        offset += padding(offset)
+        self.offsets = view[offset:offset + 8 * (user_count + 1)].cast('Q')
+        offset += 8 * (user_count + 1)
+        self.order = view[offset:offset + 8 * stored_rows].cast('Q')
+        self.rows = stored_rows if rows is None else min(rows, stored_rows)
+
+    def user_positions(self, user_id: int):
+        """A user's row positions in this segment, ascending"""
+        positions = self.order[self.offsets[user_id]:self.offsets[user_id + 1]]
+        if self.rows < len(self.order) and len(positions) and positions[-1] >= self.rows:
+            positions = positions[:bisect.bisect_left(positions, self.rows)]
+        return positions
+
+
+def write_segment(path: str, log, count: int = None):
+    """Atomically write the first count rows of a TransactionLog as a segment"""
+    count = len(log) if count is None else count
+    base_count = min(count, log.base_rows)
+    tail_count = count - base_count
+    users = list(log.users)
+    users_blob = json.dumps(users, separators=(',', ':')).encode()
+
+    # Each user's positions below count, from the base segment and the arrays
+    parts = []
+    for user_id in range(len(users)):
+        head, tail = log.position_parts(user_id)
+        head = head[:bisect.bisect_left(head, count)]
+        tail = tail[:bisect.bisect_left(tail, count)]
+        parts.append((head, tail))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER, 0, count, len(users), len(users_blob)))
+        f.write(users_blob)
+        for name, _ in COLUMNS:
+            f.write(b'\0' * padding(f.tell()))
+            if base_count:
+                f.write(getattr(log.base, name)[:base_count])
+            # Slicing copies the array; a memoryview over it would block
+            # concurrent appends from resizing it
+            f.write(getattr(log, name)[:tail_count])
+
+        f.write(b'\0' * padding(f.tell()))
+        offsets = [0]
+        for head, tail in parts:
+            offsets.append(offsets[-1] + len(head) + len(tail))
+        f.write(struct.pack(f'{len(offsets)}Q', *offsets))
+        for head, tail in parts:
+            f.write(head)
+            f.write(tail)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
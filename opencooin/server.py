@@ -0,0 +1,271 @@
+"""
+Asyncio line-protocol server in front of an OpenCooinExchange.
+
+Every request and response is one JSON object on its own line:
+
+    {"id": 1, "op": "buy", "account": "homer_pigeon", "amount": 25}
+    {"id": 1, "ok": true, "transaction": {...}}
+
+Connections are kept open for any number of requests, and clients may
+pipeline: requests are read ahead and the responses are written back in
+request order, several per write when they are ready together. Each request
+sees the effects of the ones before it on its connection. Trades from all
+connections go through one GroupCommitter, so pipelined and concurrent
+orders share durable writes. A connection can "login" once and then leave
+out "account".
+
+Operations: ping, price, create (name), login (account), balance, buy and
+sell (amount: EUR to spend, COO to sell), history (limit, before, type).
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import Dict, Optional
+
+from .batch import GroupCommitter
+from .metrics import get_logger
+
+DEFAULT_PORT = 8642
+# Requests a connection may have in flight before reading pauses
+MAX_PIPELINE = 1000
+TRADES = ('buy', 'sell')
+
+
+class RequestError(Exception):
+    """A malformed or unanswerable request"""
+
+
+class Pipeline:
+    """Requests of one connection in flight, oldest first
+
+    slots bounds how many may be in flight; the reader acquires one per
+    request and each response written releases it. None marks the end.
+    """
+
+    def __init__(self):
+        self.tasks = deque()
+        self.slots = asyncio.Semaphore(MAX_PIPELINE)
+        self.pushed = asyncio.Event()
+
+    def push(self, task: Optional[asyncio.Task]):
+        self.tasks.append(task)
+        self.pushed.set()
+
+    async def next(self) -> Optional[asyncio.Task]:
+        """Wait for and remove the oldest request"""
+        while not self.tasks:
+            self.pushed.clear()
+            await self.pushed.wait()
+        return self.pop()
+
+    def pop(self) -> Optional[asyncio.Task]:
+        task = self.tasks.popleft()
+        if task is not None:
+            self.slots.release()
+        return task
+
+    def ready(self) -> bool:
+        """Whether the oldest request has already been answered"""
+        return bool(self.tasks) and self.tasks[0] is not None and self.tasks[0].done()
+
+
+class OpenCooinServer:
+    """Serve an exchange over newline-delimited JSON
+
+    Reads that touch storage (history with an SQLite backend, account
+    creation) run in the loop's default executor so that one slow request
+    doesn't stall every connection.
+    """
+
+    def __init__(self, exchange, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 batch_interval: float = 0.002, max_batch: int = 1000):
+        self.exchange = exchange
+        self.host = host
+        self.port = port
+        self.committer = GroupCommitter(exchange, batch_interval, max_batch)
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.handlers = set()
+        self.writers = set()
+        self.requests = 0
+        exchange.metrics.gauge('connections', lambda: len(self.writers))
+        exchange.metrics.gauge('server_requests', lambda: self.requests)
+
+    async def start(self):
+        """Start listening; port 0 picks a free port"""
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """Stop accepting connections, finish open ones and flush queued trades"""
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.writers):
+                writer.close()
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+            await self.server.wait_closed()
+        await asyncio.get_running_loop().run_in_executor(None, self.committer.close)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read pipelined requests and answer them in order"""
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        self.writers.add(writer)
+        state = {'account': None}
+        pipeline = Pipeline()
+        responder = asyncio.create_task(self.write_responses(pipeline, writer))
+        previous, previous_op, barrier = None, None, None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    request = e
+                op = request.get('op') if isinstance(request, dict) else None
+                # Requests see the effects of earlier ones on the connection,
+                # so each waits for its predecessor. A run of trades shares
+                # one wait instead and is submitted together; the group
+                # committer keeps them in order
+                if not (op in TRADES and previous_op in TRADES):
+                    barrier = previous
+                await pipeline.slots.acquire()
+                previous = asyncio.create_task(self.respond(request, state, barrier))
+                previous_op = op
+                pipeline.push(previous)
+        finally:
+            pipeline.push(None)
+            await responder
+            self.writers.discard(writer)
+            self.handlers.discard(handler)
+
+    async def write_responses(self, pipeline: 'Pipeline', writer: asyncio.StreamWriter):
+        """Write responses in request order, coalescing those already done"""
+        try:
+            while True:
+                task = await pipeline.next()
+                if task is None:
+                    break
+                chunks = [await task]
+                while pipeline.ready():
+                    chunks.append(pipeline.pop().result())
+                writer.write(b''.join(chunks))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request, state: Dict, after: Optional[asyncio.Task]) -> bytes:
+        """Handle one decoded request (or its decoding error), return the response line"""
+        self.requests += 1
+        request_id = None
+        if after is not None:
+            await asyncio.wait([after])
+        try:
+            if isinstance(request, Exception):
+                raise request
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+            request_id = request.get('id')
+            response = await self.dispatch(request, state)
+        except (ValueError, RequestError) as e:
+            response = {'ok': False, 'error': str(e)}
+        except Exception:
+            get_logger(__name__).exception("Error handling request")
+            response = {'ok': False, 'error': "internal error"}
+        if request_id is not None:
+            response = {'id': request_id, **response}
+        return json.dumps(response).encode() + b'\n'
+
+    def account(self, request: Dict, state: Dict) -> str:
+        account = request.get('account') or state['account']
+        if not account:
+            raise RequestError("no account given and not logged in")
+        if not isinstance(account, str):
+            raise RequestError("account must be a string")
+        if account not in self.exchange.accounts:
+            raise RequestError("unknown account")
+        return account
+
+    async def dispatch(self, request: Dict, state: Dict) -> Dict:
+        """Run one request against the exchange"""
+        op = request.get('op')
+        exchange = self.exchange
+        loop = asyncio.get_running_loop()
+
+        if op == 'ping':
+            return {'ok': True}
+
+        if op == 'price':
+            return {
+                'ok': True,
+                'price': exchange.current_price,
+                'change': exchange.get_price_change(),
+                'next_update': exchange.get_next_update_date()
+            }
+
+        if op == 'create':
+            name = request.get('name', '')
+            if not isinstance(name, str):
+                raise RequestError("name must be a string")
+            created = await loop.run_in_executor(None, exchange.create_account, name)
+            if not created:
+                return {'ok': False, 'error': "account already exists or invalid name"}
+            return {'ok': True}
+
+        if op == 'login':
+            state['account'] = self.account(request, state)
+            return {'ok': True, 'account': state['account']}
+
+        if op == 'balance':
+            return {'ok': True, **exchange.get_account_balance(self.account(request, state))}
+
+        if op in TRADES:
+            order = {'account': self.account(request, state), 'type': op, 'amount': request.get('amount')}
+            return await self.committer.submit_async(order)
+
+        if op == 'history':
+            account = self.account(request, state)
+            try:
+                limit = int(request.get('limit', 20))
+                before = request.get('before')
+                before = None if before is None else int(before)
+            except (TypeError, ValueError):
+                raise RequestError("limit and before must be integers")
+            tx_type = request.get('type')
+            if tx_type not in (None, *TRADES):
+                raise RequestError("type must be 'buy' or 'sell'")
+            if exchange.storage.queries_history:
+                transactions = await loop.run_in_executor(
+                    None, lambda: exchange.get_user_transactions(account, limit, tx_type=tx_type, before=before))
+            else:
+                transactions = exchange.get_user_transactions(account, limit, tx_type=tx_type, before=before)
+            return {'ok': True, 'transactions': transactions}
+
+        raise RequestError(f"unknown op {op!r}")
+
+
+async def serve(exchange, host: str = '127.0.0.1', port: int = DEFAULT_PORT, ready=None):
+    """Run a server until cancelled; ready(server) is called once listening"""
+    server = OpenCooinServer(exchange, host, port)
+    await server.start()
+    if ready:
+        ready(server)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,38 @@
+"""
+Per-trader sessions on a shared exchange.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class Session:
+    """A logged-in account on an OpenCooinExchange
+
+    Sessions replace the exchange-wide current user: any number of them can
+    trade concurrently on the same exchange, each bound to its own account.
+    """
+
+    __slots__ = ('exchange', 'account_name')
+
+    def __init__(self, exchange, account_name: str):
+        self.exchange = exchange
+        self.account_name = account_name
+
+    def buy_coo(self, eur_amount: float) -> bool:
+        """Buy COO with EUR"""
+        return self.exchange.buy_coo(self.account_name, eur_amount)
+
+    def sell_coo(self, coo_amount: float) -> bool:
+        """Sell COO for EUR"""
+        return self.exchange.sell_coo(self.account_name, coo_amount)
+
+    def get_balance(self) -> Optional[Dict]:
+        """Get the session account's balance"""
+        return self.exchange.get_account_balance(self.account_name)
+
+    def get_transactions(self, limit: int = 20, since: Optional[datetime] = None,
+                         until: Optional[datetime] = None, tx_type: Optional[str] = None,
+                         before: Optional[int] = None) -> List[Dict]:
+        """Get the session account's transaction history"""
+        return self.exchange.get_user_transactions(self.account_name, limit, since, until, tx_type, before)
@@ -0,0 +1,326 @@
+"""
+Sharded deployment: accounts hash-partitioned across worker processes.
+
+One OpenCooinExchange keeps every account in one process, so under the
+GIL all trading runs on one core. A ShardedExchange starts one worker
+process per shard. Shard k owns the accounts whose name hashes to k (crc32,
+stable across processes and restarts) and keeps their balances and history
+in its own exchange, with a JournalStorage in data_dir/shard-k.
+
+The process holding the ShardedExchange is the router: it forwards every
+request over a multiprocessing Pipe to the shard that owns the account.
+Batches are split by shard and the sub-batches run in parallel, and so do
+snapshots. A trade only ever touches one account, so shards never need to
+coordinate. Requests are pipelined: a shard answers in the order it was
+sent requests, so the router sends without waiting and a reply thread per
+shard resolves the oldest outstanding future. With several batches in
+flight (submit_batch, or several threads) the shards never wait for the
+router to pickle the next one.
+
+Each shard prices trades with its own monthly feed; they all agree.
+Transaction ids are per shard, which is enough for paging since one
+account's history lives on one shard. The shard count of a data directory
+is fixed when the directory is created. Opening it with another count
+raises ValueError, since accounts would otherwise be routed to shards that
+don't hold them.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from .exchange import DEFAULT_ACCOUNTS, OpenCooinExchange
+from .money import balance_to_floats
+from .pricing import PriceModel
+from .storage import JournalStorage
+
+LAYOUT_FILE = "shards.json"
+
+
+def shard_of(account: str, shards: int) -> int:
+    """Index of the shard owning an account"""
+    return zlib.crc32(account.encode()) % shards
+
+
+# Requests a shard answers, by name; each takes the shard's exchange first
+SHARD_OPS = {
+    'create': OpenCooinExchange.create_account,
+    'balance': OpenCooinExchange.get_account_balance,
+    'buy': OpenCooinExchange.buy_coo,
+    'sell': OpenCooinExchange.sell_coo,
+    'batch': OpenCooinExchange.execute_batch,
+    'history': OpenCooinExchange.get_user_transactions,
+    'save': OpenCooinExchange.save_data,
+    'balances': lambda exchange: {name: balance_to_floats(balance)
+                                  for name, balance in exchange.stored_accounts().items()},
+}
+
+
+def run_shard(connection, index: int, shards: int, data_file: str, fsync_every: int,
+              compact_every: int, history_segment: bool):
+    """Worker process: serve (op, args) requests from the router until it hangs up
+
+    Sends its account names once loaded, then one (ok, result or
+    exception) reply per request.
+    """
+    storage = JournalStorage(data_file, fsync_every, compact_every, history_segment)
+    exchange = OpenCooinExchange(storage=storage, default_accounts=False)
+    try:
+        exchange.initialize_default_accounts({name: balance for name, balance in DEFAULT_ACCOUNTS.items()
+                                              if shard_of(name, shards) == index})
+        connection.send(list(exchange.accounts))
+        while True:
+            try:
+                request = connection.recv()
+            except EOFError:
+                break
+            if request is None:
+                break
+            op, args = request
+            try:
+                reply = (True, SHARD_OPS[op](exchange, *args))
+            except Exception as e:
+                reply = (False, e)
+            try:
+                connection.send(reply)
+            except Exception:
+                # Pickling failed before anything was written
+                connection.send((False, RuntimeError(f"shard {index}: unpicklable reply to {op}: {reply[1]!r}")))
+    finally:
+        exchange.close()
+
+
+def gather(futures: List[Future], combine: Callable[[List], object]) -> Future:
+    """A future for combine(results) once every one of futures is done, or the first error"""
+    gathered = Future()
+    if not futures:
+        gathered.set_result(combine([]))
+        return gathered
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        for future in futures:
+            if future.exception() is not None:
+                gathered.set_exception(future.exception())
+                return
+        try:
+            gathered.set_result(combine([future.result() for future in futures]))
+        except Exception as e:
+            gathered.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(done)
+    return gathered
+
+
+class ShardedExchange:
+    """Router over shard processes, with the trading API of OpenCooinExchange
+
+    Safe to use from several threads (e.g. through a GroupCommitter); each
+    shard sees the requests of one thread in the order they were made.
+    """
+
+    def __init__(self, data_dir: str, shards: int = 4, fsync_every: int = 1, compact_every: int = 10000,
+                 history_segment: bool = False):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.data_dir = data_dir
+        self.shards = shards
+        self.check_layout()
+        self.price_model = PriceModel()
+        self.connections = []
+        self.processes = []
+        # Futures of the requests sent to each shard and not answered yet,
+        # oldest first; send_locks keep them in the order sent
+        self.pending = [deque() for _ in range(shards)]
+        self.send_locks = [threading.Lock() for _ in range(shards)]
+        self.stopped = [False] * shards
+        self.reply_threads = []
+        # Spawned, not forked: the router may already be running threads
+        context = multiprocessing.get_context('spawn')
+        for index in range(shards):
+            directory = os.path.join(data_dir, f"shard-{index}")
+            os.makedirs(directory, exist_ok=True)
+            connection, child = context.Pipe()
+            process = context.Process(
+                target=run_shard, name=f"opencooin-shard-{index}", daemon=True,
+                args=(child, index, shards, os.path.join(directory, "opencooin_data.json"),
+                      fsync_every, compact_every, history_segment))
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        # Shards load in parallel; collect their account names
+        self.accounts = set()
+        for index, connection in enumerate(self.connections):
+            try:
+                self.accounts.update(connection.recv())
+            except EOFError:
+                for process in self.processes:
+                    process.terminate()
+                raise RuntimeError(f"shard {index} failed to start (exit code {self.processes[index].exitcode})")
+        for index in range(shards):
+            thread = threading.Thread(target=self.read_replies, args=(index,),
+                                      name=f"opencooin-shard-{index}-replies", daemon=True)
+            thread.start()
+            self.reply_threads.append(thread)
+
+    def check_layout(self):
+        """Record the shard count of a new data directory, or check it against an existing one"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        path = os.path.join(self.data_dir, LAYOUT_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                shards = json.load(f)['shards']
+            if shards != self.shards:
+                raise ValueError(f"{self.data_dir} holds {shards} shards, not {self.shards}")
+        else:
+            with open(path, 'w') as f:
+                json.dump({'shards': self.shards}, f)
+
+    def read_replies(self, index: int):
+        """Reply thread: resolve a shard's outstanding futures as its answers arrive"""
+        connection = self.connections[index]
+        pending = self.pending[index]
+        while True:
+            try:
+                ok, result = connection.recv()
+            except (EOFError, OSError):
+                break
+            future = pending.popleft()
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+        with self.send_locks[index]:
+            self.stopped[index] = True
+            while pending:
+                pending.popleft().set_exception(ConnectionError(f"shard {index} has stopped"))
+
+    def shard(self, account) -> int:
+        """Shard of an account; anything but a name goes to shard 0, which rejects it"""
+        return shard_of(account, self.shards) if isinstance(account, str) else 0
+
+    def send(self, index: int, op: str, *args) -> Future:
+        """Send one request to a shard, the future resolves to its result"""
+        future = Future()
+        with self.send_locks[index]:
+            if self.stopped[index]:
+                raise ConnectionError(f"shard {index} has stopped")
+            # Queued before sending, as the reply may come at once
+            self.pending[index].append(future)
+            try:
+                self.connections[index].send((op, args))
+            except BaseException:
+                # Nothing was sent (pickling comes first), so no reply is
+                # coming for it; left queued it would take the next one's
+                self.pending[index].pop()
+                raise
+        return future
+
+    def call(self, index: int, op: str, *args):
+        """Run one request on a shard and return its result"""
+        return self.send(index, op, *args).result()
+
+    def broadcast(self, op: str, *args) -> List:
+        """Run a request on every shard at once and return their results in shard order"""
+        return gather([self.send(index, op, *args) for index in range(self.shards)], list).result()
+
+    @property
+    def current_price(self) -> float:
+        """Price the shards trade at, the current month's price"""
+        return self.price_model.current_price()
+
+    def create_account(self, name: str) -> bool:
+        """Create a new pigeon account on its shard"""
+        if not name or not name.strip():
+            return False
+        account_name = name.strip().lower().replace(' ', '_')
+        created = self.call(self.shard(account_name), 'create', account_name)
+        if created:
+            self.accounts.add(account_name)
+        return created
+
+    def get_account_balance(self, account_name: str) -> Optional[Dict]:
+        """Get account balance as {'coo_balance', 'eur_balance'} floats"""
+        return self.call(self.shard(account_name), 'balance', account_name)
+
+    def get_accounts(self) -> Dict[str, Dict]:
+        """Every account's balance, including held funds, as floats"""
+        balances = {}
+        for shard_balances in self.broadcast('balances'):
+            balances.update(shard_balances)
+        return balances
+
+    def buy_coo(self, account_name: str, eur_amount: float) -> bool:
+        """Buy COO with EUR"""
+        return self.call(self.shard(account_name), 'buy', account_name, eur_amount)
+
+    def sell_coo(self, account_name: str, coo_amount: float) -> bool:
+        """Sell COO for EUR"""
+        return self.call(self.shard(account_name), 'sell', account_name, coo_amount)
+
+    def submit_batch(self, orders: List[Dict]) -> Future:
+        """Split orders by shard and send the sub-batches; the future resolves to the results
+
+        Results are in order. Orders for one account keep their relative
+        order, which is all execute_batch promises across accounts.
+        """
+        batches = {}
+        for position, order in enumerate(orders):
+            index = self.shard(order.get('account') if isinstance(order, dict) else None)
+            if index not in batches:
+                batches[index] = ([], [])
+            batch, positions = batches[index]
+            batch.append(order)
+            positions.append(position)
+        futures = [self.send(index, 'batch', batch) for index, (batch, _) in batches.items()]
+
+        def combine(replies: List[List[Dict]]) -> List[Dict]:
+            results = [None] * len(orders)
+            for (_, positions), shard_results in zip(batches.values(), replies):
+                for position, result in zip(positions, shard_results):
+                    results[position] = result
+            return results
+
+        return gather(futures, combine)
+
+    def execute_batch(self, orders: List[Dict]) -> List[Dict]:
+        """Validate, apply and persist orders on their shards, in parallel"""
+        return self.submit_batch(orders).result()
+
+    def get_user_transactions(self, account_name: str, limit: int = 20,
+                              since: Optional[datetime] = None, until: Optional[datetime] = None,
+                              tx_type: Optional[str] = None, before: Optional[int] = None) -> List[Dict]:
+        """Get transaction history for an account from its shard"""
+        return self.call(self.shard(account_name), 'history', account_name, limit, since, until, tx_type, before)
+
+    def save_data(self):
+        """Snapshot every shard, all at once"""
+        self.broadcast('save')
+
+    def close(self):
+        """Stop the shards once they have answered every request; they flush their journals first"""
+        for index, connection in enumerate(self.connections):
+            with self.send_locks[index]:
+                try:
+                    connection.send(None)
+                except OSError:
+                    pass
+        for process in self.processes:
+            process.join()
+        for thread in self.reply_threads:
+            thread.join()
+        for connection in self.connections:
+            connection.close()
@@ -0,0 +1,463 @@
+"""
+Storage backends for the exchange.
+
+The exchange keeps accounts and the transaction log in memory and hands
+every mutation to its storage as journal-style records (see
+OpenCooinExchange.account_record and trade_record):
+
+    JsonStorage      the whole state rewritten to one JSON file per change
+    JournalStorage   JSON snapshot plus an append-only journal, compacted
+                     in the background
+    SqliteStorage    one small SQLite transaction per change; history stays
+                     in the database and queries run in SQL
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+from .journal import Journal
+from .metrics import get_logger
+from .money import (balance_from_floats, balance_to_floats, from_micro_eur, from_nano_coo, to_micro_eur,
+                    to_nano_coo)
+from .segment import Segment, write_segment
+from .txlog import TransactionLog, from_epoch_us, to_epoch_us
+
+
+class Storage:
+    """Interface between an exchange and where its state is kept
+
+    load fills exchange.accounts and exchange.transactions; persist and save
+    are called with the exchange's log_lock held, persist after every
+    mutation and save for a complete write of the current state.
+    """
+
+    # Whether history queries are answered by the storage instead of the
+    # in-memory transaction log
+    queries_history = False
+
+    def load(self, exchange):
+        """Load accounts and transactions into the exchange"""
+        raise NotImplementedError
+
+    def persist(self, exchange, records: List[Dict]):
+        """Durably record mutations that were just applied"""
+        raise NotImplementedError
+
+    def save(self, exchange):
+        """Write the exchange's complete state"""
+        raise NotImplementedError
+
+    def compact(self, exchange, background: bool = True):
+        """Fold incremental writes into a fresh snapshot, if the backend has any"""
+
+    def files(self) -> Dict[str, str]:
+        """The files the backend writes, by kind, for size gauges"""
+        return {}
+
+    def user_transactions(self, user: str, limit: int, since: Optional[datetime] = None,
+                          until: Optional[datetime] = None, tx_type: Optional[str] = None,
+                          before: Optional[int] = None) -> List[Dict]:
+        """History query for backends with queries_history set"""
+        raise NotImplementedError
+
+    def close(self):
+        """Flush and release resources"""
+
+
+class JsonStorage(Storage):
+    """Accounts and history in one JSON file, rewritten on every change
+
+    With history_segment the history goes to a binary segment next to the
+    data file instead (see opencooin.segment) and is loaded lazily.
+    """
+
+    def __init__(self, data_file: str = "opencooin_data.json", history_segment: bool = False):
+        self.data_file = data_file
+        self.segment_file = os.path.splitext(data_file)[0] + ".txseg" if history_segment else None
+
+    def files(self) -> Dict[str, str]:
+        files = {'data': self.data_file}
+        if self.segment_file:
+            files['segment'] = self.segment_file
+        return files
+
+    def load(self, exchange):
+        """Load accounts and transactions from file"""
+        self.load_snapshot(exchange)
+
+    def load_snapshot(self, exchange) -> Dict:
+        """Read the data file into the exchange and return its raw fields"""
+        if not os.path.exists(self.data_file):
+            return {}
+        try:
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+            exchange.accounts = {name: balance_from_floats(balance)
+                                 for name, balance in data.get('accounts', {}).items()}
+            segment_name = data.get('history_segment')
+            if segment_name:
+                segment_path = os.path.join(os.path.dirname(self.data_file), segment_name)
+                exchange.transactions = TransactionLog(Segment(segment_path, data['history_rows']))
+            else:
+                exchange.transactions = TransactionLog()
+            # Files store history newest first
+            for transaction in reversed(data.get('transactions', [])):
+                exchange.transactions.append_record(transaction)
+            return data
+        except Exception:
+            get_logger(__name__).exception("Error loading data from %s", self.data_file)
+            return {}
+
+    def persist(self, exchange, records: List[Dict]):
+        """Rewrite the whole file"""
+        self.save(exchange)
+
+    def save(self, exchange):
+        """Save accounts and transactions to file"""
+        try:
+            accounts = exchange.stored_accounts()
+            data = {'accounts': {name: balance_to_floats(balance) for name, balance in accounts.items()}}
+            data.update(self.history_data(exchange.transactions, len(exchange.transactions)))
+            with open(self.data_file, 'w') as f:
+                json.dump(data, f, indent=2)
+        except Exception:
+            get_logger(__name__).exception("Error saving data to %s", self.data_file)
+
+    def history_data(self, transactions: TransactionLog, count: int) -> Dict:
+        """Snapshot fields for the first count transactions
+
+        Either the transactions themselves, newest first, or a reference to
+        a freshly written history segment. The segment goes to disk before
+        the snapshot that names it, and history_rows pins the snapshot to
+        its own prefix of the segment.
+        """
+        if not self.segment_file:
+            return {'transactions': list(transactions.records(count))}
+        write_segment(self.segment_file, transactions, count)
+        return {
+            'transactions': [],
+            'history_segment': os.path.basename(self.segment_file),
+            'history_rows': count
+        }
+
+
+class JournalStorage(JsonStorage):
+    """JSON snapshot plus an append-only journal of mutations
+
+    Each mutation is appended to <data_file>.journal; the snapshot in
+    data_file is only rewritten by compaction, which runs in the background
+    once compact_every records have accumulated.
+    """
+
+    def __init__(self, data_file: str = "opencooin_data.json", fsync_every: int = 1,
+                 compact_every: int = 10000, history_segment: bool = False):
+        super().__init__(data_file, history_segment)
+        self.journal = Journal(data_file + ".journal", fsync_every)
+        self.compact_every = compact_every
+        self.compaction_thread = None
+
+    def files(self) -> Dict[str, str]:
+        return {**super().files(), 'journal': self.journal.path}
+
+    def load(self, exchange):
+        """Load the snapshot and replay the journal tail on top of it"""
+        self.replay(exchange)
+        if self.journal.has_rotated():
+            # A compaction was interrupted, fold its journal before appending more
+            self.compact(exchange, background=False)
+
+    def replay(self, exchange, repair: bool = True):
+        """Load the snapshot, then the rotated and the live journal records it doesn't cover
+
+        With repair off no file is written, not even to cut off a torn record.
+        """
+        snapshot_seq = self.load_snapshot(exchange).get('journal_seq', 0)
+        self.journal.seq = snapshot_seq
+        for record in self.journal.replay(repair):
+            if record['seq'] > snapshot_seq:
+                self.apply_record(exchange, record)
+
+    def apply_record(self, exchange, record: Dict):
+        """Apply a replayed journal record to the in-memory state"""
+        exchange.accounts[record['name']] = balance_from_floats(record)
+        if record['op'] == 'trade':
+            exchange.transactions.append_record(record['tx'])
+
+    def persist(self, exchange, records: List[Dict]):
+        """Append the records to the journal"""
+        self.journal.append(*records)
+        if self.journal.records >= self.compact_every:
+            self.compact(exchange)
+
+    def save(self, exchange):
+        """Compact in the foreground"""
+        self.compact(exchange, background=False)
+
+    def compact(self, exchange, background: bool = True):
+        """Fold the journal into a new snapshot
+
+        The journal is rotated and the state copied on the calling thread so
+        the snapshot matches the rotated seq exactly; serializing and writing
+        it can then run in the background while trading continues.
+        """
+        with exchange.log_lock:
+            if self.compaction_thread and self.compaction_thread.is_alive():
+                if background:
+                    return
+                self.compaction_thread.join()
+
+            if self.journal.has_rotated():
+                # An earlier snapshot write failed or was interrupted. Its records
+                # are already applied in memory, so snapshot everything up to the
+                # current seq without rotating; replay skips what is covered.
+                if not background and self.write_snapshot(exchange, self.snapshot(exchange, self.journal.seq)):
+                    self.journal.discard_rotated()
+                return
+
+            seq = self.journal.rotate()
+            data = self.snapshot(exchange, seq)
+
+            def run():
+                if self.write_snapshot(exchange, data):
+                    self.journal.discard_rotated()
+
+            if background:
+                self.compaction_thread = threading.Thread(target=run, name="opencooin-compaction", daemon=True)
+                self.compaction_thread.start()
+            else:
+                run()
+
+    def snapshot(self, exchange, seq: int) -> Dict:
+        """Copy the current state for a snapshot covering the journal up to seq
+
+        The log is append-only, so only its current length is captured here;
+        the rows are serialized later by write_snapshot.
+        """
+        return {
+            'accounts': {name: balance_to_floats(balance) for name, balance in exchange.stored_accounts().items()},
+            'transactions': len(exchange.transactions),
+            'journal_seq': seq
+        }
+
+    def write_snapshot(self, exchange, data: Dict) -> bool:
+        """Atomically replace the snapshot file"""
+        tmp_file = self.data_file + ".tmp"
+        try:
+            data.update(self.history_data(exchange.transactions, data['transactions']))
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.data_file)
+            return True
+        except Exception:
+            get_logger(__name__).exception("Error writing snapshot %s", self.data_file)
+            return False
+
+    def close(self):
+        """Flush pending journal records and wait for compaction"""
+        if self.compaction_thread:
+            self.compaction_thread.join()
+        self.journal.close()
+
+
+class SqliteStorage(Storage):
+    """SQLite database in WAL mode
+
+    Every mutation is one short transaction: upsert the touched accounts
+    and insert the trade. Only accounts are loaded at startup; history
+    queries go to SQL with filtering and LIMIT applied by the database, so
+    the exchange's in-memory log only holds trades made since startup.
+    """
+
+    queries_history = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (
+            name TEXT PRIMARY KEY,
+            coo_balance REAL NOT NULL,
+            eur_balance REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            user TEXT NOT NULL,
+            type TEXT NOT NULL,
+            coo_amount REAL NOT NULL,
+            eur_amount REAL NOT NULL,
+            price REAL NOT NULL,
+            timestamp INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS transactions_user ON transactions (user, id);
+        CREATE INDEX IF NOT EXISTS transactions_timestamp ON transactions (timestamp);
+    """
+    UPSERT_ACCOUNT = ("INSERT INTO accounts (name, coo_balance, eur_balance) VALUES (?, ?, ?) "
+                      "ON CONFLICT (name) DO UPDATE SET coo_balance = excluded.coo_balance, "
+                      "eur_balance = excluded.eur_balance")
+    INSERT_TRANSACTION = ("INSERT INTO transactions (user, type, coo_amount, eur_amount, price, timestamp) "
+                          "VALUES (?, ?, ?, ?, ?, ?)")
+    SELECT_TRANSACTIONS = "SELECT id, user, type, coo_amount, eur_amount, price, timestamp FROM transactions"
+
+    def __init__(self, db_file: str = "opencooin.db", synchronous: str = "NORMAL"):
+        self.db_file = db_file
+        # One connection shared by all threads; writes already run under the
+        # exchange's log_lock and this lock covers reads
+        self.lock = threading.Lock()
+        # Deferred: sqlite3 costs every import of the package ~2 ms and 1 MB
+        # even when the JSON backends are used
+        import sqlite3
+        self.connection = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(f"PRAGMA synchronous={synchronous}")
+        self.connection.executescript(self.SCHEMA)
+
+    def files(self) -> Dict[str, str]:
+        return {'database': self.db_file, 'wal': self.db_file + "-wal"}
+
+    def load(self, exchange):
+        """Load accounts; history stays in the database"""
+        with self.lock:
+            rows = self.connection.execute("SELECT name, coo_balance, eur_balance FROM accounts").fetchall()
+        exchange.accounts = {name: {'coo': to_nano_coo(coo), 'eur': to_micro_eur(eur)} for name, coo, eur in rows}
+        exchange.transactions = TransactionLog()
+
+    def persist(self, exchange, records: List[Dict]):
+        """Write the records in one transaction"""
+        accounts = {}
+        transactions = []
+        for record in records:
+            accounts[record['name']] = (record['name'], record['coo_balance'], record['eur_balance'])
+            if record['op'] == 'trade':
+                transactions.append(self.transaction_row(record['tx']))
+        try:
+            with self.lock:
+                self.connection.execute("BEGIN")
+                try:
+                    self.connection.executemany(self.UPSERT_ACCOUNT, accounts.values())
+                    self.connection.executemany(self.INSERT_TRANSACTION, transactions)
+                except BaseException:
+                    self.connection.execute("ROLLBACK")
+                    raise
+                self.connection.execute("COMMIT")
+        except self.connection.Error:
+            get_logger(__name__).exception("Error saving data to %s", self.db_file)
+
+    def save(self, exchange):
+        """Upsert every account; trades are already in the database"""
+        records = [exchange.account_record('account', name) for name in list(exchange.accounts)]
+        self.persist(exchange, records)
+
+    @staticmethod
+    def transaction_row(transaction: Dict):
+        """Parameters for INSERT_TRANSACTION"""
+        return (
+            transaction['user'],
+            transaction['type'],
+            transaction['coo_amount'],
+            transaction['eur_amount'],
+            transaction['price'],
+            to_epoch_us(transaction['timestamp'])
+        )
+
+    @staticmethod
+    def transaction_dict(row) -> Dict:
+        """Transaction dict for a SELECT_TRANSACTIONS row"""
+        tx_id, user, tx_type, coo_amount, eur_amount, price, timestamp = row
+        return {
+            'user': user,
+            'type': tx_type,
+            'coo_amount': coo_amount,
+            'eur_amount': eur_amount,
+            'price': price,
+            'timestamp': from_epoch_us(timestamp).isoformat(),
+            'id': tx_id
+        }
+
+    def user_transactions(self, user: str, limit: int, since: Optional[datetime] = None,
+                          until: Optional[datetime] = None, tx_type: Optional[str] = None,
+                          before: Optional[int] = None) -> List[Dict]:
+        """A user's transactions newest first, filtered and limited in SQL"""
+        clauses = ["user = ?"]
+        params = [user]
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(to_epoch_us(since))
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(to_epoch_us(until))
+        if tx_type is not None:
+            clauses.append("type = ?")
+            params.append(tx_type)
+        params.append(limit)
+        query = f"{self.SELECT_TRANSACTIONS} WHERE {' AND '.join(clauses)} ORDER BY id DESC LIMIT ?"
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+        return [self.transaction_dict(row) for row in rows]
+
+    def iter_transactions(self, chunk_size: int = 10000) -> Iterator[Dict]:
+        """All transactions oldest first, fetched in chunks"""
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    f"{self.SELECT_TRANSACTIONS} WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self.transaction_dict(row)
+            last_id = rows[-1][0]
+
+    def import_state(self, accounts: Dict, transactions: Iterator[Dict]):
+        """Bulk load accounts (as {'coo', 'eur'} units) and oldest-first transactions in one transaction"""
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany(self.UPSERT_ACCOUNT, (
+                    (name, from_nano_coo(balance['coo']), from_micro_eur(balance['eur']))
+                    for name, balance in accounts.items()
+                ))
+                self.connection.executemany(self.INSERT_TRANSACTION,
+                                            (self.transaction_row(tx) for tx in transactions))
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.connection.close()
+
+
+def migrate_json_to_sqlite(data_file: str, db_file: str) -> int:
+    """Import a JSON data file (with its journal or segment) into SQLite
+
+    Returns the number of transactions imported. The target database should
+    be new; existing rows are kept and accounts overwritten.
+    """
+    # Storages load into anything shaped like an exchange
+    state = SimpleNamespace(accounts={}, transactions=TransactionLog(), log_lock=threading.RLock())
+    if any(os.path.exists(data_file + suffix) for suffix in (".journal", ".journal.old")):
+        # Replayed read-only: the source is never compacted or rewritten,
+        # even when an interrupted compaction left a rotated journal
+        source = JournalStorage(data_file)
+        source.replay(state, repair=False)
+    else:
+        source = JsonStorage(data_file)
+        source.load(state)
+    source.close()
+
+    target = SqliteStorage(db_file)
+    try:
+        log = state.transactions
+        target.import_state(state.accounts, (log.record(position) for position in range(len(log))))
+    finally:
+        target.close()
+    return len(state.transactions)
@@ -0,0 +1,239 @@
+"""
+Columnar transaction history with a per-user index.
+"""
+
+import bisect
+from array import array
+from datetime import datetime
+from enum import IntEnum
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .money import COO_SCALE, EUR_SCALE, to_micro_eur, to_nano_coo
+
+
+class TxType(IntEnum):
+    """Transaction type as stored in the log's type column"""
+    BUY = 0
+    SELL = 1
+
+
+# Type names by code and codes by name, without the Enum lookups on every row
+TX_NAMES = tuple(tx_type.name.lower() for tx_type in TxType)
+TX_CODES = {name: TxType(code) for code, name in enumerate(TX_NAMES)}
+
+
+def tx_code(tx_type: str) -> TxType:
+    """Code of a transaction type name, in any case; ValueError if there is no such type"""
+    code = TX_CODES.get(tx_type.lower()) if isinstance(tx_type, str) else None
+    if code is None:
+        raise ValueError(f"unknown transaction type {tx_type!r}")
+    return code
+
+
+def to_epoch_us(timestamp) -> int:
+    """Convert a datetime or ISO timestamp to epoch microseconds"""
+    dt = datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp
+    return int(dt.replace(microsecond=0).timestamp()) * 1_000_000 + dt.microsecond
+
+
+def from_epoch_us(epoch_us: int) -> datetime:
+    """Convert epoch microseconds to a local datetime"""
+    return datetime.fromtimestamp(epoch_us // 1_000_000).replace(microsecond=epoch_us % 1_000_000)
+
+
+class Positions:
+    """Read-only concatenation of two ascending position sequences
+
+    Joins a user's positions from a memory-mapped segment with the ones
+    appended since, without copying either. Supports len and indexing,
+    which is all bisect needs.
+    """
+
+    __slots__ = ('head', 'tail')
+
+    def __init__(self, head, tail):
+        self.head = head
+        self.tail = tail
+
+    def __len__(self) -> int:
+        return len(self.head) + len(self.tail)
+
+    def __getitem__(self, index: int) -> int:
+        split = len(self.head)
+        return self.head[index] if index < split else self.tail[index - split]
+
+
+class TransactionLog:
+    """Columnar, append-only transaction history.
+
+    Rows are stored oldest-first in typed arrays, so appending is O(1) and a
+    row costs ~37 bytes instead of a dict. User names are interned to small
+    ids, timestamps kept as epoch microseconds and amounts and prices as
+    fixed-point integers (nano-COO, micro-EUR; see opencooin.money). Readers get dicts in the
+    original transaction format, newest first, built only for the rows they
+    actually consume.
+
+    Each user also has a secondary index of their row positions, so a page
+    of one user's history costs O(log n + limit) however many other users
+    have traded.
+
+    A log can sit on top of a read-only base (a memory-mapped history
+    segment, see opencooin.segment) holding the first base_rows rows; the
+    arrays then only hold rows appended since, and pages of old history are
+    read from disk when a reader touches them.
+    """
+
+    __slots__ = ('base', 'base_rows', 'users', 'user_ids', 'user_positions', 'user_col',
+                 'type_col', 'coo_col', 'eur_col', 'price_col', 'timestamp_col')
+
+    def __init__(self, base=None):
+        self.base = base
+        self.base_rows = 0 if base is None else base.rows
+        self.users: List[str] = [] if base is None else list(base.users)
+        self.user_ids: Dict[str, int] = {user: user_id for user_id, user in enumerate(self.users)}
+        self.user_positions: List[array] = [array('Q') for _ in self.users]
+        self.user_col = array('I')
+        self.type_col = array('B')
+        self.coo_col = array('q')
+        self.eur_col = array('q')
+        self.price_col = array('q')
+        self.timestamp_col = array('q')
+
+    def __len__(self) -> int:
+        return self.base_rows + len(self.timestamp_col)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.records()
+
+    def user_id(self, user: str) -> int:
+        """Intern a user name"""
+        user_id = self.user_ids.get(user)
+        if user_id is None:
+            user_id = self.user_ids[user] = len(self.users)
+            self.users.append(user)
+            self.user_positions.append(array('Q'))
+        return user_id
+
+    def append(self, user: str, tx_type: TxType, coo_amount: int, eur_amount: int,
+               price: int, timestamp: int) -> int:
+        """Append a transaction (amounts in nano-COO and micro-EUR) and return its position"""
+        user_id = self.user_id(user)
+        position = len(self)
+        self.user_col.append(user_id)
+        self.type_col.append(tx_type)
+        self.coo_col.append(coo_amount)
+        self.eur_col.append(eur_amount)
+        self.price_col.append(price)
+        self.timestamp_col.append(timestamp)
+        self.user_positions[user_id].append(position)
+        return position
+
+    def append_record(self, transaction: Dict) -> int:
+        """Append a transaction given in its dict form"""
+        return self.append(
+            transaction['user'],
+            TxType[transaction['type'].upper()],
+            to_nano_coo(transaction['coo_amount']),
+            to_micro_eur(transaction['eur_amount']),
+            to_micro_eur(transaction['price']),
+            to_epoch_us(transaction['timestamp'])
+        )
+
+    def locate(self, position: int):
+        """Find the columns holding a position and the index within them"""
+        if position < self.base_rows:
+            return self.base, position
+        return self, position - self.base_rows
+
+    def timestamp(self, position: int) -> int:
+        """Epoch microseconds of the transaction at a position"""
+        columns, index = self.locate(position)
+        return columns.timestamp_col[index]
+
+    def record(self, position: int) -> Dict:
+        """Build the dict form of the transaction at a position"""
+        columns, index = self.locate(position)
+        return {
+            'user': self.users[columns.user_col[index]],
+            'type': TX_NAMES[columns.type_col[index]],
+            'coo_amount': columns.coo_col[index] / COO_SCALE,
+            'eur_amount': columns.eur_col[index] / EUR_SCALE,
+            'price': columns.price_col[index] / EUR_SCALE,
+            'timestamp': from_epoch_us(columns.timestamp_col[index]).isoformat()
+        }
+
+    def records(self, count: Optional[int] = None) -> Iterator[Dict]:
+        """Iterate transactions newest first
+
+        With count, only the first count transactions ever appended are
+        visited, which gives a stable view while appends continue.
+        """
+        stop = len(self) if count is None else count
+        for position in range(stop - 1, -1, -1):
+            yield self.record(position)
+
+    def rows(self, start: int = 0) -> Iterator[Tuple[int, int, int, int, int, int]]:
+        """Iterate (user id, type, nano-COO, micro-EUR, price, timestamp) tuples oldest first
+
+        Reads the columns directly, the base first, without copying them.
+        """
+        stop = len(self)
+        parts = [(self.base, 0, self.base_rows)] if self.base is not None else []
+        parts.append((self, self.base_rows, stop))
+        for columns, first, last in parts:
+            low, high = max(start, first) - first, last - first
+            if low >= high:
+                continue
+            rows = zip(columns.user_col, columns.type_col, columns.coo_col,
+                       columns.eur_col, columns.price_col, columns.timestamp_col)
+            yield from islice(rows, low, high)
+
+    def position_parts(self, user_id: int):
+        """A user's positions as (base part, appended part), both ascending"""
+        if self.base is not None and user_id < len(self.base.users):
+            head = self.base.user_positions(user_id)
+        else:
+            head = array('Q')
+        return head, self.user_positions[user_id]
+
+    def positions(self, user_id: int):
+        """All of a user's positions, ascending"""
+        head, tail = self.position_parts(user_id)
+        return Positions(head, tail) if len(head) else tail
+
+    def user_records(self, user: str, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None, tx_type: Optional[str] = None,
+                     before: Optional[int] = None) -> Iterator[Dict]:
+        """Iterate one user's transactions newest first
+
+        since/until bound the timestamp (inclusive) and before is a position
+        cursor: only transactions older than it are returned. Each dict gets
+        an 'id' with its position to continue from. Time bounds are found by
+        bisection, relying on rows being appended in timestamp order.
+        """
+        type_code = None if tx_type is None else tx_code(tx_type)
+        user_id = self.user_ids.get(user)
+        if user_id is None:
+            return
+        positions = self.positions(user_id)
+        timestamp_of = self.timestamp
+
+        high = len(positions)
+        if before is not None:
+            high = bisect.bisect_left(positions, before, 0, high)
+        if until is not None:
+            high = bisect.bisect_right(positions, to_epoch_us(until), 0, high, key=timestamp_of)
+        low = 0
+        if since is not None:
+            low = bisect.bisect_left(positions, to_epoch_us(since), 0, high, key=timestamp_of)
+
+        for index in range(high - 1, low - 1, -1):
+            position = positions[index]
+            if type_code is not None:
+                columns, column_index = self.locate(position)
+                if columns.type_col[column_index] != type_code:
+                    continue
+            transaction = self.record(position)
+            transaction['id'] = position
+            yield transaction
@@ -0,0 +1,283 @@
+"""
+Virtualized tkinter views for the trading window.
+
+Both views hand Tk only the handful of rows that fit on screen, so their
+cost per update doesn't grow with the number of accounts or the length of
+an account's history.
+"""
+
+import tkinter as tk
+from tkinter import font as tkfont
+from typing import Dict, List, Optional, Tuple
+
+from .money import COO_SCALE, EUR_SCALE
+
+EMPTY_HISTORY = "No transactions yet.\nStart trading! 🐦\n"
+
+
+def format_account(name: str, balance: Dict) -> str:
+    """Format one row of the account selector"""
+    return f"{name} - {balance['coo'] / COO_SCALE:.2f} COO | €{balance['eur'] / EUR_SCALE:.2f}"
+
+
+def format_transaction(tx: Dict) -> str:
+    """Format one transaction as the three-line history entry"""
+    # Slicing the ISO timestamp gives the same text as
+    # datetime.fromisoformat(...).strftime("%m/%d %H:%M"), without parsing it
+    timestamp = tx['timestamp']
+    date = f"{timestamp[5:7]}/{timestamp[8:10]} {timestamp[11:16]}"
+    return (f"{tx['type'].upper():4} | {tx['coo_amount']:8.4f} COO | €{tx['eur_amount']:7.2f} | {date}\n"
+            f"     | Price: €{tx['price']:.4f}/COO\n"
+            + "-" * 50 + "\n")
+
+
+class HistoryView:
+    """Scrollable transaction history that renders only its visible window
+
+    Entries are fetched from a Session a page at a time, newest first, and
+    formatted once. refresh() prepends trades made since the last call;
+    scrolling past the loaded entries pages in older ones with the before
+    cursor. The Text widget never holds more than the entries on screen.
+    """
+
+    ENTRY_LINES = 3
+    PAGE_SIZE = 100
+
+    def __init__(self, parent, session, **text_options):
+        self.session = session
+        self.entries: List[str] = []
+        self.newest_id: Optional[int] = None
+        self.oldest_id: Optional[int] = None
+        self.exhausted = False
+        self.offset = 0
+        self.window = 1
+        self.rendered = (0, 0)
+
+        self.frame = tk.Frame(parent)
+        self.scrollbar = tk.Scrollbar(self.frame, orient='vertical', command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+        self.text = tk.Text(self.frame, wrap='none', state='disabled', **text_options)
+        self.text.pack(side='left', fill='both', expand=True)
+        self.line_height = tkfont.Font(font=self.text.cget('font')).metrics('linespace')
+
+        # The widget only ever holds the visible window, so its own
+        # scrolling is replaced by moving the window over self.entries
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.text.bind(sequence, self.on_wheel)
+        self.text.bind('<Configure>', self.on_resize)
+
+        self.window = max(1, int(self.text.cget('height')) // self.ENTRY_LINES)
+        self.load_older()
+        self.render()
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def load_older(self):
+        """Fetch the next page of older transactions"""
+        if self.exhausted:
+            return
+        page = self.session.get_transactions(self.PAGE_SIZE, before=self.oldest_id)
+        if len(page) < self.PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            if self.newest_id is None:
+                self.newest_id = page[0]['id']
+            self.oldest_id = page[-1]['id']
+            self.entries.extend(format_transaction(tx) for tx in page)
+
+    def refresh(self):
+        """Prepend transactions made since the last refresh"""
+        if self.newest_id is None:
+            # Nothing was loaded yet, so everything is new
+            self.exhausted = False
+            self.load_older()
+            self.render()
+            return
+
+        new = []
+        before = None
+        while True:
+            page = self.session.get_transactions(8, before=before)
+            fresh = [tx for tx in page if tx['id'] > self.newest_id]
+            new.extend(fresh)
+            if len(fresh) < len(page) or len(page) < 8:
+                break
+            before = page[-1]['id']
+        if not new:
+            return
+
+        self.newest_id = new[0]['id']
+        self.entries[0:0] = [format_transaction(tx) for tx in new]
+        if self.offset:
+            # Scrolled into history: stay on the same entries
+            self.offset += len(new)
+            self.update_scrollbar()
+        else:
+            self.prepend(len(new))
+
+    def prepend(self, count: int):
+        """Insert the newest count entries above the window and trim its end"""
+        start, shown = self.rendered
+        if start != 0 or not shown or count >= self.window:
+            self.render(force=True)
+            return
+        self.text.config(state='normal')
+        self.text.insert('1.0', ''.join(self.entries[:count]))
+        shown = min(shown + count, self.window)
+        self.text.delete(f"{shown * self.ENTRY_LINES + 1}.0", 'end')
+        self.text.config(state='disabled')
+        self.rendered = (0, shown)
+        self.update_scrollbar()
+
+    def render(self, force: bool = False):
+        """Show the entries of the current window"""
+        if len(self.entries) < self.offset + self.window:
+            self.load_older()
+        self.offset = max(0, min(self.offset, len(self.entries) - self.window))
+        visible = self.entries[self.offset:self.offset + self.window]
+        if not force and self.rendered == (self.offset, len(visible)) and visible:
+            return
+
+        self.text.config(state='normal')
+        self.text.delete('1.0', 'end')
+        self.text.insert('1.0', ''.join(visible) if visible else EMPTY_HISTORY)
+        self.text.config(state='disabled')
+        self.rendered = (self.offset, len(visible))
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        total = max(len(self.entries), 1)
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.window) / total))
+
+    def scroll_to(self, offset: int):
+        self.offset = max(0, offset)
+        self.render()
+
+    def yview(self, action, amount, unit=None):
+        """Scrollbar callback, in the same terms as Text.yview"""
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * len(self.entries)))
+        elif unit == 'pages':
+            self.scroll_to(self.offset + int(amount) * self.window)
+        else:
+            self.scroll_to(self.offset + int(amount))
+
+    def on_wheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.scroll_to(self.offset - 1)
+        else:
+            self.scroll_to(self.offset + 1)
+        return 'break'
+
+    def on_resize(self, event):
+        window = max(1, event.height // (self.line_height * self.ENTRY_LINES) + 1)
+        if window != self.window:
+            self.window = window
+            self.render(force=True)
+
+
+class AccountListView:
+    """Account selector over the exchange's sorted AccountIndex
+
+    The Listbox holds only the visible rows of the accounts matching the
+    search prefix; a row maps to its account name through the index in
+    O(1). refresh() rewrites just the visible rows whose balance changed:
+    trades swap an account's balance dict whole, so an identity check
+    against the dict each row was drawn from is enough.
+    """
+
+    def __init__(self, parent, exchange, height: int = 8, **listbox_options):
+        self.exchange = exchange
+        self.window = height
+        self.start = self.end = 0
+        self.offset = 0
+        self.indexed = -1
+        self.shown: List[Tuple[str, Dict]] = []
+
+        self.frame = tk.Frame(parent)
+        self.search_entry = tk.Entry(self.frame, **listbox_options)
+        self.search_entry.pack(fill='x', pady=(0, 5))
+        self.search_entry.bind('<KeyRelease>', lambda event: self.search(self.search_entry.get()))
+
+        self.scrollbar = tk.Scrollbar(self.frame, orient='vertical', command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+        self.listbox = tk.Listbox(self.frame, height=height, exportselection=False, **listbox_options)
+        self.listbox.pack(side='left', fill='both', expand=True)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.listbox.bind(sequence, self.on_wheel)
+
+        self.prefix = ''
+        self.refresh()
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def search(self, text: str):
+        """Show only the accounts whose name starts with text"""
+        prefix = text.strip().lower().replace(' ', '_')
+        if prefix != self.prefix:
+            self.prefix = prefix
+            self.offset = 0
+            self.indexed = -1
+            self.refresh()
+
+    def selected_name(self) -> Optional[str]:
+        """Name of the selected account, if any"""
+        selection = self.listbox.curselection()
+        if not selection or selection[0] >= len(self.shown):
+            return None
+        return self.exchange.account_index[self.start + self.offset + selection[0]]
+
+    def refresh(self):
+        """Redraw rows whose balance changed, or everything after new accounts"""
+        index = self.exchange.account_index
+        if len(index) != self.indexed:
+            self.indexed = len(index)
+            self.start, self.end = index.prefix_range(self.prefix)
+            self.render()
+            return
+
+        accounts = self.exchange.accounts
+        selection = self.listbox.curselection()
+        for row, (name, balance) in enumerate(self.shown):
+            current = accounts[name]
+            if current is not balance:
+                self.listbox.delete(row)
+                self.listbox.insert(row, format_account(name, current))
+                self.shown[row] = (name, current)
+        for row in selection:
+            self.listbox.selection_set(row)
+
+    def render(self):
+        """Fill the Listbox with the rows of the current window"""
+        self.offset = max(0, min(self.offset, self.end - self.start - self.window))
+        first = self.start + self.offset
+        index = self.exchange.account_index
+        accounts = self.exchange.accounts
+        self.shown = [(index[row], accounts[index[row]]) for row in range(first, min(first + self.window, self.end))]
+
+        self.listbox.delete(0, 'end')
+        self.listbox.insert('end', *(format_account(name, balance) for name, balance in self.shown))
+        total = max(self.end - self.start, 1)
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.window) / total))
+
+    def scroll_to(self, offset: int):
+        self.offset = max(0, offset)
+        self.render()
+
+    def yview(self, action, amount, unit=None):
+        """Scrollbar callback, in the same terms as Listbox.yview"""
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * (self.end - self.start)))
+        elif unit == 'pages':
+            self.scroll_to(self.offset + int(amount) * self.window)
+        else:
+            self.scroll_to(self.offset + int(amount))
+
+    def on_wheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.scroll_to(self.offset - 1)
+        else:
+            self.scroll_to(self.offset + 1)
+        return 'break'
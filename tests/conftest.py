@@ -0,0 +1,45 @@
+"""
+Shared fixtures: exchanges on throwaway data files.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opencooin import OpenCooinExchange  # noqa: E402
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / "opencooin_data.json")
+
+
+@pytest.fixture
+def make_exchange(data_file):
+    """Build exchanges on data_file (or another file), all closed after the test"""
+    exchanges = []
+
+    def make(path=None, **options):
+        exchange = OpenCooinExchange(path or data_file, **options)
+        exchanges.append(exchange)
+        return exchange
+
+    yield make
+    for exchange in exchanges:
+        exchange.close()
+
+
+@pytest.fixture
+def tk_root():
+    """A hidden Tk root, or a skip without tkinter or a display"""
+    tk = pytest.importorskip('tkinter')
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        pytest.skip(f"Tk unavailable: {e}")
+    root.withdraw()
+    yield root
+    root.destroy()
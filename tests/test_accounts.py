@@ -0,0 +1,25 @@
+from opencooin.accounts import AccountIndex
+
+
+def test_index_keeps_names_sorted():
+    index = AccountIndex(['mike', 'alice'])
+    index.add('bob')
+    assert list(index) == ['alice', 'bob', 'mike']
+    assert index.position('bob') == 1
+    assert index.position('carl') == -1
+
+
+def test_prefix_range():
+    index = AccountIndex(['carrier_clara', 'city_pigeon_bob', 'city_pigeon', 'homer_pigeon'])
+    start, end = index.prefix_range('city')
+    assert [index[row] for row in range(start, end)] == ['city_pigeon', 'city_pigeon_bob']
+    assert index.prefix_range('') == (0, 4)
+    start, end = index.prefix_range('zzz')
+    assert start == end
+
+
+def test_exchange_indexes_new_accounts(make_exchange):
+    exchange = make_exchange()
+    assert exchange.create_account('Zed Pigeon')
+    assert list(exchange.account_index) == sorted(exchange.accounts)
+    assert exchange.account_index.position('zed_pigeon') == len(exchange.accounts) - 1
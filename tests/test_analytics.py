@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from opencooin import SqliteStorage
+from opencooin.analytics import EXPORT_FIELDS, EXPORTERS, Analytics, JsonStream, iter_data_file, iter_history
+from opencooin.cli import main
+from opencooin.money import COO_SCALE, EUR_SCALE
+from opencooin.txlog import TxType, to_epoch_us
+
+
+def at(year, month, day):
+    return to_epoch_us(datetime(year, month, day, 12))
+
+
+def trade(exchange):
+    assert exchange.buy_coo('homer_pigeon', 10)
+    assert exchange.sell_coo('homer_pigeon', 2)
+    assert exchange.buy_coo('racing_pete', 5)
+
+
+def test_realized_pnl_uses_average_cost():
+    analytics = Analytics()
+    analytics.update('a', TxType.BUY, 2 * COO_SCALE, EUR_SCALE, EUR_SCALE // 2, at(2024, 1, 10))
+    analytics.update('a', TxType.BUY, 2 * COO_SCALE, 3 * EUR_SCALE, 3 * EUR_SCALE // 2, at(2024, 1, 20))
+    # Sells the 4 COO bought at an average of 1 EUR for 2 EUR each, and 1 COO never bought
+    analytics.update('a', TxType.SELL, 5 * COO_SCALE, 10 * EUR_SCALE, 2 * EUR_SCALE, at(2024, 2, 1))
+
+    stats = analytics.user('a')
+    assert stats['realized_pnl'] == 4.0
+    assert stats['unmatched_coo'] == 1.0
+    assert (stats['position_coo'], stats['average_cost']) == (0.0, None)
+    assert (stats['trades'], stats['bought_coo'], stats['sold_coo']) == (3, 4.0, 5.0)
+    assert stats['vwap'] == pytest.approx(14 / 9)
+    assert analytics.user('b') is None
+    assert analytics.summary()['realized_pnl'] == 4.0
+
+
+def test_monthly_bars_follow_timestamps_not_arrival():
+    analytics = Analytics()
+    for day, price in ((20, 3), (5, 1), (25, 2), (10, 4)):
+        analytics.update('a', TxType.BUY, COO_SCALE, price * EUR_SCALE, price * EUR_SCALE, at(2024, 3, day))
+    analytics.update('a', TxType.SELL, COO_SCALE, EUR_SCALE, EUR_SCALE, at(2024, 12, 31))
+    bars = analytics.monthly()
+    assert [bar['month'] for bar in bars] == ['2024-03', '2024-12']
+    assert [bars[0][key] for key in ('open', 'high', 'low', 'close', 'trades')] == [1.0, 4.0, 1.0, 2.0, 4]
+
+
+def test_attach_catches_up_then_follows(make_exchange):
+    exchange = make_exchange()
+    trade(exchange)
+    analytics = Analytics().attach(exchange)
+    assert analytics.summary()['trades'] == 3
+    assert exchange.buy_coo('homer_pigeon', 1)
+    assert analytics.user('homer_pigeon')['trades'] == 3
+
+    analytics.detach()
+    assert exchange.buy_coo('homer_pigeon', 1)
+    summary = analytics.summary()
+    assert (summary['trades'], summary['traders']) == (4, 2)
+    assert summary['eur_volume'] == pytest.approx(16 + 2 * exchange.current_price)
+
+
+def test_attach_reads_history_from_sqlite(make_exchange, tmp_path):
+    db_file = str(tmp_path / "opencooin.db")
+    trade(make_exchange(storage=SqliteStorage(db_file)))
+    reopened = make_exchange(storage=SqliteStorage(db_file))
+    assert Analytics().attach(reopened).summary()['trades'] == 3
+    assert [tx['type'] for tx in iter_history(reopened, chunk_size=2)] == ['buy', 'sell', 'buy']
+
+
+@pytest.mark.parametrize('format', sorted(EXPORTERS))
+def test_exporters_write_every_transaction(make_exchange, format):
+    exchange = make_exchange()
+    trade(exchange)
+    out = io.StringIO()
+    assert EXPORTERS[format](iter_history(exchange), out, chunk_size=2) == 3
+    if format == 'csv':
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        assert tuple(rows[0]) == EXPORT_FIELDS
+    else:
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(row['user'], row['type']) for row in rows] == [
+        ('homer_pigeon', 'buy'), ('homer_pigeon', 'sell'), ('racing_pete', 'buy')]
+    assert [int(row['id']) for row in rows] == [0, 1, 2]
+
+
+def test_data_file_is_read_newest_first(make_exchange, data_file):
+    exchange = make_exchange()
+    trade(exchange)
+    exchange.save_data()
+    stored = list(iter_data_file(data_file))
+    assert [tx['type'] for tx in stored] == ['buy', 'sell', 'buy']
+    assert stored[0]['user'] == 'racing_pete'
+
+
+def test_json_stream_refills_its_buffer():
+    stream = JsonStream(io.StringIO('[1234567, "a , b", {"x": [1, 2]}, 8 ]'), buffer_size=3)
+    assert list(stream.array()) == [1234567, "a , b", {'x': [1, 2]}, 8]
+    assert list(JsonStream(io.StringIO(' [ ] ')).array()) == []
+
+
+@pytest.mark.parametrize('text', ['[1, 2', '{"transactions": [1 2]}', '"transactions"'])
+def test_malformed_data_files_raise(tmp_path, text):
+    path = tmp_path / "bad.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(iter_data_file(str(path)))
+
+
+def test_cli_report_and_export(make_exchange, data_file, tmp_path, capsys):
+    exchange = make_exchange()
+    trade(exchange)
+    exchange.close()
+    assert main(['--data-file', data_file, '--json', 'report', 'homer_pigeon']) == 0
+    assert json.loads(capsys.readouterr().out)['trades'] == 2
+    assert main(['--data-file', data_file, '--json', 'report', 'nobody']) == 1
+    assert json.loads(capsys.readouterr().out) == {'ok': False, 'error': 'no trades'}
+
+    output = tmp_path / "history.jsonl"
+    assert main(['export', '--format', 'jsonl', '--output', str(output), '--from-file', data_file]) == 0
+    assert len(output.read_text().splitlines()) == 3
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+
+from opencooin import GroupCommitter
+
+
+def test_batch_runs_orders_in_sequence_with_one_write(make_exchange):
+    exchange = make_exchange(journal=True)
+    appended = []
+    append = exchange.storage.journal.append
+    exchange.storage.journal.append = lambda *records: appended.append(len(records)) or append(*records)
+
+    results = exchange.execute_batch([
+        {'account': 'homer_pigeon', 'type': 'buy', 'amount': 600},
+        # Sees the 400 EUR left by the first order
+        {'account': 'homer_pigeon', 'type': 'buy', 'amount': 600},
+        {'account': 'racing_pete', 'type': 'sell', 'amount': 10},
+    ])
+    assert [result['ok'] for result in results] == [True, False, True]
+    assert results[1]['error'] == "insufficient EUR balance"
+    assert results[0]['transaction']['eur_amount'] == 600
+    assert appended == [2]
+
+
+@pytest.mark.parametrize('order, error', [
+    ("not an order", "malformed order: order must be a dict"),
+    ({'account': ['homer_pigeon'], 'type': 'buy', 'amount': 1}, "malformed order: account must be a string"),
+    ({'account': None, 'type': 'buy', 'amount': 1}, "malformed order: account must be a string"),
+    ({'type': 'buy', 'amount': 1}, "malformed order: 'account'"),
+    ({'account': 'homer_pigeon', 'type': 'buy', 'amount': 'lots'}, "malformed order"),
+    ({'account': 'homer_pigeon', 'type': 'buy', 'amount': -1}, "amount must be positive"),
+    ({'account': 'homer_pigeon', 'type': 'hold', 'amount': 1}, "unknown order type 'hold'"),
+    ({'account': 'nobody', 'type': 'buy', 'amount': 1}, "unknown account"),
+])
+def test_bad_orders_are_rejected_on_their_own(make_exchange, order, error):
+    exchange = make_exchange()
+    good = {'account': 'homer_pigeon', 'type': 'buy', 'amount': 1}
+    results = exchange.execute_batch([good, order, good])
+    assert [result['ok'] for result in results] == [True, False, True]
+    assert results[1]['error'].startswith(error)
+    assert len(exchange.get_user_transactions('homer_pigeon')) == 2
+
+
+def test_group_committer_resolves_concurrent_orders(make_exchange):
+    exchange = make_exchange(journal=True, fsync_every=0)
+    committer = GroupCommitter(exchange, interval=0.01)
+    futures = [committer.submit({'account': 'homer_pigeon', 'type': 'buy', 'amount': 1}) for _ in range(50)]
+    futures.append(committer.submit({'account': 'nobody', 'type': 'buy', 'amount': 1}))
+    committer.close()
+    assert all(future.result(timeout=5)['ok'] for future in futures[:-1])
+    assert futures[-1].result(timeout=5) == {'ok': False, 'error': "unknown account"}
+    assert len(exchange.get_user_transactions('homer_pigeon', limit=100)) == 50
+
+
+def test_group_committer_submit_async(make_exchange):
+    committer = GroupCommitter(make_exchange(), interval=0.001)
+    try:
+        result = asyncio.run(committer.submit_async({'account': 'homer_pigeon', 'type': 'sell', 'amount': 1}))
+    finally:
+        committer.close()
+    assert result['ok'] and result['transaction']['coo_amount'] == 1
+
+
+def test_close_resolves_or_rejects_every_submit(make_exchange):
+    exchange = make_exchange(journal=True, fsync_every=0)
+    for _ in range(20):
+        committer = GroupCommitter(exchange, interval=0.0005)
+        futures = []
+
+        def submitter():
+            for _ in range(50):
+                try:
+                    futures.append(committer.submit({'account': 'homer_pigeon', 'type': 'buy', 'amount': 0.01}))
+                except RuntimeError:
+                    return
+
+        threads = [threading.Thread(target=submitter) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        committer.close()
+        for thread in threads:
+            thread.join()
+        # Anything accepted before close is flushed, nothing is left hanging
+        assert all(future.result(timeout=5)['ok'] for future in futures)
+    with pytest.raises(RuntimeError, match="closed"):
+        committer.submit({'account': 'homer_pigeon', 'type': 'buy', 'amount': 1})
+    committer.close()
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Small enough for a smoke test, every case still runs
+TINY = ['--sizes', '200', '--users', '20', '--repeat', '1', '--accounts', '20', '--trades', '50',
+        '--json-trades', '5', '--queries', '10', '--journal-tail', '20']
+
+
+def run_suite(*args):
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'run.py'), *TINY, *args],
+                          capture_output=True, text=True)
+
+
+def test_suite_writes_a_baseline_then_compares_against_it(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    output = tmp_path / "results.json"
+    first = run_suite('--baseline', str(baseline), '--output', str(output))
+    assert first.returncode == 0, first.stderr
+    assert "Baseline written" in first.stdout
+
+    results = json.loads(output.read_text())['results']
+    for case in ('create', 'trade', 'history', 'load', 'save'):
+        assert any(name.startswith(case + '.') for name in results), case
+    assert json.loads(baseline.read_text())['results'] == results
+
+    again = run_suite('--baseline', str(baseline), '--tolerance', '1000')
+    assert again.returncode == 0, again.stdout
+
+
+def test_suite_fails_on_a_regression(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    assert run_suite('--baseline', str(baseline), '--cases', 'trade').returncode == 0
+    report = json.loads(baseline.read_text())
+    # Pretend the baseline machine was a thousand times faster
+    for result in report['results'].values():
+        result['value'] *= 1000 if result['unit'] == 'ops/s' else 0.001
+    baseline.write_text(json.dumps(report))
+
+    regressed = run_suite('--baseline', str(baseline), '--cases', 'trade')
+    assert regressed.returncode == 1
+    assert "REGRESSION" in regressed.stdout
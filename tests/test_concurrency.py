@@ -0,0 +1,72 @@
+import random
+import threading
+
+from opencooin.txlog import TxType
+
+NAMES = [f"thread_pigeon_{i}" for i in range(8)]
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_balances_match_the_log_after_concurrent_trades(make_exchange):
+    exchange = make_exchange(journal=True, fsync_every=0, default_accounts=False)
+    for name in NAMES:
+        exchange.create_account(name)
+    start = {name: dict(exchange.accounts[name]) for name in NAMES}
+    filled = [0] * 4
+
+    def trader(index):
+        rng = random.Random(index)
+        for _ in range(300):
+            name = rng.choice(NAMES)
+            if rng.random() < 0.5:
+                filled[index] += exchange.buy_coo(name, rng.uniform(0.01, 5.0))
+            else:
+                filled[index] += exchange.sell_coo(name, rng.uniform(0.01, 10.0))
+
+    run_threads(trader, len(filled))
+
+    assert len(exchange.transactions) == sum(filled)
+    expected = {name: dict(balance) for name, balance in start.items()}
+    for user_id, tx_type, coo, eur, price, timestamp in exchange.transactions.rows():
+        balance = expected[exchange.transactions.users[user_id]]
+        sign = 1 if tx_type == TxType.BUY else -1
+        balance['coo'] += sign * coo
+        balance['eur'] -= sign * eur
+    assert {name: exchange.accounts[name] for name in NAMES} == expected
+    assert all(balance['coo'] >= 0 and balance['eur'] >= 0 for balance in expected.values())
+
+
+def test_one_account_is_never_overdrawn(make_exchange):
+    exchange = make_exchange(journal=True, fsync_every=0)
+    exchange.create_account('contended')
+    # 100 EUR starting bonus, 20 threads each trying to spend 10
+    results = [None] * 20
+
+    def spend(index):
+        results[index] = exchange.buy_coo('contended', 10)
+
+    run_threads(spend, len(results))
+    assert results.count(True) == 10
+    assert exchange.get_account_balance('contended')['eur_balance'] == 0
+
+
+def test_concurrent_trades_survive_a_reopen(make_exchange):
+    exchange = make_exchange(journal=True, fsync_every=0)
+
+    def trader(index):
+        for _ in range(50):
+            exchange.buy_coo(NAMES[0] if index % 2 else 'homer_pigeon', 1)
+            exchange.sell_coo('racing_pete', 0.5)
+
+    exchange.create_account(NAMES[0])
+    run_threads(trader, 4)
+    balances = dict(exchange.accounts)
+    exchange.close()
+    assert make_exchange(journal=True).accounts == balances
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from datetime import datetime
+
+from opencooin import MonthlyFeed, PriceModel, PriceScheduler, PriceTick, SimulatedFeed
+from opencooin.feed import offer
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_monthly_feed_ticks_once_per_month():
+    clock = Clock(datetime(2025, 3, 31, 23, 0))
+    feed = MonthlyFeed(PriceModel(clock))
+    first = feed.tick()
+    assert first.next_update == datetime(2025, 4, 1)
+    assert feed.advance() == 3600
+    assert feed.tick() is first
+
+    clock.now = datetime(2025, 4, 1)
+    assert feed.tick().seq == first.seq + 1
+    assert feed.price() == feed.tick().price != first.price
+
+
+def test_simulated_feed_is_reproducible_with_a_seed():
+    feeds = [SimulatedFeed(1.0, rate=10 ** 6, seed=7) for _ in range(2)]
+    for feed in feeds:
+        while feed.tick().seq < 5:
+            feed.advance()
+    # next_update follows the wall clock, everything else the seed
+    assert feeds[0].tick()[:2] == feeds[1].tick()[:2]
+    assert feeds[0].tick().seq == 5
+    assert feeds[0].tick().change == round((feeds[0].price() - 1.0) * 100, 2)
+
+
+def test_exchange_trades_at_the_feed_price(make_exchange):
+    exchange = make_exchange(price_feed=SimulatedFeed(2.0, seed=1))
+    assert exchange.current_price == 2.0
+    assert exchange.buy_coo('homer_pigeon', 10)
+    assert exchange.get_user_transactions('homer_pigeon')[0]['coo_amount'] == 5
+
+
+def test_scheduler_starts_on_subscribe_and_isolates_subscribers(caplog):
+    scheduler = PriceScheduler(SimulatedFeed(1.0, rate=1000, seed=3))
+    assert scheduler.thread is None
+    received = threading.Event()
+
+    def broken(tick):
+        raise RuntimeError("subscriber bug")
+
+    scheduler.subscribe(broken)
+    scheduler.subscribe(lambda tick: received.set())
+    try:
+        assert received.wait(5)
+    finally:
+        scheduler.stop()
+    assert scheduler.thread is None
+    assert "Error in price subscriber" in caplog.text
+
+
+def test_subscribe_queue_delivers_on_the_loop():
+    scheduler = PriceScheduler(SimulatedFeed(1.0, rate=1000, seed=5))
+
+    async def first_ticks():
+        queue = scheduler.subscribe_queue(maxsize=10)
+        ticks = [await asyncio.wait_for(queue.get(), 5) for _ in range(3)]
+        scheduler.unsubscribe(queue)
+        return ticks
+
+    try:
+        ticks = asyncio.run(first_ticks())
+    finally:
+        scheduler.stop()
+    assert [tick.seq for tick in ticks] == sorted(tick.seq for tick in ticks)
+    assert scheduler.subscribers == []
+
+
+def test_offer_drops_the_oldest_tick():
+    queue = asyncio.Queue(2)
+    for seq in range(3):
+        offer(queue, PriceTick(1.0, 0.0, None, seq))
+    assert [queue.get_nowait().seq for _ in range(2)] == [1, 2]
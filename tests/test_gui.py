@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip('tkinter')
+
+from opencooin import gui as gui_module  # noqa: E402
+
+
+@pytest.fixture
+def dialogs(monkeypatch):
+    """Message boxes shown, as (kind, message), instead of blocking on them"""
+    shown = []
+    for kind in ('showerror', 'showinfo'):
+        monkeypatch.setattr(gui_module.messagebox, kind,
+                            lambda title, message, kind=kind: shown.append((kind, message)))
+    return shown
+
+
+@pytest.fixture
+def window(tk_root, make_exchange, dialogs):
+    """A logged-in trading window on homer_pigeon"""
+    window = gui_module.OpenCooinGUI(make_exchange())
+    window.root.withdraw()
+    window.session = window.exchange.login('homer_pigeon')
+    window.create_trading_interface()
+    yield window
+    window.executor.shutdown(wait=True)
+    window.root.destroy()
+
+
+def finish_trades(window):
+    """Wait for submitted trades and show their results, as the Tk poll would"""
+    window.executor.shutdown(wait=True)
+    window.poll_trade_results()
+
+
+def test_trade_runs_off_the_tk_thread_and_repaints(window, dialogs):
+    window.buy_entry.insert(0, "10")
+    window.buy_coo()
+    assert str(window.buy_button.cget('state')) == 'disabled'
+    finish_trades(window)
+
+    assert str(window.buy_button.cget('state')) == 'normal'
+    assert window.buy_entry.get() == ""
+    tx = window.session.get_transactions(1)[0]
+    assert dialogs == [('showinfo', f"Successfully bought {tx['coo_amount']:.4f} COO for €10.00! 🐦💰")]
+    assert window.completed == window.submitted == 1
+
+
+@pytest.mark.parametrize('tx_type, amount, message', [
+    ('sell', 10 ** 6, "Insufficient COO balance! 🐦"),
+    ('sell', 1e-9, "Amount too small at this price! 🐦"),
+    ('buy', 10 ** 6, "Insufficient EUR balance! 💸"),
+])
+def test_rejections_show_the_reason(window, dialogs, tx_type, amount, message):
+    window.submit_trade(tx_type, amount)
+    finish_trades(window)
+    assert dialogs == [('showerror', message)]
+
+
+def test_result_after_logout_is_dropped(window, dialogs):
+    window.submit_trade('buy', 10)
+    window.logout()
+    finish_trades(window)
+    assert dialogs == []
+    assert window.completed == 1
+
+
+def test_run_leaves_a_passed_exchange_open(tk_root, make_exchange, monkeypatch):
+    exchange = make_exchange()
+    closed = []
+    monkeypatch.setattr(exchange, 'close', lambda: closed.append(exchange))
+    window = gui_module.OpenCooinGUI(exchange)
+    window.root.after(0, window.root.quit)
+    window.run()
+    window.root.destroy()
+    # Whoever passed the exchange in closes it, e.g. the CLI's gui command
+    assert closed == []
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import opencooin
+from opencooin.cli import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys
+import opencooin
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def imported_modules():
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True, capture_output=True, text=True)
+    return set(json.loads(result.stdout))
+
+
+def test_import_loads_no_gui_or_heavy_modules():
+    modules = imported_modules()
+    for name in ('tkinter', 'multiprocessing', 'asyncio', 'concurrent.futures', 'hashlib', 'sqlite3',
+                 'logging', 'opencooin.gui', 'opencooin.shard', 'opencooin.batch', 'opencooin.ledger'):
+        assert name not in modules, name
+
+
+@pytest.mark.parametrize('name, module', [('GroupCommitter', 'opencooin.batch'),
+                                          ('ShardedExchange', 'opencooin.shard'),
+                                          ('Ledger', 'opencooin.ledger')])
+def test_lazy_names_resolve_on_access(name, module):
+    assert getattr(opencooin, name).__module__ == module
+
+
+def test_all_names_resolve():
+    for name in opencooin.__all__:
+        if name != 'OpenCooinGUI':
+            assert getattr(opencooin, name) is not None
+
+
+def test_unknown_attribute_raises():
+    with pytest.raises(AttributeError, match="no attribute 'Nope'"):
+        opencooin.Nope
+
+
+
+@pytest.mark.parametrize('command, amount, error', [
+    ('buy', '1000000', "insufficient EUR balance"),
+    ('sell', '1000000', "insufficient COO balance"),
+    ('sell', '-1', "amount must be positive"),
+    ('sell', '0.000000001', "amount too small at this price"),
+    ('buy', 'inf', "malformed order: "),
+])
+def test_cli_prints_why_a_trade_failed(data_file, capsys, command, amount, error):
+    assert main(['--data-file', data_file, '--json', command, 'homer_pigeon', amount]) == 1
+    reported = json.loads(capsys.readouterr().out)
+    assert not reported['ok'] and reported['error'].startswith(error)
+    assert main(['--data-file', data_file, command, 'homer_pigeon', amount]) == 1
+    assert capsys.readouterr().out == f"{reported['error'][:1].upper()}{reported['error'][1:]}!\n"
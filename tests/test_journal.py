@@ -0,0 +1,80 @@
+import json
+import os
+
+from opencooin import Journal
+
+
+def test_replay_restores_balances_and_history(make_exchange, data_file):
+    exchange = make_exchange(journal=True)
+    assert exchange.buy_coo('homer_pigeon', 10)
+    assert exchange.sell_coo('racing_pete', 5)
+    assert exchange.create_account('new pigeon')
+    balances = {name: exchange.get_account_balance(name) for name in exchange.accounts}
+    exchange.close()
+
+    # Trades only append to the journal, the snapshot is never rewritten
+    assert not os.path.exists(data_file)
+    reopened = make_exchange(journal=True)
+    assert {name: reopened.get_account_balance(name) for name in reopened.accounts} == balances
+    assert [tx['type'] for tx in reopened.get_user_transactions('homer_pigeon')] == ['buy']
+    assert [tx['type'] for tx in reopened.get_user_transactions('racing_pete')] == ['sell']
+
+
+def test_torn_tail_is_cut_off(make_exchange, data_file):
+    exchange = make_exchange(journal=True)
+    assert exchange.buy_coo('homer_pigeon', 10)
+    exchange.close()
+    with open(data_file + ".journal", 'a') as f:
+        f.write('{"op":"trade","name":"homer_pig')
+
+    reopened = make_exchange(journal=True)
+    assert len(reopened.get_user_transactions('homer_pigeon')) == 1
+    assert reopened.buy_coo('homer_pigeon', 10)
+    reopened.close()
+
+    with open(data_file + ".journal") as f:
+        records = [json.loads(line) for line in f]
+    assert [record['seq'] for record in records] == list(range(1, len(records) + 1))
+    assert len(make_exchange(journal=True).get_user_transactions('homer_pigeon')) == 2
+
+
+def test_compaction_rotates_into_snapshot(make_exchange, data_file):
+    exchange = make_exchange(journal=True, compact_every=3)
+    for _ in range(4):
+        assert exchange.buy_coo('homer_pigeon', 1)
+    balance = exchange.get_account_balance('homer_pigeon')
+    exchange.close()
+
+    with open(data_file) as f:
+        snapshot = json.load(f)
+    assert snapshot['journal_seq'] > 0
+    assert not os.path.exists(data_file + ".journal.old")
+    reopened = make_exchange(journal=True, compact_every=3)
+    assert reopened.get_account_balance('homer_pigeon') == balance
+    assert len(reopened.get_user_transactions('homer_pigeon')) == 4
+
+
+def test_interrupted_compaction_is_folded_on_load(make_exchange, data_file):
+    exchange = make_exchange(journal=True)
+    assert exchange.buy_coo('homer_pigeon', 10)
+    balance = exchange.get_account_balance('homer_pigeon')
+    exchange.close()
+    # As if the process died between rotating and writing the snapshot
+    os.replace(data_file + ".journal", data_file + ".journal.old")
+
+    reopened = make_exchange(journal=True)
+    assert reopened.get_account_balance('homer_pigeon') == balance
+    assert not os.path.exists(data_file + ".journal.old")
+    assert os.path.exists(data_file)
+
+
+def test_journal_replays_rotated_before_live(tmp_path):
+    journal = Journal(str(tmp_path / "log.journal"), fsync_every=0)
+    journal.append({'n': 1}, {'n': 2})
+    assert journal.rotate() == 2
+    journal.append({'n': 3})
+    journal.close()
+
+    replayed = Journal(journal.path)
+    assert [(record['seq'], record['n']) for record in replayed.replay()] == [(1, 1), (2, 2), (3, 3)]
+    assert replayed.seq == 3
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import shutil
+
+import pytest
+
+from opencooin import SqliteStorage
+from opencooin.cli import main
+from opencooin.ledger import DIGEST_SIZE, Ledger, LedgerError, check_proof
+
+BLOCK_SIZE = 4
+
+
+def trade(exchange, count):
+    for _ in range(count):
+        assert exchange.buy_coo('homer_pigeon', 1)
+
+
+@pytest.fixture
+def ledger_file(tmp_path):
+    return str(tmp_path / "opencooin_data.json.ledger")
+
+
+@pytest.fixture
+def ledger(ledger_file):
+    ledger = Ledger(ledger_file, block_size=BLOCK_SIZE)
+    yield ledger
+    ledger.close()
+
+
+def ledger_bytes(ledger_file):
+    contents = []
+    for path in (ledger_file, ledger_file + ".blocks"):
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    return contents
+
+
+def test_head_tracks_rows_and_checkpoints(make_exchange, ledger):
+    exchange = make_exchange()
+    ledger.attach(exchange)
+    trade(exchange, 3)
+    assert ledger.head()['rows'] == 3 and ledger.head()['root'] is None
+    trade(exchange, 7)
+    head = ledger.head()
+    assert (head['rows'], head['blocks']) == (10, 2)
+    assert ledger.verify(exchange.transactions, workers=1) == {
+        'ok': True, 'rows': 10, 'blocks': 2, 'first_bad': None, 'problems': [], 'problem_count': 0}
+
+    # Reopening rehashes the same chain
+    ledger.close()
+    reopened = Ledger(ledger.path, block_size=BLOCK_SIZE)
+    assert reopened.head() == head
+    reopened.close()
+
+
+def test_proofs_cover_checkpointed_transactions(make_exchange, ledger):
+    exchange = make_exchange()
+    ledger.attach(exchange)
+    trade(exchange, 10)
+    for position in range(8):
+        proof = ledger.proof(position)
+        assert check_proof(exchange.transactions.record(position), proof)
+    transaction = exchange.transactions.record(5)
+    transaction['coo_amount'] += 1
+    assert not check_proof(transaction, ledger.proof(5))
+    with pytest.raises(ValueError, match="not in a checkpointed block"):
+        ledger.proof(8)
+
+
+def test_edited_history_is_detected(make_exchange, ledger):
+    exchange = make_exchange()
+    ledger.attach(exchange)
+    trade(exchange, 10)
+    exchange.transactions.coo_col[5] += 1
+    result = ledger.verify(exchange.transactions, workers=1)
+    assert not result['ok'] and result['first_bad'] == 5
+    assert result['problems'] == ["transaction 5: leaf differs from the history",
+                                  "block 1: Merkle root differs from its checkpoint"]
+
+
+def test_edited_ledger_file_is_detected(make_exchange, ledger):
+    exchange = make_exchange()
+    ledger.attach(exchange)
+    trade(exchange, 10)
+    with open(ledger.path, 'r+b') as f:
+        f.seek(DIGEST_SIZE)
+        f.write(bytes(DIGEST_SIZE))
+    result = ledger.verify(exchange.transactions, workers=2)
+    assert result['first_bad'] == 1
+    assert "block 0: chain differs from its checkpoint" in result['problems']
+
+
+def test_attach_refuses_a_ledger_that_does_not_match(make_exchange, ledger):
+    exchange = make_exchange()
+    trade(exchange, 3)
+    with pytest.raises(LedgerError, match="the ledger has 0 entries but the history 3 transactions"):
+        ledger.attach(exchange)
+    assert exchange.transaction_listeners == []
+    with pytest.raises(LedgerError, match="recover"):
+        make_exchange(ledger=True)
+
+
+def test_initialize_starts_over_an_existing_history(make_exchange, ledger, caplog):
+    exchange = make_exchange()
+    trade(exchange, 5)
+    with caplog.at_level(logging.WARNING, logger='opencooin.ledger'):
+        assert ledger.initialize(exchange) == 5
+    assert "over 5 existing transactions" in caplog.text
+    ledger.attach(exchange)
+    trade(exchange, 1)
+    assert ledger.verify(exchange.transactions, workers=1)['ok']
+    with pytest.raises(LedgerError, match="already holds 6 entries"):
+        ledger.initialize(exchange)
+
+
+def test_recover_only_cuts_the_ledger_back(make_exchange, data_file, ledger_file, tmp_path, caplog):
+    exchange = make_exchange()
+    exchange.close()
+    backup = str(tmp_path / "backup.json")
+    shutil.copy(data_file, backup)
+
+    exchange = make_exchange()
+    ledger = Ledger(ledger_file, block_size=BLOCK_SIZE).attach(exchange)
+    early = ledger.head()
+    trade(exchange, 3)
+    late = ledger.head()
+    ledger.close()
+    exchange.close()
+
+    # The history loses its newest transactions, as in a crash
+    shutil.copy(backup, data_file)
+    exchange = make_exchange()
+    ledger = Ledger(ledger_file, block_size=BLOCK_SIZE)
+    with pytest.raises(LedgerError):
+        ledger.attach(exchange)
+    assert ledger.head() == late
+    with caplog.at_level(logging.WARNING, logger='opencooin.ledger'):
+        assert ledger.recover(exchange) == 3
+    assert "Dropping 3 ledger entries" in caplog.text
+    assert ledger.head() == early
+    assert ledger.verify(exchange.transactions, workers=1, trusted=early)['ok']
+    result = ledger.verify(exchange.transactions, workers=1, trusted=late)
+    assert result['problems'] == ["the trusted head covers 3 transactions, the ledger only 0"]
+
+    # Transactions the ledger never saw are never added
+    trade(exchange, 2)
+    with pytest.raises(LedgerError, match="2 transactions the ledger never recorded"):
+        ledger.recover(exchange)
+    ledger.close()
+
+
+def test_torn_writes_are_cut_off_unless_read_only(ledger_file):
+    with open(ledger_file, 'wb') as f:
+        f.write(bytes(DIGEST_SIZE * 2 + 5))
+    ledger = Ledger(ledger_file, block_size=BLOCK_SIZE, read_only=True)
+    assert ledger.head()['rows'] == 2
+    ledger.close()
+    assert os.path.getsize(ledger_file) == DIGEST_SIZE * 2 + 5
+    assert not os.path.exists(ledger_file + ".blocks")
+
+    ledger = Ledger(ledger_file, block_size=BLOCK_SIZE)
+    assert ledger.head()['rows'] == 2
+    ledger.close()
+    with open(ledger_file, 'rb') as f:
+        assert len(f.read()) == DIGEST_SIZE * 2
+
+
+def test_exchange_keeps_a_ledger_next_to_its_data_file(make_exchange, data_file, tmp_path):
+    exchange = make_exchange(ledger=True)
+    trade(exchange, 2)
+    assert exchange.ledger.path == data_file + ".ledger"
+    assert exchange.ledger.head()['rows'] == 2
+    with pytest.raises(LedgerError):
+        make_exchange(storage=SqliteStorage(str(tmp_path / "opencooin.db")), ledger=True)
+    with pytest.raises(ValueError):
+        Ledger(data_file + ".other", block_size=0)
+
+
+def test_cli_ledger_head_verify_and_proof(make_exchange, data_file, tmp_path, capsys):
+    exchange = make_exchange(ledger=True)
+    trade(exchange, 3)
+    exchange.close()
+    ledger = ['--data-file', data_file, '--json', 'ledger']
+
+    assert main(ledger + ['head']) == 0
+    head_file = tmp_path / "head.json"
+    head_file.write_text(capsys.readouterr().out)
+    assert json.loads(head_file.read_text())['rows'] == 3
+    assert main(ledger + ['verify', '--workers', '1', '--trusted', str(head_file)]) == 0
+    assert json.loads(capsys.readouterr().out)['ok']
+    # Nothing is checkpointed with the default block size
+    assert main(ledger + ['proof', '0']) == 1
+    assert "not in a checkpointed block" in json.loads(capsys.readouterr().out)['error']
+
+    with open(data_file) as f:
+        data = json.load(f)
+    data['transactions'][0]['coo_amount'] *= 2
+    with open(data_file, 'w') as f:
+        json.dump(data, f)
+    assert main(ledger + ['verify', '--workers', '1']) == 1
+    result = json.loads(capsys.readouterr().out)
+    assert result['first_bad'] == 2
+
+
+@pytest.mark.parametrize('edit, problem', [
+    # A forged transaction appended, and the newest one deleted
+    (lambda stored: stored.insert(0, dict(stored[0])), "the history has 4 transactions, the ledger 3"),
+    (lambda stored: stored.pop(0), "the history has 2 transactions, the ledger 3"),
+])
+def test_cli_verify_reports_added_and_dropped_transactions(make_exchange, data_file, capsys, edit, problem):
+    exchange = make_exchange(ledger=True)
+    trade(exchange, 3)
+    exchange.close()
+    before = ledger_bytes(data_file + ".ledger")
+    with open(data_file) as f:
+        data = json.load(f)
+    edit(data['transactions'])
+    with open(data_file, 'w') as f:
+        json.dump(data, f)
+
+    assert main(['--data-file', data_file, '--json', 'ledger', 'verify', '--workers', '1']) == 1
+    assert problem in json.loads(capsys.readouterr().out)['problems']
+    # Verifying changes nothing, and neither does a refused open
+    assert main(['--data-file', data_file, '--ledger', 'buy', 'homer_pigeon', '1']) == 1
+    assert "recover" in capsys.readouterr().out
+    assert ledger_bytes(data_file + ".ledger") == before
+
+
+def test_cli_ledger_init_and_recover(make_exchange, data_file, capsys):
+    exchange = make_exchange()
+    trade(exchange, 3)
+    exchange.close()
+    ledger = ['--data-file', data_file, '--json', 'ledger']
+    assert main(ledger + ['recover']) == 1
+    assert "3 transactions the ledger never recorded" in json.loads(capsys.readouterr().out)['error']
+    assert main(ledger + ['init']) == 0
+    assert json.loads(capsys.readouterr().out)['rows'] == 3
+    assert main(ledger + ['init']) == 1
+    capsys.readouterr()
+    assert main(ledger + ['recover']) == 0
+    assert json.loads(capsys.readouterr().out) == {'ok': True, 'dropped': 0}
+    assert main(['--data-file', data_file, '--ledger', 'buy', 'homer_pigeon', '1']) == 0
+    assert main(ledger + ['verify', '--workers', '1']) == 0
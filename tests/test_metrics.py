@@ -0,0 +1,112 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+from opencooin import Metrics
+from opencooin.metrics import LATENCY_BUCKETS, NULL_TIMER, Histogram, JsonDumper, MetricsServer, Profiler, get_logger
+
+
+@pytest.fixture
+def metrics():
+    """An enabled registry, disabled again so its error handler leaves the opencooin logger"""
+    metrics = Metrics(enabled=True)
+    yield metrics
+    metrics.disable()
+
+
+def test_disabled_registry_records_nothing():
+    metrics = Metrics()
+    assert metrics.timer('save') is NULL_TIMER
+    metrics.inc('trades', result='filled')
+    metrics.observe('trade', 0.001)
+    snapshot = metrics.snapshot()
+    assert (snapshot['counters'], snapshot['operations']) == ({}, {})
+
+
+def test_exchange_counts_trades_and_times_operations(make_exchange, metrics):
+    exchange = make_exchange(journal=True, metrics=metrics)
+    assert exchange.buy_coo('homer_pigeon', 1)
+    assert not exchange.buy_coo('homer_pigeon', 10 ** 6)
+    exchange.execute_batch([{'account': 'homer_pigeon', 'type': 'sell', 'amount': 1}, "bad order"])
+
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'trades_total{result="filled"}': 2, 'trades_total{result="rejected"}': 2}
+    assert {'trade', 'batch', 'persist'} <= set(snapshot['operations'])
+    assert snapshot['operations']['trade']['count'] == 2
+    assert snapshot['gauges']['history_rows'] == 2
+    assert snapshot['gauges']['file_bytes{file="journal"}'] > 0
+
+
+def test_errors_are_counted_only_while_enabled(metrics):
+    logger = get_logger('opencooin.test')
+    logger.error("counted")
+    metrics.disable()
+    logger.error("not counted")
+    assert metrics.snapshot()['counters'] == {'errors_total{logger="opencooin.test"}': 1}
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for seconds in (0.00001, 0.0002, 0.0002, 0.003, 100):
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 0.00025
+    assert histogram.quantile(0.8) == 0.005
+    assert histogram.quantile(1.0) is None
+
+
+def test_prometheus_text(metrics):
+    metrics.inc('trades', 3, result='filled')
+    metrics.gauge('accounts', lambda: 5)
+    metrics.gauge('file_bytes', lambda: os.path.getsize('/nonexistent'), file='journal')
+    metrics.observe('save', 0.003)
+    lines = metrics.render_prometheus().splitlines()
+    assert lines[:4] == ['# TYPE opencooin_trades_total counter', 'opencooin_trades_total{result="filled"} 3',
+                         '# TYPE opencooin_accounts gauge', 'opencooin_accounts 5']
+    assert '# TYPE opencooin_operation_seconds histogram' in lines
+    assert 'opencooin_operation_seconds_bucket{op="save",le="0.0025"} 0' in lines
+    assert 'opencooin_operation_seconds_bucket{op="save",le="0.005"} 1' in lines
+    assert 'opencooin_operation_seconds_bucket{op="save",le="+Inf"} 1' in lines
+    assert sum(line.startswith('opencooin_operation_seconds_bucket') for line in lines) == len(LATENCY_BUCKETS) + 1
+    assert not any('file_bytes' in line for line in lines)
+
+
+def test_metrics_server_endpoints(metrics):
+    metrics.inc('trades', result='filled')
+    server = MetricsServer(metrics, port=0)
+    server.start()
+    try:
+        base = f"http://127.0.0.1:{server.port}"
+        with urllib.request.urlopen(base + "/metrics") as response:
+            assert b'opencooin_trades_total{result="filled"} 1' in response.read()
+        with urllib.request.urlopen(base + "/metrics.json") as response:
+            assert json.load(response)['counters'] == {'trades_total{result="filled"}': 1}
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(base + "/other")
+    finally:
+        server.stop()
+
+
+def test_json_dumper_writes_on_stop(tmp_path, metrics):
+    path = str(tmp_path / "metrics.json")
+    dumper = JsonDumper(metrics, path, interval=60)
+    dumper.start()
+    metrics.inc('trades', result='filled')
+    dumper.stop()
+    with open(path) as f:
+        assert json.load(f)['counters'] == {'trades_total{result="filled"}': 1}
+
+
+def test_profiler_toggles_write_reports(tmp_path):
+    profiler = Profiler(str(tmp_path))
+    assert profiler.toggle_cpu() is None
+    sum(range(1000))
+    assert profiler.toggle_cpu().endswith('.prof')
+    assert profiler.toggle_memory() is None
+    data = [bytes(100) for _ in range(100)]
+    path = profiler.toggle_memory()
+    assert data
+    with open(path) as f:
+        assert f.readline().endswith("sites\n")
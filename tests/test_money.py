@@ -0,0 +1,72 @@
+import json
+from array import array
+
+import pytest
+
+from opencooin.cli import main
+from opencooin.money import (COO_SCALE, EUR_SCALE, balance_from_floats, balance_to_floats, coo_for_eur,
+                             eur_for_coo, eur_for_coo_up, scale_floats, to_micro_eur, to_nano_coo)
+
+
+def test_float_edges_round_to_the_nearest_unit():
+    assert to_micro_eur(0.1) == 100_000
+    assert to_micro_eur(0.6394) == 639_400
+    assert to_nano_coo(1.23456789) == 1_234_567_890
+    assert to_nano_coo(1e-10) == 0
+    balance = {'coo_balance': 15.639662, 'eur_balance': 990.0}
+    assert balance_to_floats(balance_from_floats(balance)) == balance
+
+
+def test_trade_conversions_round_down_and_reservations_up():
+    # 1 EUR at 0.3 EUR/COO is 3.333... COO
+    assert coo_for_eur(EUR_SCALE, 300_000) == 3_333_333_333
+    # 1 nano-COO short of 1 COO at 0.7 EUR/COO is just under 0.7 EUR
+    assert eur_for_coo(COO_SCALE - 1, 700_000) == 699_999
+    assert eur_for_coo_up(COO_SCALE - 1, 700_000) == 700_000
+    assert eur_for_coo(COO_SCALE, 700_000) == eur_for_coo_up(COO_SCALE, 700_000) == 700_000
+
+
+def test_scale_floats():
+    assert scale_floats(array('d', [0.1, 2.5, 1e-9]), COO_SCALE) == array('q', [100_000_000, 2_500_000_000, 1])
+
+
+def test_repeated_small_trades_sum_exactly(make_exchange):
+    exchange = make_exchange(default_accounts=False)
+    exchange.create_account('penny')
+    for _ in range(10):
+        assert exchange.buy_coo('penny', 0.1)
+    assert exchange.accounts['penny']['eur'] == 99 * EUR_SCALE
+    assert exchange.get_account_balance('penny')['eur_balance'] == 99.0
+    bought = sum(tx['coo_amount'] for tx in exchange.get_user_transactions('penny'))
+    assert exchange.accounts['penny']['coo'] == to_nano_coo(bought)
+
+
+def test_trades_never_pay_out_more_than_their_value(make_exchange):
+    exchange = make_exchange()
+    price = to_micro_eur(exchange.current_price)
+    eur = exchange.accounts['racing_pete']['eur']
+    assert exchange.sell_coo('racing_pete', 1.000000001)
+    received = exchange.accounts['racing_pete']['eur'] - eur
+    assert received == 1_000_000_001 * price // COO_SCALE <= 1.000000001 * price
+    assert not exchange.sell_coo('racing_pete', 1e-9)
+
+
+@pytest.mark.parametrize('command, amount', [('buy', '10'), ('sell', '3')])
+def test_cli_reports_the_recorded_amounts(data_file, capsys, command, amount):
+    assert main(['--data-file', data_file, '--json', command, 'homer_pigeon', amount]) == 0
+    reported = json.loads(capsys.readouterr().out)
+    assert main(['--data-file', data_file, '--json', 'history', 'homer_pigeon']) == 0
+    tx, = json.loads(capsys.readouterr().out)
+    assert reported == {'ok': True, 'coo_amount': tx['coo_amount'], 'eur_amount': tx['eur_amount']}
+
+
+@pytest.mark.parametrize('amount', [float('nan'), float('inf'), float('-inf')])
+def test_non_finite_amounts_are_rejected(make_exchange, amount):
+    exchange = make_exchange()
+    balances = dict(exchange.accounts)
+    assert not exchange.buy_coo('homer_pigeon', amount)
+    assert not exchange.sell_coo('homer_pigeon', amount)
+    result, = exchange.execute_batch([{'account': 'homer_pigeon', 'type': 'buy', 'amount': amount}])
+    assert not result['ok']
+    assert exchange.accounts == balances
+    assert len(exchange.transactions) == 0
@@ -0,0 +1,111 @@
+import pytest
+
+from opencooin import TradeError
+from opencooin.money import COO_SCALE, EUR_SCALE
+from opencooin.orderbook import OrderBook
+
+NAMES = ('maker_a', 'maker_b', 'taker')
+
+
+@pytest.fixture
+def exchange(make_exchange):
+    exchange = make_exchange(default_accounts=False)
+    exchange.initialize_default_accounts({name: {'coo_balance': 100.0, 'eur_balance': 100.0} for name in NAMES})
+    return exchange
+
+
+@pytest.fixture
+def book(exchange):
+    book = OrderBook(exchange)
+    yield book
+    book.close()
+
+
+def test_resting_orders_hold_funds_until_cancelled(exchange, book):
+    bid = book.place('maker_a', 'buy', 10, price=0.5)
+    ask = book.place('maker_b', 'sell', 4, price=0.75)
+    assert (bid['status'], ask['status']) == ('resting', 'resting')
+    assert (book.best_bid(), book.best_ask()) == (0.5, 0.75)
+    assert book.depth() == {'bids': [[0.5, 10.0]], 'asks': [[0.75, 4.0]]}
+
+    assert exchange.accounts['maker_a']['eur'] == 95 * EUR_SCALE
+    assert exchange.accounts['maker_b']['coo'] == 96 * COO_SCALE
+    # Held funds still count towards the persisted balance
+    assert exchange.stored_balance('maker_a') == {'coo': 100 * COO_SCALE, 'eur': 100 * EUR_SCALE}
+
+    assert book.cancel(bid['id']) and not book.cancel(bid['id'])
+    assert exchange.accounts['maker_a']['eur'] == 100 * EUR_SCALE
+    assert exchange.holds == {'maker_b': {'coo': 4 * COO_SCALE, 'eur': 0}}
+    assert book.best_bid() is None
+
+
+def test_fills_follow_price_time_priority(exchange, book):
+    first = book.place('maker_a', 'sell', 3, price=0.6)
+    second = book.place('maker_b', 'sell', 3, price=0.6)
+    book.place('maker_b', 'sell', 3, price=0.5)
+
+    result = book.place('taker', 'buy', 5, price=0.6)
+    assert result['status'] == 'filled'
+    assert [(fill['price'], fill['coo_amount']) for fill in result['fills']] == [(0.5, 3.0), (0.6, 2.0)]
+    assert result['fills'][1]['order_id'] == first['id']
+    assert book.depth()['asks'] == [[0.6, 4.0]]
+
+    # Fills pay the resting price, not the taker's limit
+    assert exchange.accounts['taker'] == {'coo': 105 * COO_SCALE, 'eur': 100 * EUR_SCALE - 2_700_000}
+    assert exchange.holds.get('taker') is None
+    assert [tx['type'] for tx in exchange.get_user_transactions('maker_a')] == ['sell']
+    assert book.orders[second['id']].amount == 3 * COO_SCALE
+
+
+def test_limit_remainder_rests_and_market_remainder_is_cancelled(exchange, book):
+    book.place('maker_a', 'sell', 2, price=0.5)
+    limit = book.place('taker', 'buy', 5, price=0.5)
+    assert (limit['status'], limit['filled'], limit['amount']) == ('resting', 2.0, 3.0)
+    assert book.best_bid() == 0.5
+
+    book.place('maker_b', 'buy', 1, price=0.4)
+    market = book.place('maker_a', 'sell', 10)
+    assert market['status'] == 'cancelled'
+    assert market['filled'] == 4.0
+    assert len(book) == 0
+
+
+def test_market_buy_is_limited_by_funds(exchange, book):
+    book.place('maker_a', 'sell', 50, price=4.0)
+    result = book.place('taker', 'buy', 50)
+    assert result['filled'] == 25.0
+    assert exchange.accounts['taker']['eur'] == 0
+
+
+@pytest.mark.parametrize('args, error', [
+    (('taker', 'hold', 1, 0.5), "unknown order type 'hold'"),
+    (('taker', 'buy', 0, 0.5), "amount must be positive"),
+    (('taker', 'buy', 1, -0.5), "price must be positive"),
+    (('nobody', 'buy', 1, 0.5), "unknown account"),
+    (('taker', 'buy', 1000, 0.5), "insufficient EUR balance"),
+    (('taker', 'sell', 1000, 0.5), "insufficient COO balance"),
+])
+def test_rejected_orders_leave_nothing_behind(exchange, book, args, error):
+    with pytest.raises(TradeError, match=error):
+        book.place(*args)
+    assert len(book) == 0
+    assert exchange.holds == {}
+
+
+def test_bid_reservation_rounds_up_and_is_fully_released(exchange, book):
+    # 1/3 COO at 0.333333 EUR isn't a whole number of micro-EUR
+    bid = book.place('taker', 'buy', 1 / 3, price=0.333333)
+    assert exchange.holds['taker']['eur'] == 111_111
+    for _ in range(3):
+        book.place('maker_a', 'sell', 1 / 9, price=0.333333)
+    assert book.orders.get(bid['id']) is None
+    assert exchange.holds == {}
+    assert exchange.stored_balance('taker') == exchange.accounts['taker']
+
+
+def test_held_funds_come_back_after_a_restart(make_exchange, exchange, book):
+    book.place('maker_a', 'buy', 10, price=0.5)
+    exchange.save_data()
+    exchange.close()
+    reopened = make_exchange(default_accounts=False)
+    assert reopened.accounts['maker_a'] == {'coo': 100 * COO_SCALE, 'eur': 100 * EUR_SCALE}
@@ -0,0 +1,104 @@
+import math
+import threading
+from datetime import datetime
+
+import pytest
+
+from opencooin import PriceHistory, PriceModel
+from opencooin.pricing import month_price, price_formula
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_month_price_is_the_scalar_formula():
+    assert month_price(2025, 3) == price_formula(2025, 3)
+    assert month_price(2024, 1) == pytest.approx(0.25 * (1.1 + math.sin(1) * 0.2)
+                                                 * (1 + (math.sin(2.5) + math.cos(2024)) * 0.3))
+
+
+def test_series_matches_single_months():
+    model = PriceModel()
+    series = model.price_series((2024, 11), datetime(2025, 2, 15))
+    assert series == [round(month_price(*key), 4) for key in ((2024, 11), (2024, 12), (2025, 1), (2025, 2))]
+
+    # Same type and same rounding as price(), month by month
+    series = model.price_series((2000, 1), (2060, 12))
+    assert type(series) is list and len(series) == 61 * 12
+    assert all(type(price) is float for price in series)
+    assert series == [model.price(*key) for key in model.months((2000, 1), (2060, 12))]
+
+
+def test_current_values_are_kept_until_the_month_ends():
+    clock = Clock(datetime(2025, 3, 10))
+    model = PriceModel(clock)
+    assert model.current_price() == round(month_price(2025, 3), 4)
+    last = month_price(2025, 2)
+    assert model.price_change() == round((model.current_price() - last) / last * 100, 2)
+    assert model.next_update() == datetime(2025, 4, 1)
+
+    clock.now = datetime(2025, 3, 31, 23, 59)
+    model.current = 1.0
+    assert model.current_price() == 1.0
+    clock.now = datetime(2025, 4, 1)
+    assert model.current_price() == round(month_price(2025, 4), 4)
+    assert model.current_key == (2025, 4)
+
+
+def test_months_cross_year_boundaries():
+    assert PriceModel().months((2024, 12), (2025, 1)) == [(2024, 12), (2025, 1)]
+    assert PriceModel().months((2025, 2), (2025, 1)) == []
+
+
+def test_price_at_uses_the_month_of_the_timestamp():
+    history = PriceHistory(PriceModel(Clock(datetime(2025, 3, 10))), months_ahead=2)
+    assert history.price_at(datetime(2025, 2, 28, 23, 59)) == round(month_price(2025, 2), 4)
+    assert history.price_at(datetime(2025, 3, 1).timestamp()) == round(month_price(2025, 3), 4)
+    # Before the table, and far enough past it to grow it
+    assert history.price_at(datetime(2023, 6, 15)) == round(month_price(2023, 6), 4)
+    assert history.price_at(datetime(2027, 1, 2)) == round(month_price(2027, 1), 4)
+    starts, prices = history.table
+    assert starts[-1] >= datetime(2027, 12, 1).timestamp() and len(starts) == len(prices)
+
+
+def test_prices_at_matches_price_at():
+    history = PriceHistory(PriceModel(Clock(datetime(2025, 3, 10))))
+    timestamps = [datetime(year, month, 5).timestamp() for year, month in ((2024, 2), (2025, 7), (2030, 1))]
+    assert [float(price) for price in history.prices_at(timestamps)] == [history.price_at(t) for t in timestamps]
+    assert list(history.prices_at([])) == []
+
+
+def test_exchange_revalues_accounts_at_a_past_time(make_exchange):
+    exchange = make_exchange(default_accounts=False)
+    exchange.create_account('valued')
+    assert exchange.buy_coo('valued', 50)
+    when = datetime(2024, 6, 1)
+    balance = exchange.get_account_balance('valued')
+    expected = balance['eur_balance'] + balance['coo_balance'] * round(month_price(2024, 6), 4)
+    assert exchange.price_at(when) == round(month_price(2024, 6), 4)
+    assert exchange.revalue_all_accounts(at=when)['valued'] == pytest.approx(expected)
+
+
+def test_price_at_is_safe_while_the_table_grows():
+    history = PriceHistory(PriceModel(Clock(datetime(2025, 3, 10))), months_ahead=0)
+    errors = []
+
+    def read():
+        try:
+            for _ in range(2000):
+                history.price_at(datetime(2025, 3, 5))
+        except Exception as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for year in range(2026, 2046):
+        history.extend_to((year, 1))
+        history.extend_to((2025, 3))
+    reader.join()
+    assert errors == []
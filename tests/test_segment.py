@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from opencooin import TransactionLog, TxType
+from opencooin.money import COO_SCALE, EUR_SCALE
+from opencooin.segment import Segment, write_segment
+
+
+def small_log(rows=6):
+    log = TransactionLog()
+    for i in range(rows):
+        log.append(('alice', 'bob', 'carol')[i % 3], TxType(i % 2), (i + 1) * COO_SCALE, EUR_SCALE, EUR_SCALE,
+                   1_700_000_000_000_000 + i)
+    return log
+
+
+def test_segment_round_trips_a_log(tmp_path):
+    log = small_log()
+    path = str(tmp_path / "history.txseg")
+    write_segment(path, log)
+    loaded = TransactionLog(Segment(path))
+    assert len(loaded) == len(log)
+    assert list(loaded.records()) == list(log.records())
+    assert [tx['id'] for tx in loaded.user_records('alice')] == [3, 0]
+
+
+def test_segment_rows_pin_a_prefix(tmp_path):
+    path = str(tmp_path / "history.txseg")
+    write_segment(path, small_log())
+    loaded = TransactionLog(Segment(path, rows=4))
+    assert len(loaded) == 4
+    assert [tx['id'] for tx in loaded.user_records('alice')] == [3, 0]
+    assert [tx['id'] for tx in loaded.user_records('bob')] == [1]
+
+
+def test_appends_go_on_top_of_the_segment(tmp_path):
+    path = str(tmp_path / "history.txseg")
+    write_segment(path, small_log())
+    log = TransactionLog(Segment(path))
+    assert log.append('alice', TxType.SELL, COO_SCALE, EUR_SCALE, EUR_SCALE, 1_700_000_000_000_100) == 6
+    assert log.append('dave', TxType.BUY, COO_SCALE, EUR_SCALE, EUR_SCALE, 1_700_000_000_000_101) == 7
+    assert [tx['id'] for tx in log.user_records('alice')] == [6, 3, 0]
+    # Rewriting covers both the segment rows and the appended ones
+    rewritten = str(tmp_path / "rewritten.txseg")
+    write_segment(rewritten, log)
+    assert list(TransactionLog(Segment(rewritten)).records()) == list(log.records())
+
+
+def test_not_a_segment(tmp_path):
+    path = tmp_path / "junk.txseg"
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError, match="not a version"):
+        Segment(str(path))
+
+
+def test_exchange_keeps_history_in_a_segment(make_exchange, data_file):
+    exchange = make_exchange(history_segment=True)
+    for _ in range(3):
+        assert exchange.buy_coo('homer_pigeon', 5)
+    exchange.close()
+
+    with open(data_file) as f:
+        data = json.load(f)
+    assert data['transactions'] == [] and data['history_rows'] == 3
+    reopened = make_exchange(history_segment=True)
+    assert reopened.transactions.base_rows == 3
+    assert reopened.sell_coo('homer_pigeon', 1)
+    assert [tx['type'] for tx in reopened.get_user_transactions('homer_pigeon')] == ['sell', 'buy', 'buy', 'buy']
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from opencooin.server import OpenCooinServer
+
+
+def exchange_lines(exchange, lines):
+    """Send raw request lines pipelined on one connection, return the decoded responses"""
+    async def run():
+        server = OpenCooinServer(exchange, port=0, batch_interval=0.001)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            writer.write(b''.join(line + b'\n' for line in lines))
+            await writer.drain()
+            responses = [json.loads(await asyncio.wait_for(reader.readline(), 5)) for _ in lines]
+            writer.close()
+            return responses
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def exchange_requests(exchange, requests):
+    return exchange_lines(exchange, [json.dumps(request).encode() for request in requests])
+
+
+def test_pipelined_requests_are_answered_in_order(make_exchange):
+    exchange = make_exchange(journal=True, fsync_every=0)
+    responses = exchange_requests(exchange, [
+        {'id': 1, 'op': 'ping'},
+        {'id': 2, 'op': 'login', 'account': 'homer_pigeon'},
+        {'id': 3, 'op': 'buy', 'amount': 10},
+        {'id': 4, 'op': 'buy', 'amount': 10},
+        {'id': 5, 'op': 'sell', 'amount': 1},
+        {'id': 6, 'op': 'balance'},
+        {'id': 7, 'op': 'history', 'limit': 2},
+        {'id': 8, 'op': 'price'},
+    ])
+    assert [response['id'] for response in responses] == list(range(1, 9))
+    assert all(response['ok'] for response in responses)
+    assert responses[5]['eur_balance'] == exchange.get_account_balance('homer_pigeon')['eur_balance']
+    assert [tx['type'] for tx in responses[6]['transactions']] == ['sell', 'buy']
+    assert responses[7]['price'] == exchange.current_price
+
+
+def test_create_then_trade_on_the_new_account(make_exchange):
+    responses = exchange_requests(make_exchange(), [
+        {'op': 'create', 'name': 'net pigeon'},
+        {'op': 'create', 'name': 'net pigeon'},
+        {'op': 'buy', 'account': 'net_pigeon', 'amount': 100},
+    ])
+    assert responses[0] == {'ok': True}
+    assert responses[1] == {'ok': False, 'error': "account already exists or invalid name"}
+    assert responses[2]['ok']
+
+
+@pytest.mark.parametrize('request_, error', [
+    ({'op': 'balance'}, "no account given and not logged in"),
+    ({'op': 'balance', 'account': ['homer_pigeon']}, "account must be a string"),
+    ({'op': 'balance', 'account': 7}, "account must be a string"),
+    ({'op': 'login', 'account': 'nobody'}, "unknown account"),
+    ({'op': 'history', 'account': 'homer_pigeon', 'type': 'foo'}, "type must be 'buy' or 'sell'"),
+    ({'op': 'history', 'account': 'homer_pigeon', 'type': 5}, "type must be 'buy' or 'sell'"),
+    ({'op': 'history', 'account': 'homer_pigeon', 'limit': 'many'}, "limit and before must be integers"),
+    ({'op': 'history', 'account': 'homer_pigeon', 'limit': -1}, "limit must not be negative"),
+    ({'op': 'create', 'name': 7}, "name must be a string"),
+    ({'op': 'buy', 'account': 'homer_pigeon', 'amount': 'lots'}, "malformed order"),
+    ({'op': 'buy', 'account': 'homer_pigeon', 'amount': 10 ** 6}, "insufficient EUR balance"),
+    ({'op': 'fly'}, "unknown op 'fly'"),
+])
+def test_bad_requests_get_specific_errors(make_exchange, caplog, request_, error):
+    response, = exchange_requests(make_exchange(), [{'id': 'x', **request_}])
+    assert response['id'] == 'x' and not response['ok']
+    assert response['error'].startswith(error)
+    # None of them counts as a server bug
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+
+
+def test_undecodable_lines_do_not_end_the_connection(make_exchange):
+    responses = exchange_lines(make_exchange(), [b'{"op": "ping"', b'[1, 2]', b'{"op": "ping"}'])
+    assert not responses[0]['ok']
+    assert responses[1] == {'ok': False, 'error': "request must be a JSON object"}
+    assert responses[2] == {'ok': True}
+
+
+def test_close_flushes_queued_trades(make_exchange):
+    exchange = make_exchange(journal=True, fsync_every=0)
+    exchange_requests(exchange, [{'op': 'buy', 'account': 'homer_pigeon', 'amount': 1}] * 20)
+    exchange.close()
+    assert len(make_exchange(journal=True).get_user_transactions('homer_pigeon', limit=50)) == 20
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+
+import pytest
+
+from opencooin.exchange import DEFAULT_ACCOUNTS
+from opencooin.shard import LAYOUT_FILE, ShardedExchange, shard_of
+
+SHARDS = 2
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    opened = []
+
+    def make(shards=SHARDS):
+        exchange = ShardedExchange(str(tmp_path / "shards"), shards=shards)
+        opened.append(exchange)
+        return exchange
+
+    yield make
+    for exchange in opened:
+        exchange.close()
+
+
+def test_shard_of_is_stable_and_in_range():
+    assert shard_of('homer_pigeon', 4) == shard_of('homer_pigeon', 4)
+    assert {shard_of(f"pigeon_{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+    assert all(shard_of(name, 1) == 0 for name in DEFAULT_ACCOUNTS)
+
+
+def test_accounts_live_on_their_owning_shard(sharded, tmp_path):
+    exchange = sharded()
+    assert exchange.accounts == set(DEFAULT_ACCOUNTS)
+    assert exchange.create_account('Net Pigeon') and not exchange.create_account('net_pigeon')
+    assert exchange.buy_coo('net_pigeon', 10)
+    assert not exchange.sell_coo('net_pigeon', 10 ** 6)
+    assert exchange.get_account_balance('net_pigeon')['eur_balance'] == 90.0
+    assert exchange.get_account_balance('nobody') is None
+    assert [tx['type'] for tx in exchange.get_user_transactions('net_pigeon')] == ['buy']
+    assert set(exchange.get_accounts()) == set(DEFAULT_ACCOUNTS) | {'net_pigeon'}
+    exchange.close()
+
+    owner = shard_of('net_pigeon', SHARDS)
+    for index in range(SHARDS):
+        with open(tmp_path / "shards" / f"shard-{index}" / "opencooin_data.json.journal") as f:
+            assert ('net_pigeon' in f.read()) == (index == owner)
+
+
+def test_batches_are_split_and_results_kept_in_order(sharded):
+    exchange = sharded()
+    names = sorted(DEFAULT_ACCOUNTS)
+    assert len({shard_of(name, SHARDS) for name in names}) == SHARDS
+    orders = [{'account': name, 'type': 'buy', 'amount': 1} for name in names]
+    orders.insert(1, {'account': 'nobody', 'type': 'buy', 'amount': 1})
+    orders.append("bad order")
+    results = exchange.execute_batch(orders)
+    assert [result['ok'] for result in results] == [True, False] + [True] * (len(names) - 1) + [False]
+    assert results[1]['error'] == "unknown account"
+    for name in names:
+        assert len(exchange.get_user_transactions(name)) == 1
+
+
+def test_shard_errors_reach_the_caller(sharded):
+    exchange = sharded()
+    with pytest.raises(ValueError):
+        exchange.get_user_transactions('homer_pigeon', tx_type='hold')
+    # The shard keeps serving afterwards
+    assert exchange.buy_coo('homer_pigeon', 1)
+
+
+def test_data_survives_a_restart(sharded):
+    exchange = sharded()
+    assert exchange.buy_coo('homer_pigeon', 10)
+    balance = exchange.get_account_balance('homer_pigeon')
+    exchange.close()
+    assert sharded().get_account_balance('homer_pigeon') == balance
+
+
+def test_shard_count_is_fixed_per_directory(sharded, tmp_path):
+    sharded().close()
+    with open(tmp_path / "shards" / LAYOUT_FILE) as f:
+        assert json.load(f) == {'shards': SHARDS}
+    with pytest.raises(ValueError, match="holds 2 shards, not 3"):
+        sharded(shards=3)
+    with pytest.raises(ValueError):
+        ShardedExchange(str(tmp_path / "other"), shards=0)
+    assert not os.path.exists(tmp_path / "other")
+
+
+def test_requests_after_close_fail(sharded):
+    exchange = sharded()
+    exchange.close()
+    with pytest.raises((ConnectionError, OSError)):
+        exchange.buy_coo('homer_pigeon', 1)
+
+
+def test_unpicklable_requests_leave_later_replies_in_order(sharded):
+    exchange = sharded()
+    with pytest.raises(TypeError):
+        exchange.execute_batch([{'account': 'homer_pigeon', 'type': 'buy', 'amount': threading.Lock()}])
+    # A timeout, so a reply paired with the wrong request fails rather than hangs
+    balance = exchange.send(exchange.shard('homer_pigeon'), 'balance', 'homer_pigeon').result(timeout=10)
+    assert balance == exchange.get_accounts()['homer_pigeon']
+    assert exchange.buy_coo('homer_pigeon', 1)
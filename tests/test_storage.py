@@ -0,0 +1,98 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from opencooin import SqliteStorage
+from opencooin.storage import migrate_json_to_sqlite
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / "opencooin.db")
+
+
+def test_sqlite_persists_accounts_and_trades(make_exchange, db_file):
+    exchange = make_exchange(storage=SqliteStorage(db_file))
+    assert exchange.create_account('sql pigeon')
+    assert exchange.buy_coo('sql_pigeon', 40)
+    assert exchange.sell_coo('sql_pigeon', 1)
+    balances = dict(exchange.accounts)
+    exchange.close()
+
+    reopened = make_exchange(storage=SqliteStorage(db_file))
+    assert reopened.accounts == balances
+    # History stays in the database
+    assert len(reopened.transactions) == 0
+    history = reopened.get_user_transactions('sql_pigeon')
+    assert [tx['type'] for tx in history] == ['sell', 'buy']
+    assert history[1]['eur_amount'] == 40
+
+
+def test_sqlite_history_pages_and_filters(make_exchange, db_file):
+    exchange = make_exchange(storage=SqliteStorage(db_file))
+    for _ in range(5):
+        assert exchange.buy_coo('homer_pigeon', 1)
+    first = exchange.get_user_transactions('homer_pigeon', limit=2)
+    rest = exchange.get_user_transactions('homer_pigeon', limit=10, before=first[-1]['id'])
+    assert len(first) == 2 and len(rest) == 3
+    assert max(tx['id'] for tx in rest) < first[-1]['id']
+    now = datetime.now()
+    assert exchange.get_user_transactions('homer_pigeon', since=now + timedelta(hours=1)) == []
+    assert len(exchange.get_user_transactions('homer_pigeon', until=now + timedelta(hours=1))) == 5
+    assert exchange.get_user_transactions('homer_pigeon', tx_type='sell') == []
+
+
+def test_migrate_json_to_sqlite(make_exchange, data_file, db_file):
+    exchange = make_exchange(journal=True)
+    assert exchange.buy_coo('homer_pigeon', 10)
+    assert exchange.sell_coo('racing_pete', 2)
+    balances = dict(exchange.accounts)
+    exchange.close()
+
+    assert migrate_json_to_sqlite(data_file, db_file) == 2
+    migrated = make_exchange(storage=SqliteStorage(db_file))
+    assert migrated.accounts == balances
+    assert [tx['type'] for tx in migrated.get_user_transactions('racing_pete')] == ['sell']
+
+
+def source_files(data_file):
+    contents = {}
+    for path in (data_file, data_file + ".journal", data_file + ".journal.old"):
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                contents[path] = f.read()
+    return contents
+
+
+@pytest.mark.parametrize('live_journal', [True, False])
+def test_migrate_reads_an_interrupted_compaction_read_only(make_exchange, data_file, db_file, live_journal):
+    exchange = make_exchange(journal=True)
+    assert exchange.buy_coo('homer_pigeon', 10)
+    exchange.save_data()
+    assert exchange.sell_coo('racing_pete', 2)
+    # A compaction that rotated the journal but never wrote its snapshot
+    exchange.storage.journal.rotate()
+    if live_journal:
+        assert exchange.buy_coo('racing_pete', 1)
+    balances = dict(exchange.accounts)
+    history = len(exchange.transactions)
+    exchange.storage.close()
+    if live_journal:
+        with open(data_file + ".journal", 'a') as f:
+            f.write('{"seq": 99, "op"')
+    before = source_files(data_file)
+
+    assert migrate_json_to_sqlite(data_file, db_file) == history
+    assert source_files(data_file) == before
+    migrated = make_exchange(storage=SqliteStorage(db_file))
+    assert migrated.accounts == balances
+    assert len(migrated.get_user_transactions('racing_pete')) == history - 1
+
+
+def test_sqlite_write_errors_are_logged_not_raised(make_exchange, db_file, caplog):
+    storage = SqliteStorage(db_file)
+    exchange = make_exchange(storage=storage)
+    storage.connection.execute("DROP TABLE transactions")
+    assert exchange.buy_coo('homer_pigeon', 1)
+    assert "Error saving data" in caplog.text
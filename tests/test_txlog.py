@@ -0,0 +1,102 @@
+from datetime import datetime
+from itertools import islice
+
+import pytest
+
+from opencooin import SqliteStorage, TransactionLog, TxType
+from opencooin.cli import main
+from opencooin.money import COO_SCALE, EUR_SCALE
+
+BASE_US = int(datetime(2025, 3, 1).timestamp()) * 1_000_000
+
+
+def filled_log(rows=10, users=('alice', 'bob')):
+    log = TransactionLog()
+    for i in range(rows):
+        log.append(users[i % len(users)], TxType(i % 2), (i + 1) * COO_SCALE, (i + 1) * EUR_SCALE,
+                   EUR_SCALE // 2, BASE_US + i * 1_000_000)
+    return log
+
+
+def test_append_returns_positions_and_records_are_newest_first():
+    log = TransactionLog()
+    assert log.append('alice', TxType.BUY, 2 * COO_SCALE, EUR_SCALE, EUR_SCALE // 2, BASE_US) == 0
+    assert log.append('bob', TxType.SELL, COO_SCALE, EUR_SCALE // 2, EUR_SCALE // 2, BASE_US + 1) == 1
+    assert len(log) == 2
+    assert [tx['user'] for tx in log.records()] == ['bob', 'alice']
+    assert log.record(0) == {
+        'user': 'alice', 'type': 'buy', 'coo_amount': 2.0, 'eur_amount': 1.0, 'price': 0.5,
+        'timestamp': datetime.fromtimestamp(BASE_US / 1e6).isoformat()
+    }
+
+
+def test_records_with_count_is_a_stable_prefix():
+    log = filled_log(5)
+    view = log.records(3)
+    log.append('carol', TxType.BUY, COO_SCALE, EUR_SCALE, EUR_SCALE, BASE_US + 10 ** 9)
+    assert [tx['coo_amount'] for tx in view] == [3.0, 2.0, 1.0]
+
+
+def test_append_record_round_trips():
+    log = filled_log(4)
+    copy = TransactionLog()
+    for transaction in reversed(list(log.records())):
+        copy.append_record(transaction)
+    assert list(copy.records()) == list(log.records())
+    assert list(copy.rows()) == list(log.rows())
+
+
+def test_rows_from_a_start_position():
+    log = filled_log(6)
+    rows = list(log.rows(4))
+    assert len(rows) == 2
+    user_id, tx_type, coo, eur, price, timestamp = rows[0]
+    assert (log.users[user_id], tx_type, coo, timestamp) == ('alice', TxType.BUY, 5 * COO_SCALE, BASE_US + 4_000_000)
+    assert list(log.rows(6)) == []
+
+
+def test_user_pages_chain_through_before():
+    log = filled_log(10)
+    first = list(islice(log.user_records('alice'), 3))
+    assert [tx['id'] for tx in first] == [8, 6, 4]
+    rest = list(log.user_records('alice', before=first[-1]['id']))
+    assert [tx['id'] for tx in rest] == [2, 0]
+    assert list(log.user_records('nobody')) == []
+
+
+def test_user_records_filter_by_time_and_type():
+    log = filled_log(10)
+    since, until = datetime.fromtimestamp(BASE_US / 1e6 + 2), datetime.fromtimestamp(BASE_US / 1e6 + 7)
+    assert [tx['id'] for tx in log.user_records('bob', since=since, until=until)] == [7, 5, 3]
+    # alice only ever buys in filled_log
+    assert [tx['id'] for tx in log.user_records('alice', tx_type='SELL')] == []
+    assert len(list(log.user_records('alice', tx_type='Buy'))) == 5
+
+
+@pytest.mark.parametrize('tx_type', ['foo', '', 5])
+def test_unknown_type_raises_value_error(tx_type):
+    with pytest.raises(ValueError, match="unknown transaction type"):
+        list(filled_log(2).user_records('alice', tx_type=tx_type))
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_history_type_is_checked_on_every_backend(make_exchange, tmp_path, backend):
+    storage = SqliteStorage(str(tmp_path / "opencooin.db")) if backend == 'sqlite' else None
+    exchange = make_exchange(storage=storage)
+    assert exchange.buy_coo('homer_pigeon', 10)
+    assert exchange.sell_coo('homer_pigeon', 1)
+    assert [tx['type'] for tx in exchange.get_user_transactions('homer_pigeon', tx_type='BUY')] == ['buy']
+    with pytest.raises(ValueError, match="unknown transaction type"):
+        exchange.get_user_transactions('homer_pigeon', tx_type='foo')
+    with pytest.raises(ValueError, match="unknown transaction type"):
+        exchange.get_user_transactions('nobody', tx_type='foo')
+    with pytest.raises(ValueError, match="limit must not be negative"):
+        exchange.get_user_transactions('homer_pigeon', limit=-1)
+    assert exchange.get_user_transactions('homer_pigeon', limit=0) == []
+
+
+def test_cli_rejects_a_negative_history_limit(data_file, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(['--data-file', data_file, 'history', 'homer_pigeon', '--limit', '-1'])
+    assert exit_info.value.code == 2
+    assert "must not be negative" in capsys.readouterr().err
@@ -0,0 +1,76 @@
+import pytest
+
+pytest.importorskip('tkinter')
+
+from opencooin.widgets import (EMPTY_HISTORY, AccountListView, HistoryView, format_account,  # noqa: E402
+                               format_transaction)
+
+
+def shown(view) -> str:
+    return view.text.get('1.0', 'end-1c')
+
+
+def test_format_transaction():
+    tx = {'type': 'buy', 'coo_amount': 1.5, 'eur_amount': 0.75, 'price': 0.5,
+          'timestamp': '2025-03-09T14:07:31.250000'}
+    assert format_transaction(tx) == ("BUY  |   1.5000 COO | €   0.75 | 03/09 14:07\n"
+                                      "     | Price: €0.5000/COO\n" + "-" * 50 + "\n")
+
+
+def test_history_view_renders_only_its_window(tk_root, make_exchange):
+    exchange = make_exchange()
+    price = exchange.current_price
+    for i in range(250):
+        exchange.add_transaction('homer_pigeon', 'buy' if i % 2 else 'sell', 1.0, price, price)
+    session = exchange.login('homer_pigeon')
+    history = session.get_transactions(250)
+
+    view = HistoryView(tk_root, session, height=9)
+    assert view.window == 3
+    assert len(view.entries) == HistoryView.PAGE_SIZE
+    assert shown(view) == ''.join(map(format_transaction, history[:3]))
+
+    # Scrolling past the loaded entries pages in older ones
+    view.scroll_to(150)
+    assert len(view.entries) == 2 * HistoryView.PAGE_SIZE
+    assert shown(view) == ''.join(map(format_transaction, history[150:153]))
+
+
+def test_history_view_prepends_new_trades(tk_root, make_exchange):
+    exchange = make_exchange()
+    session = exchange.login('homer_pigeon')
+    view = HistoryView(tk_root, session, height=9)
+    assert shown(view) == EMPTY_HISTORY
+
+    assert session.buy_coo(1)
+    view.refresh()
+    assert session.sell_coo(1)
+    assert session.buy_coo(2)
+    view.refresh()
+    assert len(view.entries) == 3
+    assert shown(view) == ''.join(map(format_transaction, session.get_transactions(3)))
+
+
+def test_account_list_searches_by_prefix(tk_root, make_exchange):
+    exchange = make_exchange()
+    view = AccountListView(tk_root, exchange, height=3)
+    assert view.listbox.size() == 3
+
+    view.search('City Pigeon')
+    assert view.listbox.get(0, 'end') == (format_account('city_pigeon_bob', exchange.accounts['city_pigeon_bob']),)
+    view.listbox.selection_set(0)
+    assert view.selected_name() == 'city_pigeon_bob'
+
+
+def test_account_list_redraws_changed_rows(tk_root, make_exchange):
+    exchange = make_exchange()
+    view = AccountListView(tk_root, exchange, height=10)
+    assert exchange.buy_coo('carrier_clara', 10)
+    view.refresh()
+    row = exchange.account_index.position('carrier_clara')
+    assert view.listbox.get(row) == format_account('carrier_clara', exchange.accounts['carrier_clara'])
+
+    assert exchange.create_account('aaa pigeon')
+    view.refresh()
+    assert view.listbox.size() == len(exchange.accounts)
+    assert view.listbox.get(0).startswith('aaa_pigeon - ')